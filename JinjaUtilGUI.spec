@@ -1,20 +1,41 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+import os
+
 block_cipher = None
 
+datas = [
+    ('config.json', '.'),
+    ('README.md', '.'),
+    ('README_zh.md', '.'),
+    ('requirements.txt', '.'),
+    ('i18n.py', '.'),
+    ('template_processor.py', '.'),
+    ('data_import.py', '.'),
+    ('filter_registry.py', '.'),
+    ('render_cache.py', '.'),
+    ('incremental_render.py', '.'),
+    ('render_server.py', '.'),
+    ('batch_export.py', '.'),
+    ('json_input.py', '.'),
+    ('syntax_highlight.py', '.'),
+    ('render_history.py', '.'),
+    ('metrics.py', '.'),
+    ('variable_model.py', '.'),
+    ('variable_extractor.py', '.'),
+    ('template_linter.py', '.'),
+    ('locales', 'locales'),
+]
+
+# 预编译模板（python main.py --precompile <模板目录>）存在时一并打包
+if os.path.isdir('precompiled'):
+    datas.append(('precompiled', 'precompiled'))
+
 a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[
-        ('config.json', '.'),
-        ('README.md', '.'),
-        ('README_zh.md', '.'),
-        ('requirements.txt', '.'),
-        ('i18n.py', '.'),
-        ('template_processor.py', '.'),
-        ('locales', 'locales'),
-    ],
+    datas=datas,
     hiddenimports=[
         'tkinter',
         'tkinter.ttk',
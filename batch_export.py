@@ -0,0 +1,272 @@
+import io
+import json
+import os
+import re
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from jinja2 import Undefined
+
+
+# 文件名中不允许出现的字符
+_UNSAFE_CHARS = re.compile(r'[<>:"|?*\x00-\x1f]')
+
+# Windows 保留的设备名，带扩展名时同样不能作为文件名
+_RESERVED_NAMES = frozenset(
+    ['CON', 'PRN', 'AUX', 'NUL'] + [f'COM{i}' for i in range(1, 10)] + [f'LPT{i}' for i in range(1, 10)]
+)
+
+# 归档格式与 tarfile 写入模式
+ARCHIVE_FORMATS = {
+    'zip': None,
+    'tar': 'w',
+    'tar.gz': 'w:gz',
+}
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class BatchExporter:
+    """
+    一个模板、多条记录、多个输出文件的批量导出器
+
+    模板只编译一次；文件名由 Jinja 表达式根据每条记录计算；
+    渲染结果攒批后交给写入线程池，或顺序写入单个 zip / tar 归档，
+    完成后生成记录每个文件耗时的 manifest.json。
+    """
+
+    def __init__(self, processor, template_content, filename_expression,
+                 workers=4, archive_format=None, flush_bytes=1024 * 1024, flush_files=64):
+        """
+        初始化导出器
+
+        Args:
+            processor (TemplateProcessor): 模板处理器
+            template_content (str): 模板字符串
+            filename_expression (str): 文件名表达式，可使用记录中的变量和 index（从 1 开始），
+                例如 name ~ "_resume.txt"
+            workers (int): 写入线程数，归档模式下固定为单线程顺序写入
+            archive_format (str): None 写入目录，或 'zip' / 'tar' / 'tar.gz'
+            flush_bytes (int): 缓冲区累计达到该字节数时提交一次写入
+            flush_files (int): 缓冲区累计达到该文件数时提交一次写入
+        """
+        if archive_format is not None and archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"不支持的归档格式: {archive_format}")
+        self.processor = processor
+        self.template_content = template_content
+        self.filename_expression = filename_expression
+        self.workers = workers
+        self.archive_format = archive_format
+        self.flush_bytes = flush_bytes
+        self.flush_files = flush_files
+        self._filename = processor.env.compile_expression(filename_expression, undefined_to_none=False)
+
+    def export(self, records, target, progress=None):
+        """
+        渲染所有记录并写出
+
+        Args:
+            records (iterable): 变量字典序列
+            target (str): 输出目录，归档模式下为归档文件路径
+            progress (callable): 每渲染一条记录调用 progress(已完成数)
+
+        Returns:
+            dict: manifest 内容
+        """
+        start = time.perf_counter()
+        compiled = self.processor.get_compiled(self.template_content)
+
+        if self.archive_format is None:
+            os.makedirs(target, exist_ok=True)
+            writer = _DirectoryWriter(target)
+            pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='export')
+        else:
+            writer = _ArchiveWriter(target, self.archive_format)
+            pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+
+        files = []
+        errors = []
+        used_names = set()
+        buffer = []
+        buffer_bytes = 0
+        pending = deque()
+        max_pending = max(self.workers, 1) * 2
+        render_seconds = 0.0
+        failure = None
+
+        try:
+            for index, record in enumerate(records, 1):
+                render_start = time.perf_counter()
+                try:
+                    text = self.processor.render_compiled(compiled, record)
+                    filename = self._make_filename(record, index, used_names)
+                except Exception as e:
+                    errors.append({'index': index, 'error': str(e)})
+                    continue
+                elapsed = time.perf_counter() - render_start
+                render_seconds += elapsed
+
+                data = text.encode('utf-8')
+                buffer.append((filename, data))
+                buffer_bytes += len(data)
+                files.append({
+                    'index': index,
+                    'filename': filename,
+                    'bytes': len(data),
+                    'render_ms': round(elapsed * 1000, 3),
+                })
+
+                if buffer_bytes >= self.flush_bytes or len(buffer) >= self.flush_files:
+                    pending.append(pool.submit(writer.write_many, buffer))
+                    buffer = []
+                    buffer_bytes = 0
+                    # 写入跟不上渲染时等待最早的批次，限制缓冲占用的内存
+                    while len(pending) > max_pending:
+                        pending.popleft().result()
+
+                if progress is not None:
+                    progress(index)
+
+            if buffer:
+                pending.append(pool.submit(writer.write_many, buffer))
+                buffer = []
+
+            # 等待写入完成，传播写入错误
+            for future in pending:
+                future.result()
+        except BaseException as e:
+            failure = e
+            raise
+        finally:
+            pool.shutdown(wait=True)
+            # 出错时也写出已渲染的文件并关闭输出，归档保持完整并在 manifest 中记录失败原因
+            if buffer:
+                try:
+                    writer.write_many(buffer)
+                except Exception as e:
+                    print(f"Failed to write exported files: {e}")
+            manifest = self._manifest(files, errors, writer, render_seconds, start, failure)
+            try:
+                writer.close(json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+            except Exception as e:
+                if failure is None:
+                    raise
+                print(f"Failed to close export output: {e}")
+        return manifest
+
+    def _manifest(self, files, errors, writer, render_seconds, start, failure):
+        """生成 manifest 内容，failure 为中止导出的异常"""
+        manifest = {
+            'exported_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'filename_expression': self.filename_expression,
+            'archive_format': self.archive_format,
+            'records': len(files) + len(errors),
+            'files': files,
+            'errors': errors,
+            'bytes': sum(item['bytes'] for item in files),
+            'render_seconds': round(render_seconds, 6),
+            'write_seconds': round(writer.write_seconds, 6),
+            'total_seconds': round(time.perf_counter() - start, 6),
+        }
+        if failure is not None:
+            manifest['failed'] = str(failure) or type(failure).__name__
+        return manifest
+
+    def _make_filename(self, record, index, used_names):
+        """
+        计算并清理文件名，重名时追加序号
+
+        重名按 casefold 判断，避免在不区分大小写的文件系统（Windows / macOS）上互相覆盖。
+        """
+        value = self._filename(**dict(record, index=index))
+        if value is None or isinstance(value, Undefined) or not str(value).strip():
+            value = f"output_{index}.txt"
+        filename = _sanitize_filename(str(value))
+
+        folded = filename.casefold()
+        if folded in used_names or folded == MANIFEST_NAME:
+            stem, ext = os.path.splitext(filename)
+            counter = 2
+            while f"{stem}_{counter}{ext}".casefold() in used_names:
+                counter += 1
+            filename = f"{stem}_{counter}{ext}"
+        used_names.add(filename.casefold())
+        return filename
+
+
+def _sanitize_filename(name):
+    """去除不安全字符和上级目录引用，重命名 Windows 保留名，允许使用 / 创建子目录"""
+    parts = []
+    for part in re.split(r'[\\/]+', name):
+        part = _UNSAFE_CHARS.sub('_', part).strip().rstrip('.')
+        if part.split('.', 1)[0].strip().upper() in _RESERVED_NAMES:
+            part = f"_{part}"
+        if part and part not in ('.', '..'):
+            parts.append(part)
+    return '/'.join(parts) or 'output.txt'
+
+
+class _DirectoryWriter:
+    """将文件写入目录，可被多个写入线程同时调用"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.write_seconds = 0.0
+
+    def write_many(self, items):
+        start = time.perf_counter()
+        for filename, data in items:
+            path = os.path.join(self.directory, *filename.split('/'))
+            parent = os.path.dirname(path)
+            if parent != self.directory:
+                os.makedirs(parent, exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+        # 多线程下为近似值，仅用于 manifest 统计
+        self.write_seconds += time.perf_counter() - start
+
+    def close(self, manifest):
+        with open(os.path.join(self.directory, MANIFEST_NAME), 'wb') as f:
+            f.write(manifest)
+
+
+class _ArchiveWriter:
+    """将文件顺序写入单个 zip / tar 归档，只能由一个线程调用"""
+
+    def __init__(self, path, archive_format):
+        self.write_seconds = 0.0
+        self._timestamp = time.time()
+        if archive_format == 'zip':
+            self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+            self._tar = None
+        else:
+            self._zip = None
+            self._tar = tarfile.open(path, ARCHIVE_FORMATS[archive_format])
+
+    def write_many(self, items):
+        start = time.perf_counter()
+        for filename, data in items:
+            self._add(filename, data)
+        self.write_seconds += time.perf_counter() - start
+
+    def close(self, manifest):
+        try:
+            self._add(MANIFEST_NAME, manifest)
+        finally:
+            if self._zip is not None:
+                self._zip.close()
+            else:
+                self._tar.close()
+
+    def _add(self, filename, data):
+        if self._zip is not None:
+            self._zip.writestr(filename, data)
+        else:
+            info = tarfile.TarInfo(filename)
+            info.size = len(data)
+            info.mtime = self._timestamp
+            self._tar.addfile(info, io.BytesIO(data))
@@ -0,0 +1,539 @@
+"""
+性能基准测试脚本
+
+用法:
+    python benchmark.py import --rows 1000000
+    python benchmark.py constants --renders 2000
+    python benchmark.py incremental --records 2000
+    python benchmark.py serve --clients 8 --duration 10
+    python benchmark.py stream --rows 10000 50000 200000
+    python benchmark.py schema --variables 5000
+    python benchmark.py extract --template data_report.jinja --copies 200 --edits 200
+    python benchmark.py threads --threads 1 2 4 8 --operations 4000
+"""
+import argparse
+import csv
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from jinja2 import meta
+
+from data_import import RowStream, convert_value, load_table
+from render_server import RenderServer
+from template_processor import TemplateProcessor
+from variable_extractor import VariableExtractor
+from variable_model import COMPLEX_STRUCTURES, DEFAULT_VALUE, TYPE_PATTERNS, create_json_template
+
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'example')
+
+# tracemalloc.reset_peak 在 Python 3.9 才加入，更早的版本不统计流式渲染的内存峰值
+_CAN_RESET_PEAK = hasattr(tracemalloc, 'reset_peak')
+
+# data_report.jinja 的示例输入
+REPORT_DATA = {
+    'title': '月度报告',
+    'company': '示例公司',
+    'total_users': 123456,
+    'active_users': 65432,
+    'conversion_rate': 0.1234,
+    'revenue': 9876543.21,
+    'show_details': True,
+    'user_data': [
+        {'name': f'区域{i}', 'count': i * 100, 'percentage': i / 10} for i in range(50)
+    ],
+    'product_data': [
+        {'name': f'产品{i}', 'sales': i * 3, 'price': 19.99 + i} for i in range(50)
+    ],
+    'recommendations': ['建议一', '建议二', '建议三'],
+}
+
+# chat_template.jinja 的示例输入
+CHAT_MESSAGES = [
+    {
+        'role': 'user',
+        'content': [{
+            'type': 'text',
+            'source_lang_code': 'en',
+            'target_lang_code': 'de-DE',
+            'text': 'Hello world',
+        }],
+    },
+]
+
+# 增量提取器与 meta.find_undeclared_variables 的作用域一致性用例
+EXTRACT_PARITY_CASES = [
+    "{% with x = y, z = x %}{{ z }}{% endwith %}",
+    "{% with x = 1 %}{{ x }}{% endwith %}{{ x }}",
+    "{% set a = b %}{{ a }}{{ c }}",
+    "{% set a %}{{ b }}{% endset %}{{ a }}",
+    "{% for k, v in items if v > limit %}{{ k }}{{ loop.index }}{% else %}{{ k }}{% endfor %}{{ v }}",
+    "{% if cond %}{% set a = 1 %}{% endif %}{{ a }}",
+    "{% macro m(p, q=default) %}{{ p }}{{ q }}{{ r }}{% endmacro %}{{ m(arg) }}",
+    "{% call(row) m(data) %}{{ row }}{{ other }}{% endcall %}{% macro m(x) %}{{ caller(x) }}{% endmacro %}",
+    "{% block body %}{% set a = 1 %}{{ a }}{{ b }}{% endblock %}{{ a }}",
+    "{% import 'forms.html' as forms %}{% from name import field as f %}{{ forms.x }}{{ f }}",
+    "{% include [primary, 'fallback.html'] ignore missing %}",
+    "{% filter upper|replace(old, new) %}{{ text }}{% endfilter %}",
+    "{{ range(n)|join(sep) }}{{ x.y['z'] }}{{ dict(a=b) }}",
+]
+
+
+def _timed(func, *args, **kwargs):
+    """执行函数并返回 (结果, 耗时秒数)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _write_sample_table(file_path, rows, delimiter):
+    """生成测试用的数据表"""
+    rng = random.Random(42)
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=delimiter)
+        writer.writerow(['name', 'age', 'salary', 'active', 'skills', 'note'])
+        for i in range(rows):
+            writer.writerow([
+                f'user{i}',
+                rng.randint(18, 65),
+                f'{rng.uniform(1000, 50000):.2f}',
+                rng.choice(['true', 'false']),
+                '["python", "jinja"]',
+                '' if i % 3 else 'note',
+            ])
+
+
+def _load_table_per_cell(file_path, delimiter):
+    """逐个单元格转换的基线实现"""
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader)
+        records = []
+        for row in reader:
+            record = {}
+            for name, cell in zip(header, row):
+                cell = cell.strip()
+                if cell:
+                    record[name] = convert_value(cell)
+            records.append(record)
+        return records
+
+
+def bench_import(args):
+    """CSV/TSV 批量导入：按列推断 vs 逐个单元格转换"""
+    delimiter = '\t' if args.format == 'tsv' else ','
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, f'sample.{args.format}')
+        _write_sample_table(file_path, args.rows, delimiter)
+        size_mb = os.path.getsize(file_path) / 1024 / 1024
+        print(f"数据表: {args.rows} 行, {size_mb:.1f} MB")
+
+        baseline, baseline_time = _timed(_load_table_per_cell, file_path, delimiter)
+        columnar, columnar_time = _timed(load_table, file_path)
+
+        assert baseline == columnar, "按列推断结果与逐个转换不一致"
+        print(f"逐个单元格转换: {baseline_time:.3f}s")
+        print(f"按列推断转换:   {columnar_time:.3f}s ({baseline_time / columnar_time:.2f}x)")
+
+
+def _read_example(name):
+    """读取示例模板"""
+    with open(os.path.join(EXAMPLE_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _render_many(processor, template_content, variables, renders):
+    """重复渲染同一模板"""
+    for _ in range(renders):
+        processor.render_template(template_content, variables)
+
+
+def bench_constants(args):
+    """常量提升：chat_template.jinja 中的 languages 字典每次渲染重建 vs 编译期计算一次"""
+    template_content = _read_example('chat_template.jinja')
+    variables = {'messages': CHAT_MESSAGES}
+
+    results = {}
+    for hoist in (False, True):
+        processor = TemplateProcessor(load_plugins=False, hoist_constants=hoist)
+        # 预热编译缓存，只统计渲染耗时
+        results[hoist] = processor.render_template(template_content, variables)
+        _, elapsed = _timed(_render_many, processor, template_content, variables, args.renders)
+        label = "提升常量" if hoist else "不提升常量"
+        print(f"{label}: {elapsed:.3f}s, 每次渲染 {elapsed / args.renders * 1e6:.1f}µs")
+
+    assert results[False] == results[True], "提升常量后渲染结果不一致"
+
+
+def bench_incremental(args):
+    """增量渲染：data_report.jinja 批量渲染只有 date 字段不同的记录"""
+    template_content = _read_example('data_report.jinja')
+    records = [dict(REPORT_DATA, date=f'2024-01-{i % 28 + 1:02d}') for i in range(args.records)]
+
+    results = {}
+    for incremental in (False, True):
+        processor = TemplateProcessor(load_plugins=False)
+        results[incremental], elapsed = _timed(
+            processor.render_batch, template_content, records, incremental=incremental
+        )
+        label = "增量渲染" if incremental else "整体渲染"
+        print(f"{label}: {elapsed:.3f}s, 每条记录 {elapsed / args.records * 1e6:.1f}µs")
+        if incremental:
+            print(processor.get_incremental_renderer(template_content).get_stats())
+
+    assert results[False] == results[True], "增量渲染结果不一致"
+
+
+def _load_client(host, port, payload, deadline, latencies, errors):
+    """使用保持连接的 HTTP 客户端持续发送渲染请求"""
+    body = json.dumps(payload).encode('utf-8')
+    headers = {'Content-Type': 'application/json'}
+    connection = http.client.HTTPConnection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            connection.request('POST', '/render', body, headers)
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            if response.status != 200:
+                errors.append(response.status)
+    finally:
+        connection.close()
+
+
+def bench_serve(args):
+    """渲染服务压测：多个保持连接的客户端向本机渲染服务持续发送请求"""
+    server = RenderServer(port=0, templates_dir=EXAMPLE_DIR, workers=args.workers,
+                          render_cache=not args.no_cache,
+                          processor_factory=lambda: TemplateProcessor(load_plugins=False))
+    host, port = server.address
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    payload = {'template': 'chat_template.jinja', 'variables': {'messages': CHAT_MESSAGES}}
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + args.duration
+    clients = [
+        threading.Thread(target=_load_client, args=(host, port, payload, deadline, latencies, errors))
+        for _ in range(args.clients)
+    ]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+
+    metrics = server.get_metrics()
+    server.shutdown()
+    server_thread.join()
+
+    latencies.sort()
+    count = len(latencies)
+    print(f"{args.clients} 个客户端, {args.workers} 个渲染线程, {elapsed:.1f}s")
+    print(f"请求数: {count}, 错误: {len(errors)}, 吞吐量: {count / elapsed:.0f} req/s")
+    if count:
+        print(f"延迟 p50: {latencies[count // 2] * 1000:.2f}ms, "
+              f"p99: {latencies[min(count - 1, int(count * 0.99))] * 1000:.2f}ms")
+    print(f"渲染缓存命中率: {metrics['render_cache']['hit_rate']:.1%}")
+
+
+def _write_sample_rows(file_path, rows):
+    """生成 data_report.jinja 中 user_data 格式的 JSON Lines 文件"""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for i in range(rows):
+            f.write(json.dumps({'name': f'区域{i}', 'count': i, 'percentage': i % 1000 / 10},
+                               ensure_ascii=False) + '\n')
+
+
+def _peak_memory(func, *args):
+    """执行函数并返回 (结果, 执行期间 tracemalloc 记录的内存峰值)，无法统计时峰值为 None"""
+    if not _CAN_RESET_PEAK:
+        return func(*args), None
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    result = func(*args)
+    return result, tracemalloc.get_traced_memory()[1] - base
+
+
+def _format_peak(peak):
+    return "不可用" if peak is None else f"{peak / 1024 / 1024:.2f} MB"
+
+
+def _render_materialized(processor, template_content, variables, file_path, output_path):
+    """基线：先把所有行读入列表，再渲染出完整文本后写入"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    text = processor.render_template(template_content, dict(variables, user_data=rows))
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return len(text)
+
+
+def bench_stream(args):
+    """流式渲染：data_report.jinja 的 user_data 从 JSON Lines 按需读取并直接写入文件，内存峰值不随行数增长"""
+    template_content = _read_example('data_report.jinja')
+    variables = dict(REPORT_DATA, date='2024-01-01')
+    processor = TemplateProcessor(load_plugins=False)
+    processor.get_compiled(template_content)
+
+    if _CAN_RESET_PEAK:
+        tracemalloc.start()
+    else:
+        print(f"Python {sys.version_info[0]}.{sys.version_info[1]} 没有 tracemalloc.reset_peak，内存峰值不可用")
+    peaks = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, 'report.html')
+            for rows in args.rows:
+                file_path = os.path.join(tmp_dir, f'rows_{rows}.jsonl')
+                _write_sample_rows(file_path, rows)
+
+                stream_variables = dict(variables, user_data=RowStream(file_path))
+                (written, streamed_peak), streamed_time = _timed(
+                    _peak_memory, processor.render_to_file, template_content, stream_variables, output_path
+                )
+                line = (f"{rows:>8} 行: 流式 {streamed_time:.2f}s 峰值 {_format_peak(streamed_peak)}, "
+                        f"输出 {written / 1024 / 1024:.1f} MB")
+                if not args.skip_baseline:
+                    (_, baseline_peak), baseline_time = _timed(
+                        _peak_memory, _render_materialized, processor, template_content, variables,
+                        file_path, output_path
+                    )
+                    line += f" | 全部载入 {baseline_time:.2f}s 峰值 {_format_peak(baseline_peak)}"
+                print(line)
+                peaks.append(streamed_peak)
+                os.remove(file_path)
+    finally:
+        if _CAN_RESET_PEAK:
+            tracemalloc.stop()
+
+    if not _CAN_RESET_PEAK:
+        return
+    # 行数增加时流式渲染的峰值应基本不变（允许 2 倍以内的波动）
+    assert max(peaks) <= max(min(peaks) * 2, 1024 * 1024), "流式渲染的内存峰值随行数增长"
+    print("流式渲染内存峰值保持平稳")
+
+
+def _create_json_template_per_pattern(variables):
+    """对照实现：每个变量依次对所有模式做子串查找，再整体 json.dumps"""
+    template_dict = {}
+    for var in variables:
+        var_lower = var.lower()
+        template_dict[var] = DEFAULT_VALUE
+        for pattern, value in COMPLEX_STRUCTURES + TYPE_PATTERNS:
+            if (pattern.endswith('_') and var_lower.startswith(pattern[:-1])) or \
+               (not pattern.endswith('_') and pattern in var_lower):
+                template_dict[var] = value
+                break
+    return json.dumps(template_dict, ensure_ascii=False, indent=2)
+
+
+def bench_schema(args):
+    """JSON 模板推断：逐个模式查找 vs 合并正则与预先格式化的示例值"""
+    rng = random.Random(1)
+    words = ['user', 'name', 'item', 'count', 'total', 'enabled', 'message', 'config', 'x', 'value', 'add']
+    variables = [f"{rng.choice(words)}_{rng.choice(words)}_{i}" for i in range(args.variables)]
+
+    baseline, baseline_time = _timed(_create_json_template_per_pattern, variables)
+    combined, combined_time = _timed(create_json_template, variables)
+
+    assert baseline == combined, "合并正则推断结果与逐个模式查找不一致"
+    print(f"{args.variables} 个变量")
+    print(f"逐个模式查找: {baseline_time * 1000:.1f}ms")
+    print(f"合并正则:     {combined_time * 1000:.1f}ms ({baseline_time / combined_time:.2f}x)")
+
+
+def bench_extract(args):
+    """变量提取：整体解析 vs 增量提取器在每次编辑后的耗时（模板为多份示例模板拼接）"""
+    processor = TemplateProcessor(load_plugins=False)
+    examples = [_read_example(name) for name in sorted(os.listdir(EXAMPLE_DIR))]
+    for case in examples + EXTRACT_PARITY_CASES:
+        expected = meta.find_undeclared_variables(processor.env.parse(case))
+        assert set(VariableExtractor(processor.env).extract(case)) == expected, \
+            f"增量提取结果与 meta.find_undeclared_variables 不一致: {case[:60]!r}"
+    print(f"一致性检查: {len(examples) + len(EXTRACT_PARITY_CASES)} 个模板与 meta.find_undeclared_variables 一致")
+
+    template_content = _read_example(args.template) * args.copies
+    size_kb = len(template_content.encode('utf-8')) / 1024
+    print(f"模板: {size_kb:.0f} KB")
+
+    _, parse_time = _timed(processor.env.parse, template_content)
+    print(f"整体解析: {parse_time * 1000:.1f}ms")
+
+    extractor = VariableExtractor(processor.env)
+    _, first_time = _timed(extractor.extract, template_content)
+    print(f"增量提取器首次提取: {first_time * 1000:.1f}ms")
+
+    # 在随机位置插入不完整的片段，模拟编辑过程
+    rng = random.Random(1)
+    fragments = ['{{ ', '{{ new_var', ' }}', '{% if ', '{% for item in items %}', "'", '{% endfor %}']
+    timings = []
+    for _ in range(args.edits):
+        position = rng.randrange(len(template_content))
+        template_content = template_content[:position] + rng.choice(fragments) + template_content[position:]
+        variables, elapsed = _timed(extractor.extract, template_content)
+        timings.append(elapsed)
+    assert variables == VariableExtractor(processor.env).extract(template_content), "增量提取结果与重新提取不一致"
+
+    timings.sort()
+    print(f"每次编辑: 中位数 {timings[len(timings) // 2] * 1000:.2f}ms, "
+          f"p95 {timings[int(len(timings) * 0.95)] * 1000:.2f}ms, 最大 {timings[-1] * 1000:.2f}ms")
+
+
+def _thread_workload(records):
+    """
+    多线程基准的操作列表及单线程下的预期结果
+
+    操作依次为整体渲染、增量渲染和变量提取，使用两个示例模板和不同的记录，
+    提取的模板末尾追加各不相同的变量，避免所有线程命中同一结果。
+
+    Returns:
+        list: [(操作名, 模板, 参数, 预期结果)]
+    """
+    reference = TemplateProcessor(load_plugins=False)
+    report = _read_example('data_report.jinja')
+    chat = _read_example('chat_template.jinja')
+    workload = []
+    for i in range(records):
+        variables = dict(REPORT_DATA, date=f'2024-01-{i % 28 + 1:02d}', total_users=i)
+        workload.append(('render', report, variables, reference.render_template(report, variables)))
+        workload.append(('incremental', report, variables, reference.render_incremental(report, variables)))
+        messages = [dict(CHAT_MESSAGES[0], content=[dict(CHAT_MESSAGES[0]['content'][0], text=f'Hello {i}')])]
+        workload.append(('render', chat, {'messages': messages},
+                         reference.render_template(chat, {'messages': messages})))
+        source = report + f'{{{{ extra_{i} }}}}'
+        workload.append(('extract', source, None, reference.extract_variables(source, incremental=True)))
+    return workload
+
+
+def _run_thread_workload(processor, workload, operations, start, errors):
+    """在当前线程执行 operations 次操作并与预期结果比较"""
+    for index in range(start, start + operations):
+        name, template_content, variables, expected = workload[index % len(workload)]
+        try:
+            if name == 'render':
+                result = processor.render_template(template_content, variables)
+            elif name == 'incremental':
+                result = processor.render_incremental(template_content, variables)
+            else:
+                result = processor.extract_variables(template_content, incremental=True)
+            if result != expected:
+                errors.append(f"{name} 结果与单线程不一致")
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+
+
+def _run_threads(processor, workload, threads, operations):
+    """
+    用 threads 个线程共享同一个处理器执行共 operations 次操作
+
+    Returns:
+        tuple: (耗时秒数, 错误列表)
+    """
+    errors = []
+    per_thread = operations // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(number):
+        barrier.wait()
+        _run_thread_workload(processor, workload, per_thread, number * per_thread, errors)
+
+    workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start, errors
+
+
+def bench_threads(args):
+    """多线程共享 TemplateProcessor：压力检查结果一致性，并测量 1 到 N 个线程的吞吐量"""
+    gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f"Python {sys.version.split()[0]}，GIL {'开启' if gil_enabled else '关闭（free-threaded）'}")
+    workload = _thread_workload(args.records)
+
+    # 压力检查：极小的模板缓存和开启的渲染结果缓存让各线程不断淘汰、重新编译和写入
+    stress = TemplateProcessor(load_plugins=False, template_cache_size=1)
+    stress.enable_render_cache(max_entries=8)
+    threads = max(args.threads)
+    _, errors = _run_threads(stress, workload, threads, args.stress_operations)
+    assert not errors, f"{len(errors)} 个操作出错，例如: {errors[0]}"
+    print(f"压力检查: {threads} 个线程 {args.stress_operations} 次操作，结果与单线程一致")
+
+    baseline = None
+    for threads in args.threads:
+        processor = TemplateProcessor(load_plugins=False)
+        # 预热编译缓存和增量渲染器，只统计稳定状态的吞吐量
+        _run_thread_workload(processor, workload, len(workload), 0, [])
+        elapsed, errors = _run_threads(processor, workload, threads, args.operations)
+        assert not errors, f"{len(errors)} 个操作出错，例如: {errors[0]}"
+        throughput = args.operations // threads * threads / elapsed
+        baseline = baseline or throughput
+        print(f"{threads:>3} 个线程: {throughput:,.0f} 次操作/秒 ({throughput / baseline:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JinjaUtilGUI 性能基准测试")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help=bench_import.__doc__)
+    import_parser.add_argument('--rows', type=int, default=1000000)
+    import_parser.add_argument('--format', choices=['csv', 'tsv'], default='csv')
+    import_parser.set_defaults(func=bench_import)
+
+    constants_parser = subparsers.add_parser('constants', help=bench_constants.__doc__)
+    constants_parser.add_argument('--renders', type=int, default=2000)
+    constants_parser.set_defaults(func=bench_constants)
+
+    incremental_parser = subparsers.add_parser('incremental', help=bench_incremental.__doc__)
+    incremental_parser.add_argument('--records', type=int, default=2000)
+    incremental_parser.set_defaults(func=bench_incremental)
+
+    serve_parser = subparsers.add_parser('serve', help=bench_serve.__doc__)
+    serve_parser.add_argument('--clients', type=int, default=8)
+    serve_parser.add_argument('--workers', type=int, default=4)
+    serve_parser.add_argument('--duration', type=float, default=10.0)
+    serve_parser.add_argument('--no-cache', action='store_true', help="关闭渲染结果缓存")
+    serve_parser.set_defaults(func=bench_serve)
+
+    stream_parser = subparsers.add_parser('stream', help=bench_stream.__doc__)
+    stream_parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000, 200000])
+    stream_parser.add_argument('--skip-baseline', action='store_true', help="不运行全部载入内存的对照渲染")
+    stream_parser.set_defaults(func=bench_stream)
+
+    schema_parser = subparsers.add_parser('schema', help=bench_schema.__doc__)
+    schema_parser.add_argument('--variables', type=int, default=5000)
+    schema_parser.set_defaults(func=bench_schema)
+
+    extract_parser = subparsers.add_parser('extract', help=bench_extract.__doc__)
+    extract_parser.add_argument('--template', default='data_report.jinja', help="example 目录中的模板")
+    extract_parser.add_argument('--copies', type=int, default=200)
+    extract_parser.add_argument('--edits', type=int, default=200)
+    extract_parser.set_defaults(func=bench_extract)
+
+    threads_parser = subparsers.add_parser('threads', help=bench_threads.__doc__)
+    threads_parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    threads_parser.add_argument('--operations', type=int, default=4000)
+    threads_parser.add_argument('--records', type=int, default=16, help="不同输入记录的数量")
+    threads_parser.add_argument('--stress-operations', type=int, default=400,
+                                help="压力检查的操作次数，每次操作都会重新编译模板")
+    threads_parser.set_defaults(func=bench_threads)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+import csv
+import gc
+import json
+import os
+
+
+# 表格中的空单元格在记录中被省略，与表单中留空的变量一致
+_MISSING = object()
+
+# 根据扩展名选择分隔符
+_DELIMITERS = {
+    '.csv': ',',
+    '.tsv': '\t',
+    '.tab': '\t',
+}
+
+
+def convert_value(value):
+    """
+    尝试转换值的类型
+
+    Args:
+        value (str): 已去除首尾空白的字符串
+
+    Returns:
+        转换后的 int / float / bool / list，无法转换时返回原字符串
+    """
+    # 尝试转换为数字
+    try:
+        if '.' in value:
+            return float(value)
+        else:
+            return int(value)
+    except ValueError:
+        pass
+
+    # 尝试转换为布尔值
+    if value.lower() in ['true', 'false']:
+        return value.lower() == 'true'
+
+    # 尝试转换为列表（简单判断）
+    if value.startswith('[') and value.endswith(']'):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            pass
+
+    # 默认返回字符串
+    return value
+
+
+def convert_column(cells):
+    """
+    按列转换单元格类型
+
+    先对整列尝试一次 int / float / bool 推断，整列成功时直接批量转换；
+    类型混杂的列回退到逐个单元格调用 convert_value，因此结果与逐个转换完全一致。
+
+    Args:
+        cells (list): 已去除首尾空白的字符串列表
+
+    Returns:
+        list: 转换后的值列表，空单元格为 _MISSING
+    """
+    filled = [cell for cell in cells if cell]
+    if not filled:
+        return [_MISSING] * len(cells)
+
+    converter = _infer_column_converter(filled)
+    if len(filled) == len(cells):
+        return list(map(converter, cells))
+    return [converter(cell) if cell else _MISSING for cell in cells]
+
+
+def _infer_column_converter(filled):
+    """推断整列的转换函数"""
+    dotted = sum(1 for cell in filled if '.' in cell)
+
+    # 整列整数
+    if dotted == 0:
+        try:
+            list(map(int, filled))
+            return int
+        except ValueError:
+            pass
+
+    # 整列浮点数
+    elif dotted == len(filled):
+        try:
+            list(map(float, filled))
+            return float
+        except ValueError:
+            pass
+
+    # 整列布尔值
+    if all(cell.lower() in ('true', 'false') for cell in filled):
+        return _to_bool
+
+    # 类型混杂，逐个转换
+    return _memoized_convert()
+
+
+def _memoized_convert():
+    """
+    返回带列内缓存的 convert_value
+
+    重复出现的单元格只转换一次。列表结果在命中时返回浅拷贝，
+    含嵌套容器的列表不缓存，避免多条记录共享同一个可变对象。
+    """
+    cache = {}
+    lists = {}
+
+    def convert(value):
+        try:
+            return cache[value]
+        except KeyError:
+            pass
+        try:
+            return list(lists[value])
+        except KeyError:
+            pass
+
+        result = convert_value(value)
+        if not isinstance(result, list):
+            cache[value] = result
+        elif not any(isinstance(item, (list, dict)) for item in result):
+            lists[value] = list(result)
+        return result
+
+    return convert
+
+
+def _to_bool(value):
+    """将 'true' / 'false'（不区分大小写）转换为布尔值"""
+    return value.lower() == 'true'
+
+
+def detect_delimiter(file_path, sample=None):
+    """
+    根据扩展名或内容猜测分隔符
+
+    Args:
+        file_path (str): 文件路径
+        sample (str): 文件开头的文本，用于扩展名无法判断时嗅探
+
+    Returns:
+        str: 分隔符
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in _DELIMITERS:
+        return _DELIMITERS[ext]
+
+    if sample:
+        try:
+            return csv.Sniffer().sniff(sample, delimiters=',\t;').delimiter
+        except csv.Error:
+            pass
+    return ','
+
+
+def records_from_rows(header, rows):
+    """
+    将表头和行数据转换为带类型的记录列表
+
+    Args:
+        header (list): 列名列表
+        rows (list): 每行为字符串列表
+
+    Returns:
+        list: 字典记录列表，空单元格对应的键被省略
+    """
+    # 批量创建大量对象时暂停循环垃圾回收，避免反复全量扫描
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _records_from_rows(header, rows)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _records_from_rows(header, rows):
+    """records_from_rows 的实现部分"""
+    width = len(header)
+    rows = list(rows)
+    # 短行补空，长行截断，然后按列转置
+    if any(len(row) != width for row in rows):
+        rows = [(list(row) + [''] * width)[:width] for row in rows]
+    if not rows:
+        return []
+    columns = [list(map(str.strip, column)) for column in zip(*rows)]
+    del rows
+
+    converted = [convert_column(column) for column in columns]
+    del columns
+
+    records = [dict(zip(header, values)) for values in zip(*converted)]
+
+    # 只遍历含空单元格的列，删除对应的键
+    for name, values in zip(header, converted):
+        if _MISSING in values:
+            for record in records:
+                if record[name] is _MISSING:
+                    del record[name]
+    return records
+
+
+def load_table(file_path, delimiter=None, encoding='utf-8-sig'):
+    """
+    读取 CSV / TSV 文件为带类型的记录列表
+
+    第一行为变量名，其余每行为一条记录。类型按列推断一次，
+    语义与表单输入的类型转换相同。
+
+    Args:
+        file_path (str): 文件路径
+        delimiter (str): 分隔符，为 None 时自动判断
+        encoding (str): 文件编码
+
+    Returns:
+        list: 字典记录列表，可直接用于批量渲染
+    """
+    with open(file_path, 'r', encoding=encoding, newline='') as f:
+        if delimiter is None:
+            sample = f.read(8192)
+            f.seek(0)
+            delimiter = detect_delimiter(file_path, sample)
+
+        reader = csv.reader(f, delimiter=delimiter)
+        try:
+            header = [name.strip() for name in next(reader)]
+        except StopIteration:
+            return []
+
+        return records_from_rows(header, reader)
+
+
+# 数据中表示文件引用的键，例如 {"rows": {"$file": "rows.jsonl"}}
+FILE_REFERENCE_KEY = '$file'
+
+# 按扩展名识别 JSON Lines 文件
+_JSONL_EXTENSIONS = frozenset(['.jsonl', '.ndjson'])
+
+
+class RowStream:
+    """
+    按需读取 JSON Lines / CSV / TSV 文件的可重复迭代行数据
+
+    每次迭代重新打开文件并逐行产出记录，任何时刻内存中只有当前行，
+    因此模板中的 for 循环可以处理任意行数。同一变量被多次循环时每次都从头读取。
+    CSV / TSV 的单元格按 convert_value 逐个转换类型，空单元格被省略。
+    """
+
+    def __init__(self, file_path, format=None, delimiter=None, encoding='utf-8-sig'):
+        """
+        Args:
+            file_path (str): 文件路径
+            format (str): 'jsonl' 或 'table'，为 None 时按扩展名判断
+            delimiter (str): 表格分隔符，为 None 时自动判断
+            encoding (str): 文件编码
+        """
+        if format is None:
+            ext = os.path.splitext(file_path)[1].lower()
+            format = 'jsonl' if ext in _JSONL_EXTENSIONS else 'table'
+        if format not in ('jsonl', 'table'):
+            raise ValueError(f"不支持的行数据格式: {format}")
+        self.file_path = file_path
+        self.format = format
+        self.delimiter = delimiter
+        self.encoding = encoding
+        self._length = None
+
+    def __iter__(self):
+        if self.format == 'jsonl':
+            return self._iter_jsonl()
+        return self._iter_table()
+
+    def __len__(self):
+        """逐行计数，不保留行数据；文件未变化时复用上次的结果"""
+        stat = os.stat(self.file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self._length is None or self._length[0] != signature:
+            self._length = (signature, sum(1 for _ in self))
+        return self._length[1]
+
+    def __repr__(self):
+        return f"RowStream({self.file_path!r}, format={self.format!r})"
+
+    def _iter_jsonl(self):
+        with open(self.file_path, 'r', encoding=self.encoding) as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{self.file_path} 第 {line_number} 行不是有效的 JSON: {e}")
+
+    def _iter_table(self):
+        with open(self.file_path, 'r', encoding=self.encoding, newline='') as f:
+            delimiter = self.delimiter
+            if delimiter is None:
+                sample = f.read(8192)
+                f.seek(0)
+                delimiter = detect_delimiter(self.file_path, sample)
+
+            reader = csv.reader(f, delimiter=delimiter)
+            try:
+                header = [name.strip() for name in next(reader)]
+            except StopIteration:
+                return
+            for row in reader:
+                record = {}
+                for name, cell in zip(header, row):
+                    cell = cell.strip()
+                    if cell:
+                        record[name] = convert_value(cell)
+                yield record
+
+
+def resolve_file_references(value, base_dir=None):
+    """
+    将数据中的 {"$file": 路径} 替换为按需读取的 RowStream
+
+    引用对象还可以包含 format（'jsonl' / 'table'）、delimiter 和 encoding。
+    没有引用的容器原样返回，不会被复制。
+
+    Args:
+        value: JSON 数据
+        base_dir (str): 相对路径的基准目录，为 None 时使用当前目录
+
+    Returns:
+        替换后的数据
+    """
+    if isinstance(value, dict):
+        if FILE_REFERENCE_KEY in value:
+            file_path = value[FILE_REFERENCE_KEY]
+            if not isinstance(file_path, str):
+                raise ValueError(f"{FILE_REFERENCE_KEY} 必须是文件路径字符串")
+            if base_dir and not os.path.isabs(file_path):
+                file_path = os.path.join(base_dir, file_path)
+            if not os.path.isfile(file_path):
+                raise ValueError(f"引用的数据文件不存在: {file_path}")
+            return RowStream(file_path, format=value.get('format'), delimiter=value.get('delimiter'),
+                             encoding=value.get('encoding', 'utf-8-sig'))
+        resolved = None
+        for key, item in value.items():
+            new_item = resolve_file_references(item, base_dir)
+            if new_item is not item:
+                if resolved is None:
+                    resolved = dict(value)
+                resolved[key] = new_item
+        return value if resolved is None else resolved
+
+    if isinstance(value, list):
+        resolved = None
+        for index, item in enumerate(value):
+            new_item = resolve_file_references(item, base_dir)
+            if new_item is not item:
+                if resolved is None:
+                    resolved = list(value)
+                resolved[index] = new_item
+        return value if resolved is None else resolved
+    return value
@@ -0,0 +1,305 @@
+import functools
+import hashlib
+import importlib
+import threading
+import time
+from collections import OrderedDict
+from importlib import metadata
+
+
+class FilterRegistry:
+    """Jinja2 过滤器与全局函数注册表"""
+
+    # 插件入口点分组
+    ENTRY_POINT_GROUPS = {
+        'filter': 'jinjautil.filters',
+        'global': 'jinjautil.globals',
+    }
+
+    # Jinja2 内置的非确定性过滤器和全局函数
+    BUILTIN_NONDETERMINISTIC = {
+        'filter': frozenset(['random']),
+        'global': frozenset(['lipsum']),
+    }
+
+    def __init__(self, cache_size=1024):
+        """
+        初始化注册表
+
+        Args:
+            cache_size (int): 纯函数过滤器的默认缓存条目上限
+        """
+        self.cache_size = cache_size
+        self._entries = {'filter': {}, 'global': {}}
+
+    def register(self, name, func, kind='filter', pure=False, cache_size=None, deterministic=True):
+        """
+        注册过滤器或全局函数
+
+        Args:
+            name (str): 在模板中使用的名称
+            func (callable): 实现函数
+            kind (str): 'filter' 或 'global'
+            pure (bool): 为 True 表示相同参数总是返回相同结果且无副作用，可被缓存
+            cache_size (int): 该函数的缓存条目上限，默认使用注册表设置
+            deterministic (bool): 为 False 表示结果随时间或随机变化，使用它的模板不缓存渲染结果
+
+        Returns:
+            callable: 原函数，便于作为装饰器使用
+        """
+        if kind not in self._entries:
+            raise ValueError(f"未知的注册类型: {kind}")
+        if cache_size is None:
+            cache_size = self.cache_size
+        self._entries[kind][name] = _RegisteredFunction(name, func, pure, cache_size, deterministic)
+        return func
+
+    def filter(self, name=None, pure=False, cache_size=None, deterministic=True):
+        """注册过滤器的装饰器"""
+        def decorator(func):
+            return self.register(name or func.__name__, func, 'filter', pure, cache_size, deterministic)
+        return decorator
+
+    def global_function(self, name=None, pure=False, cache_size=None, deterministic=True):
+        """注册全局函数的装饰器"""
+        def decorator(func):
+            return self.register(name or func.__name__, func, 'global', pure, cache_size, deterministic)
+        return decorator
+
+    def load_entry_points(self):
+        """
+        从已安装包的入口点加载插件
+
+        入口点可以直接指向过滤器函数，也可以指向接收注册表的 register(registry) 函数。
+        """
+        try:
+            all_entry_points = metadata.entry_points()
+        except Exception as e:
+            print(f"Failed to query entry points: {e}")
+            return
+
+        for kind, group in self.ENTRY_POINT_GROUPS.items():
+            try:
+                # Python 3.10 起返回 EntryPoints，3.8 / 3.9 返回按分组的字典
+                if hasattr(all_entry_points, 'select'):
+                    entry_points = all_entry_points.select(group=group)
+                else:
+                    entry_points = all_entry_points.get(group, [])
+            except Exception as e:
+                print(f"Failed to query entry points for {group}: {e}")
+                continue
+
+            for entry_point in entry_points:
+                try:
+                    obj = entry_point.load()
+                except Exception as e:
+                    print(f"Failed to load plugin {entry_point.name}: {e}")
+                    continue
+
+                if getattr(obj, '__name__', None) == 'register':
+                    obj(self)
+                else:
+                    self.register(entry_point.name, obj, kind, **_declared_flags(obj))
+
+    def load_module(self, module_name):
+        """
+        从模块加载插件
+
+        模块可以提供 register(registry) 函数，或 FILTERS / GLOBALS 字典；
+        字典中的函数可以通过 jinjautil_pure = True 属性声明为纯函数，
+        通过 jinjautil_deterministic = False 属性声明为非确定性函数。
+
+        Args:
+            module_name (str): 可导入的模块名
+        """
+        module = importlib.import_module(module_name)
+
+        if hasattr(module, 'register'):
+            module.register(self)
+            return
+
+        for kind, attr in (('filter', 'FILTERS'), ('global', 'GLOBALS')):
+            for name, func in getattr(module, attr, {}).items():
+                self.register(name, func, kind, **_declared_flags(func))
+
+    def install(self, env):
+        """
+        将注册的函数安装到 Jinja2 环境
+
+        Args:
+            env (Environment): Jinja2 环境
+        """
+        for name, entry in self._entries['filter'].items():
+            env.filters[name] = entry.wrapper
+        for name, entry in self._entries['global'].items():
+            env.globals[name] = entry.wrapper
+
+    def fingerprint(self):
+        """
+        计算注册内容的指纹，插件或过滤器模块变化时指纹随之变化
+
+        指纹包含每个函数的名称、所在模块、限定名、缓存标记以及字节码和常量，
+        用于区分不同过滤器集合产生的渲染结果缓存。
+
+        Returns:
+            str: 十六进制摘要
+        """
+        digest = hashlib.sha256()
+        for kind in sorted(self._entries):
+            for name, entry in sorted(self._entries[kind].items()):
+                func = entry.func
+                code = getattr(func, '__code__', None)
+                digest.update(repr((
+                    kind, name, entry.pure, entry.deterministic,
+                    getattr(func, '__module__', None), getattr(func, '__qualname__', repr(type(func))),
+                )).encode('utf-8'))
+                if code is not None:
+                    digest.update(code.co_code)
+                    digest.update(repr(code.co_consts).encode('utf-8'))
+        return digest.hexdigest()
+
+    def nondeterministic_names(self, kind):
+        """
+        获取非确定性的过滤器或全局函数名称
+
+        Args:
+            kind (str): 'filter' 或 'global'
+
+        Returns:
+            set: 名称集合
+        """
+        names = {name for name, entry in self._entries[kind].items() if not entry.deterministic}
+        # 内置函数未被覆盖时仍然视为非确定性
+        names.update(name for name in self.BUILTIN_NONDETERMINISTIC[kind]
+                     if name not in self._entries[kind])
+        return names
+
+    def get_stats(self):
+        """
+        获取每个函数的调用统计
+
+        Returns:
+            dict: {名称: {'kind', 'pure', 'calls', 'cache_hits', 'total_time'}}，按总耗时降序
+        """
+        stats = {}
+        for kind, entries in self._entries.items():
+            for name, entry in entries.items():
+                calls, cache_hits, total_time = entry.snapshot()
+                stats[name] = {
+                    'kind': kind,
+                    'pure': entry.pure,
+                    'calls': calls,
+                    'cache_hits': cache_hits,
+                    'total_time': total_time,
+                }
+        return dict(sorted(stats.items(), key=lambda item: item[1]['total_time'], reverse=True))
+
+    def reset_stats(self):
+        """清空调用统计和缓存"""
+        for entries in self._entries.values():
+            for entry in entries.values():
+                entry.reset()
+
+
+def _declared_flags(func):
+    """读取插件函数上声明的 jinjautil_pure / jinjautil_deterministic 属性"""
+    return {
+        'pure': getattr(func, 'jinjautil_pure', False),
+        'deterministic': getattr(func, 'jinjautil_deterministic', True),
+    }
+
+
+# 缓存未命中的标记，缓存的结果本身可能是 None
+_MISSING = object()
+
+
+class _RegisteredFunction:
+    """带计时和可选缓存的函数包装，统计和缓存的写入加锁，可被多个线程同时调用"""
+
+    __slots__ = ('name', 'func', 'pure', 'deterministic', 'cache_size', 'calls', 'cache_hits',
+                 'total_time', '_cache', '_lock', 'wrapper')
+
+    def __init__(self, name, func, pure, cache_size, deterministic=True):
+        self.name = name
+        self.func = func
+        # 非确定性函数不能缓存
+        self.deterministic = deterministic
+        self.pure = pure and deterministic and cache_size > 0
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset()
+
+        # functools.wraps 会复制 jinja_pass_arg 等属性，保留 pass_context 等装饰器的效果
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self(args, kwargs)
+
+        self.wrapper = wrapper
+
+    def reset(self):
+        """清空统计和缓存"""
+        with self._lock:
+            self.calls = 0
+            self.cache_hits = 0
+            self.total_time = 0.0
+            self._cache.clear()
+
+    def snapshot(self):
+        """
+        获取一致的统计快照
+
+        Returns:
+            tuple: (调用次数, 缓存命中次数, 总耗时)
+        """
+        with self._lock:
+            return self.calls, self.cache_hits, self.total_time
+
+    def __call__(self, args, kwargs):
+        start = time.perf_counter()
+        hit = False
+        try:
+            if not self.pure:
+                return self.func(*args, **kwargs)
+
+            key = self._make_key(args, kwargs)
+            if key is None:
+                return self.func(*args, **kwargs)
+
+            # 查询不加锁，命中后在锁内更新 LRU 顺序
+            result = self._cache.get(key, _MISSING)
+            if result is not _MISSING:
+                hit = True
+                return result
+
+            result = self.func(*args, **kwargs)
+            with self._lock:
+                self._cache[key] = result
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.calls += 1
+                self.total_time += elapsed
+                if hit:
+                    self.cache_hits += 1
+                    if key in self._cache:
+                        self._cache.move_to_end(key)
+
+    @staticmethod
+    def _make_key(args, kwargs):
+        """
+        生成缓存键，参数不可哈希时返回 None
+
+        键中包含参数类型，避免 Markup 与 str、1 与 1.0 与 True 这类相等值共用结果。
+        """
+        key = tuple((type(arg), arg) for arg in args)
+        if kwargs:
+            key += tuple(sorted((name, type(value), value) for name, value in kwargs.items()))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
@@ -0,0 +1,262 @@
+import threading
+from collections import OrderedDict
+
+from jinja2 import meta, nodes
+
+from render_cache import UncacheableValue, canonical_hash
+
+
+# 顶层的定义语句不产生输出，只为后续片段提供名称
+_DEFINITION_NODES = (nodes.Assign, nodes.AssignBlock, nodes.Macro, nodes.Import, nodes.FromImport)
+
+# 出现这些节点时片段可能依赖任意变量
+_DYNAMIC_NODES = (nodes.Include, nodes.Import, nodes.FromImport)
+
+
+class IncrementalRenderer:
+    """
+    按顶层片段增量渲染模板
+
+    模板顶层的每个输出节点（文本、if、for、block 等）作为一个片段，
+    记录其读取的变量并缓存输出；再次渲染时只重新执行输入发生变化的片段。
+    片段依赖的顶层 set / macro / import 定义会作为前导语句一并编译。
+    无法安全拆分的模板（extends、namespace 赋值、片段间共享 set 变量）回退为整体渲染。
+    片段在锁外渲染，片段缓存和统计的更新加锁，同一个渲染器可以在多个线程间共享。
+    """
+
+    def __init__(self, processor, template_content, segment_cache_size=32):
+        """
+        初始化增量渲染器
+
+        Args:
+            processor (TemplateProcessor): 提供环境、过滤器和常量提升的模板处理器
+            template_content (str): 模板字符串
+            segment_cache_size (int): 每个片段保留的输出缓存条目数
+        """
+        self.processor = processor
+        self.env = processor.env
+        self.segment_cache_size = segment_cache_size
+        self.segments = None
+
+        self.renders = 0
+        self.segments_rendered = 0
+        self.segments_reused = 0
+        self._lock = threading.Lock()
+
+        ast = self.env.parse(template_content)
+        plan = self._plan_segments(ast)
+        if plan is None:
+            # 整体渲染
+            self._template = processor.get_template(template_content)
+            return
+
+        # 分析完成后再提升常量，避免常量名被当作输入变量
+        constants = processor._hoist_constant_literals(ast) if processor.hoist_constants else {}
+        globals_ = self.env.make_globals(constants)
+
+        self.segments = []
+        for node, prelude, inputs in plan:
+            body = [ast.body[index] for index in prelude] + [node]
+            segment_ast = nodes.Template(body, lineno=node.lineno)
+            segment_ast.set_environment(self.env)
+            template = self.env.template_class.from_code(
+                self.env, self.env.compile(segment_ast), globals_, None
+            )
+            deterministic = processor._is_deterministic(segment_ast)
+            self.segments.append(_Segment(template, inputs, deterministic))
+
+    @property
+    def is_incremental(self):
+        """模板是否可以按片段增量渲染"""
+        return self.segments is not None
+
+    def render(self, variables):
+        """
+        渲染模板，只重新执行输入变化的片段
+
+        Args:
+            variables (dict): 变量字典
+
+        Returns:
+            str: 渲染后的文本
+        """
+        with self._lock:
+            self.renders += 1
+            if self.segments is None:
+                self.segments_rendered += 1
+        if self.segments is None:
+            return self._template.render(**variables)
+
+        # 每个变量在一次渲染中只计算一次哈希，由所有片段共享
+        fingerprints = {}
+        output = []
+        for segment in self.segments:
+            output.append(self._render_segment(segment, variables, fingerprints))
+        return ''.join(output)
+
+    def get_stats(self):
+        """
+        获取增量渲染统计
+
+        Returns:
+            dict: 渲染次数、片段数、重新执行和复用的片段数
+        """
+        with self._lock:
+            return {
+                'incremental': self.is_incremental,
+                'segments': len(self.segments) if self.segments is not None else 1,
+                'renders': self.renders,
+                'segments_rendered': self.segments_rendered,
+                'segments_reused': self.segments_reused,
+            }
+
+    def _render_segment(self, segment, variables, fingerprints):
+        """渲染单个片段，输入未变化时直接返回缓存的输出"""
+        key = None
+        if segment.deterministic:
+            names = variables.keys() if segment.inputs is None else segment.inputs
+            try:
+                key = tuple(sorted(
+                    (name, _fingerprint(name, variables, fingerprints))
+                    for name in names if name in variables
+                ))
+            except UncacheableValue:
+                key = None
+
+        if key is not None:
+            output = segment.cache.get(key)
+            if output is not None:
+                with self._lock:
+                    if key in segment.cache:
+                        segment.cache.move_to_end(key)
+                    self.segments_reused += 1
+                return output
+
+        output = segment.template.render(**variables)
+
+        with self._lock:
+            self.segments_rendered += 1
+            if key is not None:
+                segment.cache[key] = output
+                if len(segment.cache) > self.segment_cache_size:
+                    segment.cache.popitem(last=False)
+        return output
+
+    def _plan_segments(self, ast):
+        """
+        将顶层语句拆分为片段
+
+        Returns:
+            list: [(片段节点, 前导定义的下标列表, 输入变量集合或 None)]；无法拆分时返回 None
+        """
+        if any(True for _ in ast.find_all((nodes.Extends, nodes.NSRef))):
+            return None
+        # self.block() 引用其他片段中的 block
+        if 'self' in _loaded_names(ast):
+            return None
+
+        definitions = {}
+        plan = []
+        segment_stores = []
+        for index, node in enumerate(ast.body):
+            if isinstance(node, _DEFINITION_NODES):
+                for name in _defined_names(node):
+                    definitions.setdefault(name, []).append(index)
+                continue
+
+            prelude, inputs = self._resolve(ast, node, index, definitions)
+            plan.append((node, prelude, inputs))
+            segment_stores.append(_stored_names(node))
+
+        # 片段内的 set 会泄漏到模板作用域，被其他片段读取时无法独立渲染
+        for position, stores in enumerate(segment_stores):
+            if not stores:
+                continue
+            for other, (node, _, _) in enumerate(plan):
+                if other != position and stores & _loaded_names(node):
+                    return None
+        return plan
+
+    def _resolve(self, ast, node, index, definitions):
+        """
+        解析片段依赖的前导定义和输入变量
+
+        Returns:
+            tuple: (前导定义下标的有序列表, 输入变量集合或 None)
+        """
+        prelude = set()
+        inputs = set()
+        dynamic = False
+        pending = [(node, index)]
+        while pending:
+            current, position = pending.pop()
+            if isinstance(current, _DYNAMIC_NODES) or any(True for _ in current.find_all(_DYNAMIC_NODES)):
+                dynamic = True
+            for name in _undeclared_names(current):
+                earlier = [i for i in definitions.get(name, []) if i < position]
+                if not earlier:
+                    inputs.add(name)
+                    continue
+                definition = earlier[-1]
+                if definition not in prelude:
+                    prelude.add(definition)
+                    pending.append((ast.body[definition], definition))
+        return sorted(prelude), None if dynamic else frozenset(inputs)
+
+
+class _Segment:
+    """编译后的片段及其输出缓存"""
+
+    __slots__ = ('template', 'inputs', 'deterministic', 'cache')
+
+    def __init__(self, template, inputs, deterministic):
+        self.template = template
+        self.inputs = inputs
+        self.deterministic = deterministic
+        self.cache = OrderedDict()
+
+
+def _fingerprint(name, variables, fingerprints):
+    """获取变量值的哈希，同一次渲染中复用已计算的结果"""
+    try:
+        return fingerprints[name]
+    except KeyError:
+        pass
+    fingerprints[name] = canonical_hash(variables[name])
+    return fingerprints[name]
+
+
+def _undeclared_names(node):
+    """获取节点读取但未在节点内部声明的名称"""
+    template = nodes.Template([node], lineno=node.lineno)
+    template.set_environment(node.environment)
+    return meta.find_undeclared_variables(template)
+
+
+def _defined_names(node):
+    """获取顶层定义语句声明的名称"""
+    if isinstance(node, nodes.Macro):
+        return [node.name]
+    if isinstance(node, nodes.Import):
+        return [node.target]
+    if isinstance(node, nodes.FromImport):
+        return [name[1] if isinstance(name, tuple) else name for name in node.names]
+    if isinstance(node.target, nodes.Name):
+        return [node.target.name]
+    return [name.name for name in node.target.find_all(nodes.Name)]
+
+
+def _stored_names(node):
+    """获取片段内 set 语句赋值的名称"""
+    names = set()
+    for assign in node.find_all((nodes.Assign, nodes.AssignBlock)):
+        target = assign.target
+        if isinstance(target, nodes.Name):
+            names.add(target.name)
+        names.update(name.name for name in target.find_all(nodes.Name))
+    return names
+
+
+def _loaded_names(node):
+    """获取片段中读取的名称"""
+    return {name.name for name in node.find_all(nodes.Name) if name.ctx == 'load'}
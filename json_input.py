@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+
+
+# 超过该大小的 JSON 文件以引用方式打开，不载入编辑器
+LARGE_JSON_BYTES = 2 * 1024 * 1024
+
+
+class JsonParseResult:
+    """JSON 解析结果，无效时记录错误位置（行、列从 1 开始，offset 为字符偏移）"""
+
+    __slots__ = ('valid', 'data', 'message', 'line', 'column', 'offset')
+
+    def __init__(self, valid, data=None, message='', line=None, column=None, offset=None):
+        self.valid = valid
+        self.data = data
+        self.message = message
+        self.line = line
+        self.column = column
+        self.offset = offset
+
+    def describe(self):
+        """错误描述，格式与 json.JSONDecodeError 一致"""
+        if self.line is None:
+            return self.message
+        return f"{self.message}: line {self.line} column {self.column} (char {self.offset})"
+
+
+def parse_json_text(text):
+    """
+    解析 JSON 文本
+
+    Args:
+        text (str): JSON 字符串，空白文本视为空对象
+
+    Returns:
+        JsonParseResult: 解析结果
+    """
+    if not text.strip():
+        return JsonParseResult(True, {})
+    try:
+        return JsonParseResult(True, json.loads(text))
+    except json.JSONDecodeError as e:
+        return JsonParseResult(False, message=e.msg, line=e.lineno, column=e.colno, offset=e.pos)
+
+
+class JsonInput:
+    """
+    JSON 输入的来源与解析缓存，与界面无关
+
+    文本模式下内容来自编辑器，编辑器每次修改时调用 mark_modified 递增版本号；
+    引用模式下内容来自磁盘文件，按修改时间和大小判断文件是否变化。
+    解析结果按来源键缓存，来源未变化时直接复用，不再读取编辑器或文件。
+    """
+
+    def __init__(self):
+        self.revision = 0
+        self.file_path = None
+        self._key = None
+        self._result = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @property
+    def is_reference(self):
+        """是否以引用方式使用磁盘文件"""
+        return self.file_path is not None
+
+    def mark_modified(self):
+        """编辑器内容已变化，使文本模式的缓存失效"""
+        self.revision += 1
+
+    def open_reference(self, file_path):
+        """
+        以引用方式使用磁盘上的 JSON 文件
+
+        Args:
+            file_path (str): JSON 文件路径
+        """
+        self.file_path = file_path
+        self.revision += 1
+
+    def close_reference(self):
+        """回到文本模式"""
+        self.file_path = None
+        self.revision += 1
+
+    def source_key(self):
+        """
+        获取当前来源的缓存键
+
+        Returns:
+            tuple: 文本模式为 ('text', 版本号)，引用模式为 ('file', 路径, 修改时间, 大小)
+        """
+        if self.file_path is None:
+            return ('text', self.revision)
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return ('file', self.file_path, None, None)
+        return ('file', self.file_path, stat.st_mtime_ns, stat.st_size)
+
+    def cached(self, key):
+        """
+        获取与来源键对应的缓存结果
+
+        Returns:
+            JsonParseResult: 来源未变化时返回缓存结果，否则返回 None
+        """
+        with self._lock:
+            return self._result if self._key == key else None
+
+    def parse(self, key, get_text):
+        """
+        解析指定来源，命中缓存时不调用 get_text
+
+        可在后台线程中调用，此时 get_text 应返回在界面线程预先取得的文本快照。
+        其他线程正在解析同一来源时等待其结果，不重复解析。
+
+        Args:
+            key (tuple): source_key 返回的来源键
+            get_text (callable): 返回编辑器文本的函数，引用模式下不使用
+
+        Returns:
+            JsonParseResult: 解析结果
+        """
+        with self._lock:
+            if self._key == key:
+                return self._result
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = threading.Event()
+        if pending is not None:
+            pending.wait()
+            result = self.cached(key)
+            if result is not None:
+                return result
+            # 解析结果已被更新的来源替换，重新解析
+            return self.parse(key, get_text)
+
+        try:
+            result = self._parse_source(key, get_text)
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+        return result
+
+    def _parse_source(self, key, get_text):
+        """读取并解析来源，保存不比当前缓存旧的结果"""
+        if key[0] == 'file':
+            try:
+                with open(key[1], 'r', encoding='utf-8-sig') as f:
+                    result = parse_json_text(f.read())
+            except (OSError, UnicodeDecodeError) as e:
+                result = JsonParseResult(False, message=str(e))
+        else:
+            result = parse_json_text(get_text())
+
+        with self._lock:
+            # 期间来源可能已再次变化，只保留较新的结果
+            if key[0] != 'text' or self._key is None or self._key[0] != 'text' or key[1] >= self._key[1]:
+                self._key = key
+                self._result = result
+        return result
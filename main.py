@@ -1,13 +1,26 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext, Menu
+from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog, Menu
+import argparse
 import json
 import os
+import threading
 import webbrowser
 from datetime import datetime
 from template_processor import TemplateProcessor
+from data_import import load_table
+from batch_export import BatchExporter
+from json_input import LARGE_JSON_BYTES, JsonInput, JsonParseResult
+from metrics import Metrics
+from render_history import RenderHistory, diff_lines, diff_rows
+from syntax_highlight import OutputTokenizer, TemplateTokenizer, TextHighlighter
+from variable_model import VariableModel
 from i18n import _, set_language, get_supported_languages, i18n_manager
 
 
+# 最近使用的模板列表的长度
+MAX_RECENT_TEMPLATES = 10
+
+
 class JinjaTemplateGUI:
     def __init__(self, root):
         self.root = root
@@ -16,10 +29,34 @@ class JinjaTemplateGUI:
         
         # 初始化变量
         self.template_content = ""
-        self.template_vars = {}
+        self.variable_model = VariableModel()
+        self.variable_entries = []
+        self._variable_validate_command = self.root.register(self.on_variable_edit)
         self.current_file = None
-        self.processor = TemplateProcessor()
+        self.config = self._load_app_config()
+        metrics_config = self.config.get('metrics', {})
+        self.processor = TemplateProcessor(
+            filter_modules=self.config.get('filter_modules', []),
+            metrics=Metrics(trace_memory=metrics_config.get('trace_memory', False),
+                            event_log=metrics_config.get('event_log') or None)
+        )
+        self.configure_render_cache(self.config.get('render_cache', {}))
         self.result_text = None
+        self.batch_records = []
+        self.live_preview_var = tk.BooleanVar(value=False)
+        self._preview_after_id = None
+        self.json_input = JsonInput()
+        self.large_json_bytes = int(self.config.get('large_json_mb', LARGE_JSON_BYTES / (1024 * 1024)) * 1024 * 1024)
+        self._json_validate_after_id = None
+        self._template_sync_after_id = None
+        history_config = self.config.get('render_history', {})
+        self.render_history = RenderHistory(
+            max_entries=history_config.get('max_entries', 20),
+            max_bytes=history_config.get('max_memory_mb', 32) * 1024 * 1024
+        )
+        self.recent_templates = list(self.config.get('recent_templates', []))[:MAX_RECENT_TEMPLATES]
+        # 预热过的模板：{路径: (文件状态, 模板内容, 变量列表)}
+        self._prewarmed = {}
         
         # 创建菜单栏
         self.create_menu_bar()
@@ -27,6 +64,21 @@ class JinjaTemplateGUI:
         # 创建主界面
         self.setup_ui()
         
+        # 窗口显示后在后台预热最近使用的模板
+        self.root.after_idle(self.prewarm_recent_templates)
+        
+    def configure_render_cache(self, cache_config):
+        """根据配置启用渲染结果缓存"""
+        if not cache_config.get('enabled', False):
+            return
+        megabyte = 1024 * 1024
+        self.processor.enable_render_cache(
+            max_entries=cache_config.get('max_entries', 256),
+            max_bytes=cache_config.get('max_memory_mb', 64) * megabyte,
+            disk_dir=cache_config.get('disk_dir') or None,
+            disk_max_bytes=cache_config.get('disk_max_mb', 256) * megabyte
+        )
+    
     def create_menu_bar(self):
         """创建菜单栏"""
         menubar = Menu(self.root)
@@ -36,6 +88,13 @@ class JinjaTemplateGUI:
         self.file_menu = Menu(menubar, tearoff=0)
         menubar.add_cascade(label=_("File"), menu=self.file_menu)
         self.file_menu.add_command(label=_("Open"), command=self.select_file, accelerator="Ctrl+O")
+        self.recent_menu = Menu(self.file_menu, tearoff=0)
+        self.file_menu.add_cascade(label=_("Open Recent"), menu=self.recent_menu)
+        self.populate_recent_menu()
+        self.file_menu.add_command(label=_("Import Data Table"), command=self.import_data_table)
+        self.file_menu.add_command(label=_("Batch Export"), command=self.batch_export)
+        self.file_menu.add_command(label=_("Render to File"), command=self.render_to_file)
+        self.file_menu.add_command(label=_("Compare Renders"), command=self.show_render_diff)
         self.file_menu.add_command(label=_("Export"), command=self.export_result, accelerator="Ctrl+E")
         self.file_menu.add_separator()
         self.file_menu.add_command(label=_("Close File"), command=self.close_file)
@@ -47,6 +106,12 @@ class JinjaTemplateGUI:
         menubar.add_cascade(label=_("Language"), menu=self.lang_menu)
         self.populate_language_menu()
         
+        # 工具菜单
+        self.tools_menu = Menu(menubar, tearoff=0)
+        menubar.add_cascade(label=_("Tools"), menu=self.tools_menu)
+        self.tools_menu.add_command(label=_("Performance Stats"), command=self.show_performance_stats)
+        self.tools_menu.add_command(label=_("Lint Template"), command=self.lint_template)
+        
         # 关于菜单
         self.about_menu = Menu(menubar, tearoff=0)
         menubar.add_cascade(label=_("About"), menu=self.about_menu)
@@ -68,6 +133,109 @@ class JinjaTemplateGUI:
                 command=lambda lc=lang_code: self.change_language(lc)
             )
     
+    def populate_recent_menu(self):
+        """填充最近使用的模板菜单"""
+        self.recent_menu.delete(0, tk.END)
+        if not self.recent_templates:
+            self.recent_menu.add_command(label=_("No Recent Templates"), state=tk.DISABLED)
+            return
+        for index, path in enumerate(self.recent_templates, 1):
+            self.recent_menu.add_command(
+                label=f"{index}. {os.path.basename(path)}  ({os.path.dirname(path)})",
+                command=lambda p=path: self.open_recent_template(p)
+            )
+        self.recent_menu.add_separator()
+        self.recent_menu.add_command(label=_("Clear Recent"), command=self.clear_recent_templates)
+    
+    def open_recent_template(self, file_path):
+        """打开最近使用的模板，文件已不存在时从列表中移除"""
+        if not os.path.exists(file_path):
+            messagebox.showwarning(_("Warning"), _("Template file not found: {}").format(file_path))
+            self.recent_templates.remove(file_path)
+            self._prewarmed.pop(file_path, None)
+            self.save_recent_templates()
+            return
+        self.load_template(file_path)
+    
+    def add_recent_template(self, file_path):
+        """将模板移到最近使用列表的最前面"""
+        file_path = os.path.abspath(file_path)
+        if file_path in self.recent_templates:
+            self.recent_templates.remove(file_path)
+        self.recent_templates.insert(0, file_path)
+        del self.recent_templates[MAX_RECENT_TEMPLATES:]
+        self.save_recent_templates()
+    
+    def clear_recent_templates(self):
+        """清空最近使用的模板"""
+        self.recent_templates = []
+        self._prewarmed.clear()
+        self.save_recent_templates()
+    
+    def save_recent_templates(self):
+        """将最近使用的模板写入配置文件并刷新菜单"""
+        self.config['recent_templates'] = list(self.recent_templates)
+        self.populate_recent_menu()
+        try:
+            config = self._load_app_config()
+            config['recent_templates'] = list(self.recent_templates)
+            with open('config.json', 'w', encoding='utf-8') as f:
+                json.dump(config, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"Failed to save recent templates: {e}")
+    
+    def prewarm_recent_templates(self):
+        """
+        在后台逐个读取最近使用的模板，提取变量并编译进缓存
+        
+        打开预热过且文件未修改的模板时直接使用预热结果，无需再读取、解析和编译；
+        表单控件只能在界面线程创建，仍在打开时生成。
+        """
+        pending = list(self.recent_templates[:self.config.get('prewarm_recent', 3)])
+        
+        def prewarm(path):
+            stat = os.stat(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            return path, (stat.st_mtime_ns, stat.st_size), content, self.processor.prewarm(content)
+        
+        def on_done(result, error):
+            if error is not None:
+                print(f"Failed to prewarm template: {error}")
+            else:
+                path, file_state, content, variables = result
+                self._prewarmed[path] = (file_state, content, variables)
+            next_template()
+        
+        def next_template():
+            while pending:
+                path = pending.pop(0)
+                if os.path.isfile(path) and path not in self._prewarmed:
+                    self.run_in_background(lambda: prewarm(path), on_done)
+                    return
+        
+        next_template()
+    
+    def _take_prewarmed(self, file_path):
+        """
+        取出模板的预热结果
+        
+        Returns:
+            tuple: (模板内容, 变量列表)，没有预热或文件已修改时为 None
+        """
+        prewarmed = self._prewarmed.pop(os.path.abspath(file_path), None)
+        if prewarmed is None:
+            return None
+        file_state, content, variables = prewarmed
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if (stat.st_mtime_ns, stat.st_size) != file_state:
+            return None
+        self.processor.metrics.increment('template_prewarm_hits')
+        return content, variables
+    
     def change_language(self, lang_code):
         """切换语言"""
         if set_language(lang_code):
@@ -110,6 +278,7 @@ class JinjaTemplateGUI:
                 "Reload": _("Reload"),
                 "Generate JSON Template": _("Generate JSON Template"),
                 "Clear JSON": _("Clear JSON"),
+                "Open JSON File": _("Open JSON File"),
                 "Generate Text": _("Generate Text"),
                 "Save Result": _("Save Result"),
                 "Clear All": _("Clear All")
@@ -216,16 +385,32 @@ class JinjaTemplateGUI:
         # JSON文本框
         self.json_text = scrolledtext.ScrolledText(json_frame, height=15)
         self.json_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        self.json_text.tag_configure('json_error', background='#ffd6d6')
+        
+        # JSON校验状态
+        self.json_status_var = tk.StringVar(value="")
+        ttk.Label(json_frame, textvariable=self.json_status_var).grid(row=1, column=0, sticky=tk.W, padx=5)
         
         # JSON操作按钮框架
         json_button_frame = ttk.Frame(json_frame)
-        json_button_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), padx=5, pady=5)
+        json_button_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), padx=5, pady=5)
         
         ttk.Button(json_button_frame, text=_("Generate JSON Template"), command=self.generate_json_template).pack(side=tk.LEFT, padx=5)
-        ttk.Button(json_button_frame, text=_("Clear JSON"), command=lambda: self.json_text.delete(1.0, tk.END)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(json_button_frame, text=_("Open JSON File"), command=self.open_json_file).pack(side=tk.LEFT, padx=5)
+        ttk.Button(json_button_frame, text=_("Clear JSON"), command=self.clear_json_input).pack(side=tk.LEFT, padx=5)
+        
+        # 绑定JSON文本变化事件（包括粘贴和程序插入）
+        self.json_text.bind('<<Modified>>', self.on_json_change)
+        
+        # 模板源码标签页
+        template_frame = ttk.Frame(self.data_notebook)
+        self.data_notebook.add(template_frame, text=_("Template Source"))
+        self.configure_frame_grid_weights(template_frame)
         
-        # 绑定JSON文本变化事件
-        self.json_text.bind('<KeyRelease>', self.on_json_change)
+        self.template_text = scrolledtext.ScrolledText(template_frame, height=15, undo=True)
+        self.template_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        self.template_text.bind('<<Modified>>', self.on_template_change)
+        self.template_highlighter = TextHighlighter(self.template_text, TemplateTokenizer(self.processor.env))
         
     def create_result_display(self, parent):
         # 结果显示框架
@@ -236,6 +421,8 @@ class JinjaTemplateGUI:
         # 结果文本框
         self.result_text = scrolledtext.ScrolledText(result_frame, height=15)
         self.result_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        # 大结果只高亮可见区域
+        self.result_highlighter = TextHighlighter(self.result_text, OutputTokenizer(), eager=False)
         
     def configure_frame_grid_weights(self, frame):
         """配置框架的网格权重"""
@@ -252,6 +439,8 @@ class JinjaTemplateGUI:
         ttk.Button(button_frame, text=_("Export Variables"), command=self.export_variables_json).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text=_("Export Complete"), command=self.export_complete_package).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text=_("Clear All"), command=self.clear_all).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(button_frame, text=_("Live Preview"), variable=self.live_preview_var,
+                        command=self.schedule_preview).pack(side=tk.LEFT, padx=5)
         
     def select_file(self):
         """选择模板文件"""
@@ -272,18 +461,12 @@ class JinjaTemplateGUI:
     
     def export_variables_json(self):
         """导出变量为JSON格式"""
-        if not hasattr(self, 'template_vars') or not self.template_vars:
+        if not self.variable_model:
             messagebox.showwarning(_("Warning"), _("No variables to export"))
             return
         
         # 收集变量数据
-        variables_data = {}
-        for var_name, var_value in self.template_vars.items():
-            value = var_value.get().strip()
-            if value:
-                variables_data[var_name] = self._convert_value(value)
-            else:
-                variables_data[var_name] = None
+        variables_data = self.collect_variables_data(keep_empty=True)
         
         if not any(v is not None for v in variables_data.values()):
             messagebox.showwarning(_("Warning"), _("Please fill in variable values first"))
@@ -313,7 +496,7 @@ class JinjaTemplateGUI:
             messagebox.showwarning(_("Warning"), _("Please generate result first"))
             return
         
-        if not hasattr(self, 'template_vars') or not self.template_vars:
+        if not self.variable_model:
             messagebox.showwarning(_("Warning"), _("No variables to export"))
             return
         
@@ -324,13 +507,7 @@ class JinjaTemplateGUI:
         
         try:
             # 收集变量数据
-            variables_data = {}
-            for var_name, var_value in self.template_vars.items():
-                value = var_value.get().strip()
-                if value:
-                    variables_data[var_name] = self._convert_value(value)
-                else:
-                    variables_data[var_name] = None
+            variables_data = self.collect_variables_data(keep_empty=True)
             
             # 导出变量JSON
             variables_file = os.path.join(directory, "variables.json")
@@ -363,6 +540,371 @@ class JinjaTemplateGUI:
         except Exception as e:
             messagebox.showerror(_("Error"), _("Export failed: {}") + str(e))
     
+    def batch_export(self):
+        """用导入的数据表批量渲染，每条记录输出一个文件"""
+        self.sync_template_source()
+        if not self.template_content:
+            messagebox.showwarning(_("Warning"), _("Please select a template file first"))
+            return
+        if not self.batch_records:
+            messagebox.showwarning(_("Warning"), _("Please import a data table first"))
+            return
+        
+        expression = simpledialog.askstring(
+            _("Batch Export"),
+            _("File name expression (record variables and index are available):"),
+            initialvalue='"output_" ~ index ~ ".txt"',
+            parent=self.root
+        )
+        if not expression:
+            return
+        
+        archive_format = None
+        if messagebox.askyesno(_("Batch Export"), _("Write all files into a single archive?")):
+            target = filedialog.asksaveasfilename(
+                title=_("Batch Export"),
+                defaultextension=".zip",
+                filetypes=[
+                    (_("Zip Archive"), "*.zip"),
+                    (_("Tar Archive"), "*.tar.gz *.tar")
+                ]
+            )
+            if target:
+                if target.endswith('.tar.gz') or target.endswith('.tgz'):
+                    archive_format = 'tar.gz'
+                elif target.endswith('.tar'):
+                    archive_format = 'tar'
+                else:
+                    archive_format = 'zip'
+        else:
+            target = filedialog.askdirectory(title=_("Select Export Directory"))
+        if not target:
+            return
+        
+        try:
+            exporter = BatchExporter(self.processor, self.template_content, expression,
+                                     archive_format=archive_format)
+        except Exception as e:
+            messagebox.showerror(_("Error"), _("Export failed: {}").format(str(e)))
+            return
+        
+        records = list(self.batch_records)
+        
+        def on_done(manifest, error):
+            if error is not None:
+                messagebox.showerror(_("Error"), _("Export failed: {}").format(str(error)))
+            else:
+                messagebox.showinfo(_("Success"), _("Exported {} files ({} errors) in {:.2f}s to: {}").format(
+                    len(manifest['files']), len(manifest['errors']), manifest['total_seconds'], target))
+        
+        self.run_in_background(lambda: exporter.export(records, target), on_done)
+    
+    def run_in_background(self, func, on_done, poll_ms=100):
+        """
+        在后台线程执行耗时任务，完成后在界面线程回调 on_done(结果, 异常)
+        
+        Tk 控件只能在主线程访问，因此通过 after 轮询任务状态。
+        """
+        state = {}
+        
+        def worker():
+            try:
+                state['result'] = func()
+            except Exception as e:
+                state['error'] = e
+            state['done'] = True
+        
+        def poll():
+            if state.get('done'):
+                on_done(state.get('result'), state.get('error'))
+            else:
+                self.root.after(poll_ms, poll)
+        
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(poll_ms, poll)
+    
+    def show_render_diff(self):
+        """打开渲染历史对比窗口"""
+        entries = self.render_history.entries()
+        if len(entries) < 2:
+            messagebox.showinfo(_("Compare Renders"), _("At least two renders are needed to compare"))
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title(_("Compare Renders"))
+        window.geometry("1000x600")
+        window.columnconfigure(0, weight=1)
+        window.rowconfigure(1, weight=1)
+        
+        labels = [entry.describe() for entry in entries]
+        ids = [entry.id for entry in entries]
+        
+        controls = ttk.Frame(window, padding="5")
+        controls.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        ttk.Label(controls, text=_("From:")).pack(side=tk.LEFT, padx=2)
+        old_box = ttk.Combobox(controls, values=labels, state='readonly', width=36)
+        old_box.current(len(labels) - 2)
+        old_box.pack(side=tk.LEFT, padx=2)
+        ttk.Label(controls, text=_("To:")).pack(side=tk.LEFT, padx=2)
+        new_box = ttk.Combobox(controls, values=labels, state='readonly', width=36)
+        new_box.current(len(labels) - 1)
+        new_box.pack(side=tk.LEFT, padx=2)
+        
+        mode_var = tk.StringVar(value='inline')
+        ttk.Radiobutton(controls, text=_("Inline"), variable=mode_var, value='inline').pack(side=tk.LEFT, padx=2)
+        ttk.Radiobutton(controls, text=_("Side by Side"), variable=mode_var, value='side').pack(side=tk.LEFT, padx=2)
+        status_var = tk.StringVar(value="")
+        
+        body = ttk.Frame(window)
+        body.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5)
+        ttk.Label(window, textvariable=status_var).grid(row=2, column=0, sticky=tk.W, padx=5, pady=2)
+        
+        def compare():
+            old_id = ids[old_box.current()]
+            new_id = ids[new_box.current()]
+            mode = mode_var.get()
+            # 在界面线程取出记录，生成渲染结果时可能同时向历史添加记录
+            try:
+                old_entry = self.render_history.get(old_id)
+                new_entry = self.render_history.get(new_id)
+            except KeyError:
+                status_var.set(_("Compare failed: {}").format(_("render was removed from history")))
+                return
+            status_var.set(_("Comparing..."))
+            
+            def compute():
+                old_lines = old_entry.text().split('\n')
+                new_lines = new_entry.text().split('\n')
+                opcodes = diff_lines(old_lines, new_lines)
+                return diff_rows(old_lines, new_lines, opcodes)
+            
+            def on_done(rows, error):
+                if not window.winfo_exists():
+                    return
+                if error is not None:
+                    status_var.set(_("Compare failed: {}").format(str(error)))
+                    return
+                added = sum(1 for row in rows if row[3] is not None and row[0] in ('insert', 'replace'))
+                removed = sum(1 for row in rows if row[1] is not None and row[0] in ('delete', 'replace'))
+                status_var.set(_("{} lines added, {} lines removed").format(added, removed))
+                self._show_diff_rows(body, rows, mode)
+            
+            self.run_in_background(compute, on_done)
+        
+        ttk.Button(controls, text=_("Compare"), command=compare).pack(side=tk.LEFT, padx=5)
+        compare()
+    
+    def _show_diff_rows(self, body, rows, mode):
+        """
+        在对比窗口中显示差异
+        
+        Args:
+            body (ttk.Frame): 显示区域
+            rows (list): diff_rows 的结果
+            mode (str): 'inline' 或 'side'
+        """
+        for widget in body.winfo_children():
+            widget.destroy()
+        
+        def make_text(column):
+            text = tk.Text(body, wrap=tk.NONE, font=("Courier", 10))
+            text.grid(row=0, column=column, sticky=(tk.W, tk.E, tk.N, tk.S))
+            text.tag_configure('insert', background='#d7f5dd')
+            text.tag_configure('delete', background='#fbdada')
+            text.tag_configure('skip', foreground='#8c8c8c')
+            body.columnconfigure(column, weight=1)
+            return text
+        
+        def fill(text, lines, tagged):
+            # 整段插入后按标签批量添加，避免逐行调用
+            text.insert(1.0, '\n'.join(lines))
+            for tag, line_numbers in tagged.items():
+                indexes = []
+                for number in line_numbers:
+                    indexes.extend((f"{number}.0", f"{number}.0 lineend +1c"))
+                if indexes:
+                    text.tag_add(tag, *indexes)
+            text.config(state=tk.DISABLED)
+        
+        body.rowconfigure(0, weight=1)
+        scrollbar = ttk.Scrollbar(body, orient='vertical')
+        
+        if mode == 'inline':
+            text = make_text(0)
+            lines = []
+            tagged = {'insert': [], 'delete': [], 'skip': []}
+            for kind, old_no, old_line, new_no, new_line in rows:
+                if kind == 'equal':
+                    lines.append(f"  {new_line}")
+                    continue
+                if kind == 'skip':
+                    lines.append(old_line)
+                    tagged['skip'].append(len(lines))
+                    continue
+                if old_no is not None:
+                    lines.append(f"- {old_line}")
+                    tagged['delete'].append(len(lines))
+                if new_no is not None:
+                    lines.append(f"+ {new_line}")
+                    tagged['insert'].append(len(lines))
+            fill(text, lines, tagged)
+            text.configure(yscrollcommand=scrollbar.set)
+            scrollbar.configure(command=text.yview)
+            scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+            return
+        
+        left = make_text(0)
+        right = make_text(1)
+        left_lines, right_lines = [], []
+        left_tagged = {'delete': [], 'skip': []}
+        right_tagged = {'insert': [], 'skip': []}
+        for number, (kind, old_no, old_line, new_no, new_line) in enumerate(rows, 1):
+            left_lines.append(old_line)
+            right_lines.append(new_line)
+            if kind == 'skip':
+                left_tagged['skip'].append(number)
+                right_tagged['skip'].append(number)
+            elif kind != 'equal':
+                if old_no is not None:
+                    left_tagged['delete'].append(number)
+                if new_no is not None:
+                    right_tagged['insert'].append(number)
+        fill(left, left_lines, left_tagged)
+        fill(right, right_lines, right_tagged)
+        
+        # 两侧共用一个滚动条，保持行对齐
+        def scroll(*args):
+            left.yview(*args)
+            right.yview(*args)
+        
+        def on_left_scroll(first, last):
+            scrollbar.set(first, last)
+            right.yview_moveto(first)
+        
+        def on_right_scroll(first, last):
+            scrollbar.set(first, last)
+            left.yview_moveto(first)
+        
+        left.configure(yscrollcommand=on_left_scroll)
+        right.configure(yscrollcommand=on_right_scroll)
+        scrollbar.configure(command=scroll)
+        scrollbar.grid(row=0, column=2, sticky=(tk.N, tk.S))
+    
+    def show_performance_stats(self):
+        """打开性能统计面板，每秒刷新一次"""
+        window = tk.Toplevel(self.root)
+        window.title(_("Performance Stats"))
+        window.geometry("640x480")
+        window.columnconfigure(0, weight=1)
+        window.rowconfigure(0, weight=1)
+        
+        text = scrolledtext.ScrolledText(window, wrap=tk.NONE, font=("Courier", 10))
+        text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        
+        def refresh():
+            if not window.winfo_exists():
+                return
+            text.config(state=tk.NORMAL)
+            text.delete(1.0, tk.END)
+            text.insert(1.0, self._format_performance_stats(self.processor.get_metrics()))
+            text.config(state=tk.DISABLED)
+            window.after(1000, refresh)
+        
+        def export():
+            file_path = filedialog.asksaveasfilename(
+                title=_("Export Stats"),
+                defaultextension=".jsonl",
+                filetypes=[
+                    (_("JSON Lines"), "*.jsonl"),
+                    (_("Prometheus Text"), "*.prom")
+                ]
+            )
+            if not file_path:
+                return
+            try:
+                self.processor.metrics.export(file_path, self.processor.get_metrics())
+                messagebox.showinfo(_("Success"), _("Stats exported to: {}").format(file_path), parent=window)
+            except Exception as e:
+                messagebox.showerror(_("Error"), _("Export failed: {}").format(str(e)), parent=window)
+        
+        button_frame = ttk.Frame(window)
+        button_frame.grid(row=1, column=0, pady=5)
+        ttk.Button(button_frame, text=_("Export Stats"), command=export).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text=_("Reset Stats"), command=self.processor.metrics.reset).pack(side=tk.LEFT, padx=5)
+        refresh()
+    
+    def lint_template(self):
+        """检查当前模板的性能隐患，双击问题行跳转到模板源码中的对应行"""
+        self.sync_template_source()
+        if not self.template_content:
+            messagebox.showwarning(_("Warning"), _("Please select a template file first"))
+            return
+        report = self.processor.lint_template(self.template_content)
+        
+        window = tk.Toplevel(self.root)
+        window.title(_("Lint Template"))
+        window.geometry("720x480")
+        window.columnconfigure(0, weight=1)
+        window.rowconfigure(0, weight=1)
+        
+        text = scrolledtext.ScrolledText(window, wrap=tk.WORD, font=("Courier", 10))
+        text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
+        if not report.issues:
+            text.insert(tk.END, _("No issues found") + "\n\n")
+        text.insert(tk.END, report.format(_))
+        text.config(state=tk.DISABLED)
+        
+        def jump(event):
+            # 报告中的问题行和循环行都以 "行号:" 开头
+            line = text.get(f"@{event.x},{event.y} linestart", f"@{event.x},{event.y} lineend")
+            number = line.strip().split(':', 1)[0]
+            if not number.isdigit():
+                return
+            self.data_notebook.select(2)
+            self.template_text.mark_set(tk.INSERT, f"{number}.0")
+            self.template_text.see(f"{number}.0")
+            self.template_text.tag_remove(tk.SEL, 1.0, tk.END)
+            self.template_text.tag_add(tk.SEL, f"{number}.0", f"{number}.0 lineend")
+            self.template_text.focus_set()
+        
+        text.bind('<Double-Button-1>', jump)
+    
+    def _format_performance_stats(self, snapshot):
+        """将统计快照格式化为面板文本"""
+        lines = [f"{_('Stage'):<10}{_('Count'):>8}{_('Total ms'):>12}{_('Avg ms'):>10}{_('Max ms'):>10}"]
+        for stage, histogram in snapshot['stages'].items():
+            count = histogram['count']
+            total = histogram['sum'] * 1000
+            average = total / count if count else 0.0
+            lines.append(f"{stage:<10}{count:>8}{total:>12.2f}{average:>10.3f}{histogram['max'] * 1000:>10.2f}")
+        
+        lines.append("")
+        for name, count in sorted(snapshot['counters'].items()):
+            lines.append(f"{name:<30}{count:>10}")
+        for stage, count in sorted(snapshot['errors'].items()):
+            lines.append(f"{stage + ' errors':<30}{count:>10}")
+        
+        output = snapshot['output_bytes']
+        lines.append("")
+        lines.append(_("Output bytes: {} renders, {} total, {} max").format(output['count'], output['sum'], output['max']))
+        memory = snapshot['peak_memory_bytes']
+        if memory is None:
+            lines.append(_("Peak memory per render: disabled (metrics.trace_memory)"))
+        else:
+            lines.append(_("Peak memory per render: {} last, {} max").format(memory['last'], memory['max']))
+        cache = snapshot['render_cache']
+        if cache is not None:
+            lines.append(_("Render cache: {} hits, {} misses, {} bypasses, hit rate {:.1%}").format(
+                cache['hits'], cache['misses'], cache['bypasses'], cache['hit_rate']))
+        
+        filters = [(name, stats) for name, stats in self.processor.get_filter_stats().items() if stats['calls']]
+        if filters:
+            lines.append("")
+            lines.append(f"{_('Filter'):<24}{_('Calls'):>10}{_('Cache hits'):>12}{_('Total ms'):>12}")
+            for name, stats in filters[:10]:
+                lines.append(f"{name:<24}{stats['calls']:>10}{stats['cache_hits']:>12}{stats['total_time'] * 1000:>12.2f}")
+        return '\n'.join(lines)
+    
     def close_file(self):
         """关闭当前文件"""
         if self.current_file:
@@ -395,14 +937,24 @@ class JinjaTemplateGUI:
     def load_template(self, file_path):
         """加载模板文件"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                self.template_content = f.read()
+            with self.processor.metrics.measure('load'):
+                prewarmed = self._take_prewarmed(file_path)
+                if prewarmed is None:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        self.template_content = f.read()
+                else:
+                    self.template_content = prewarmed[0]
             
             self.current_file = file_path
             self.file_path_var.set(os.path.basename(file_path))
+            self.show_template_source()
+            self.add_recent_template(file_path)
             
-            # 提取变量
-            self.extract_and_display_variables()
+            # 提取变量，预热过的模板直接使用预热时的结果
+            if prewarmed is None:
+                self.extract_and_display_variables()
+            else:
+                self.display_variables(prewarmed[1])
             # 生成JSON模板
             self.generate_json_template()
             
@@ -423,215 +975,397 @@ class JinjaTemplateGUI:
         if not self.template_content:
             return
         
-        # 清除现有控件
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-        
         # 提取变量
         variables = self.processor.extract_variables(self.template_content)
-        self.template_vars = {}
+        self.display_variables(variables)
+    
+    def display_variables(self, variables, keep_values=False):
+        """
+        为变量创建输入控件
+        
+        Args:
+            variables (list): 变量名列表
+            keep_values (bool): 是否保留仍然存在的变量已填写的值
+        """
+        previous = dict(zip(self.variable_model.names, self.variable_model.values)) if keep_values else {}
+        
+        # 清除现有控件
+        self.clear_variable_form()
+        self.variable_model.reset(variables)
+        self.variable_model.fill(previous)
         
         if not variables:
-            ttk.Label(self.scrollable_frame, text=_("No template variables detected")).pack(pady=10)
+            ttk.Label(self.scrollable_frame, text=_("No template variables detected")).grid(row=0, column=0, pady=10)
             return
         
-        # 创建变量输入控件
-        for i, var_name in enumerate(variables):
-            frame = ttk.Frame(self.scrollable_frame)
-            frame.pack(fill=tk.X, padx=5, pady=2)
-            ttk.Label(frame, text=f"{var_name}:", width=25).pack(side=tk.LEFT)
-            
-            var_value = tk.StringVar()
-            entry = ttk.Entry(frame, textvariable=var_value, width=30)
-            entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
-            
-            # 为每个变量创建StringVar并绑定
-            self.template_vars[var_name] = var_value
+        # 每个变量只创建标签和输入框两个控件，直接排在网格中；
+        # 输入框不绑定 StringVar，通过 key 校验回调把内容写回模型
+        for position, var_name in enumerate(variables):
+            ttk.Label(self.scrollable_frame, text=f"{var_name}:", width=25).grid(
+                row=position, column=0, sticky=tk.W, padx=(5, 0), pady=2)
+            entry = ttk.Entry(self.scrollable_frame, width=30, validate='key',
+                              validatecommand=(self._variable_validate_command, position, '%P'))
+            entry.grid(row=position, column=1, sticky=(tk.W, tk.E), padx=(0, 10), pady=2)
+            self.variable_entries.append(entry)
             
             # 添加示例值提示
-            sample_values = {
-                'name': '张三',
-                'age': '25',
-                'email': 'zhangsan@example.com',
-                'date': '2024-01-01',
-                'items': '["item1", "item2"]',
-                'count': '10'
-            }
-            
-            if var_name in sample_values:
-                entry.insert(0, sample_values[var_name])
+            if self.variable_model.values[position]:
+                entry.insert(0, self.variable_model.values[position])
+    
+    def on_variable_edit(self, position, text):
+        """输入框内容变化时写回变量模型"""
+        self.variable_model.values[int(position)] = text
+        self.schedule_preview()
+        return True
+    
+    def clear_variable_form(self):
+        """清除变量输入控件"""
+        for widget in self.scrollable_frame.winfo_children():
+            widget.destroy()
+        self.variable_entries = []
+        self.variable_model.reset(())
     
     def generate_json_template(self):
         """生成JSON模板"""
-        if hasattr(self, 'template_vars') and self.template_vars:
-            variables = list(self.template_vars.keys())
-            json_template = self._create_json_template(variables)
-            self.json_text.delete(1.0, tk.END)
+        if self.variable_model:
+            json_template = self.variable_model.json_template()
+            self.clear_json_input()
             self.json_text.insert(1.0, json_template)
     
-    def _create_json_template(self, variables):
-        """创建JSON模板字符串"""
-        if not variables:
-            return "{\n  \"example_key\": \"example_value\"\n}"
+    def show_template_source(self):
+        """在模板源码标签页显示当前模板"""
+        self.template_text.delete(1.0, tk.END)
+        self.template_text.insert(1.0, self.template_content)
+        self.template_text.edit_reset()
+        self.template_text.edit_modified(False)
+        self._cancel_template_sync()
+    
+    def on_template_change(self, event):
+        """模板源码被编辑时，稍后同步到当前模板"""
+        if not self.template_text.edit_modified():
+            return
+        self.template_text.edit_modified(False)
+        self._cancel_template_sync()
+        self._template_sync_after_id = self.root.after(300, self._apply_template_edit)
+    
+    def _cancel_template_sync(self):
+        if self._template_sync_after_id is not None:
+            self.root.after_cancel(self._template_sync_after_id)
+            self._template_sync_after_id = None
+    
+    def _apply_template_edit(self):
+        self._template_sync_after_id = None
+        self.template_content = self.template_text.get(1.0, 'end-1c')
+        
+        # 编辑中的模板通常不完整，用增量提取器只重新分析变化的标签，变量有增减时更新表单
+        variables = self.processor.extract_variables(self.template_content, incremental=True)
+        if variables != self.variable_model.names:
+            self.display_variables(variables, keep_values=True)
+        self.schedule_preview()
+    
+    def sync_template_source(self):
+        """立即应用尚未同步的源码编辑（只更新当前模板，不写回文件）"""
+        if self._template_sync_after_id is not None:
+            self._cancel_template_sync()
+            self.template_content = self.template_text.get(1.0, 'end-1c')
+    
+    def on_json_change(self, event):
+        """JSON输入变化时的处理"""
+        # 清除修改标记本身也会触发 <<Modified>>，忽略该次事件
+        if not self.json_text.edit_modified():
+            return
+        self.json_text.edit_modified(False)
+        self.json_input.mark_modified()
+        self.json_text.tag_remove('json_error', 1.0, tk.END)
+        self.schedule_json_validation()
+        self.schedule_preview()
+    
+    def schedule_json_validation(self, delay=400):
+        """输入停止变化一段时间后在后台校验JSON"""
+        if self._json_validate_after_id is not None:
+            self.root.after_cancel(self._json_validate_after_id)
+        self._json_validate_after_id = self.root.after(delay, self.validate_json_input)
+    
+    def validate_json_input(self):
+        """在后台线程解析JSON，完成后显示结果并标出错误位置"""
+        self._json_validate_after_id = None
+        key = self.json_input.source_key()
+        result = self.json_input.cached(key)
+        if result is not None:
+            self.show_json_status(result)
+            return
         
-        template_dict = {}
+        # Tk 控件只能在主线程读取，先取得文本快照
+        text = None if self.json_input.is_reference else self.json_text.get(1.0, 'end-1c')
+        self.json_status_var.set(_("Validating JSON..."))
         
-        # 通用的变量类型映射规则
-        type_patterns = {
-            # 布尔值相关
-            'active': True,
-            'enabled': True,
-            'visible': True,
-            'add_': True,
-            
-            # 数字相关
-            'count': 10,
-            'age': 25,
-            'price': 99.99,
-            'num': 5,
-            
-            # 字符串相关
-            'name': '示例名称',
-            'title': '示例标题',
-            'text': '示例文本内容',
-            'content': '示例内容',
-            'description': '示例描述',
-            'email': 'example@email.com',
-            'token': '<token>',
-            'code': 'EXAMPLE_CODE',
-            
-            # 日期相关
-            'date': '2024-01-01',
-            'time': '12:00:00',
-            
-            # 列表相关
-            'items': ['item1', 'item2'],
-            'list': ['a', 'b', 'c'],
-            
-            # 对象相关
-            'data': {'key': 'value'},
-            'config': {'setting': 'value'},
-        }
-        
-        # 复杂结构的特殊处理
-        complex_structures = {
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': '示例内容'
-                }
-            ],
-            'user': {
-                'name': '用户名',
-                'email': 'user@example.com'
-            }
-        }
+        def on_done(result, error):
+            # 校验期间内容又发生变化时丢弃过期结果
+            if error is None and self.json_input.source_key() == key:
+                self.show_json_status(result)
         
-        for var in variables:
-            var_lower = var.lower()
-            assigned = False
-            
-            # 首先检查复杂结构
-            for pattern, value in complex_structures.items():
-                if pattern in var_lower:
-                    template_dict[var] = value
-                    assigned = True
-                    break
-            
-            if assigned:
-                continue
-                
-            # 然后检查类型模式
-            for pattern, value in type_patterns.items():
-                if (pattern.endswith('_') and var_lower.startswith(pattern[:-1])) or \
-                   (not pattern.endswith('_') and pattern in var_lower):
-                    template_dict[var] = value
-                    assigned = True
-                    break
-            
-            # 如果都没匹配到，使用通用值
-            if not assigned:
-                template_dict[var] = '请输入值'
+        self.run_in_background(lambda: self.json_input.parse(key, lambda: text), on_done)
+    
+    def show_json_status(self, result, scroll=False):
+        """
+        显示JSON校验结果
+        
+        Args:
+            result (JsonParseResult): 解析结果
+            scroll (bool): 是否滚动到错误位置
+        """
+        self.json_text.tag_remove('json_error', 1.0, tk.END)
+        if result.valid:
+            self.json_status_var.set(_("Valid JSON"))
+            return
+        
+        if result.line is None:
+            self.json_status_var.set(result.message)
+            return
+        self.json_status_var.set(_("Line {}, column {}: {}").format(result.line, result.column, result.message))
+        if self.json_input.is_reference:
+            return
         
-        return json.dumps(template_dict, ensure_ascii=False, indent=2)
+        # 高亮从错误位置到行尾，错误位于行尾时高亮整行
+        start = f"{result.line}.{result.column - 1}"
+        end = f"{start} lineend"
+        if self.json_text.compare(start, '>=', end):
+            start = f"{start} linestart"
+        self.json_text.tag_add('json_error', start, end)
+        if scroll:
+            self.json_text.see(start)
     
-    def on_json_change(self, event):
-        """JSON输入变化时的处理"""
-        # 这里可以添加实时验证逻辑
-        pass
+    def with_json_result(self, callback):
+        """
+        取得JSON输入的解析结果后在界面线程调用 callback(结果)
+        
+        输入未变化时直接使用缓存；否则在后台线程解析，正在进行的校验解析同一来源时等待其结果，
+        大型引用文件不会在界面线程解析。
+        """
+        key = self.json_input.source_key()
+        result = self.json_input.cached(key)
+        if result is not None:
+            callback(result)
+            return
+        
+        text = None if self.json_input.is_reference else self.json_text.get(1.0, 'end-1c')
+        self.json_status_var.set(_("Validating JSON..."))
+        
+        def on_done(result, error):
+            if error is not None:
+                result = JsonParseResult(False, message=str(error))
+            if self.json_input.source_key() == key:
+                self.show_json_status(result)
+            callback(result)
+        
+        self.run_in_background(lambda: self.json_input.parse(key, lambda: text), on_done)
     
-    def collect_form_data(self):
-        """收集表单数据"""
-        form_data = {}
-        for var_name, var_value in self.template_vars.items():
-            value = var_value.get().strip()
-            if value:
-                # 尝试转换为适当的类型
-                form_data[var_name] = self._convert_value(value)
-        return form_data
-    
-    def _convert_value(self, value):
-        """尝试转换值的类型"""
-        # 尝试转换为数字
+    def open_json_file(self):
+        """打开JSON文件，超过阈值的大文件以引用方式使用而不载入编辑器"""
+        file_path = filedialog.askopenfilename(
+            title=_("Open JSON File"),
+            filetypes=[
+                (_("JSON Files"), "*.json"),
+                (_("All Files"), "*.*")
+            ]
+        )
+        if not file_path:
+            return
+        
         try:
-            if '.' in value:
-                return float(value)
+            size = os.path.getsize(file_path)
+            if size > self.large_json_bytes:
+                self.clear_json_input()
+                self.json_input.open_reference(file_path)
+                self.json_text.insert(1.0, _("Large JSON file opened by reference ({:.1f} MB):\n{}").format(
+                    size / (1024 * 1024), file_path))
+                self.json_text.config(state=tk.DISABLED)
             else:
-                return int(value)
-        except ValueError:
-            pass
+                with open(file_path, 'r', encoding='utf-8-sig') as f:
+                    content = f.read()
+                self.clear_json_input()
+                self.json_text.insert(1.0, content)
+        except Exception as e:
+            messagebox.showerror(_("Error"), _("Failed to open JSON file: {}").format(str(e)))
+            return
         
-        # 尝试转换为布尔值
-        if value.lower() in ['true', 'false']:
-            return value.lower() == 'true'
+        self.validate_json_input()
+        self.schedule_preview()
+    
+    def clear_json_input(self):
+        """清空JSON输入并回到文本模式"""
+        if self.json_input.is_reference:
+            self.json_input.close_reference()
+        self.json_text.config(state=tk.NORMAL)
+        self.json_text.delete(1.0, tk.END)
+        self.json_status_var.set("")
+    
+    def schedule_preview(self, *args):
+        """输入停止变化一段时间后刷新实时预览"""
+        if self._preview_after_id is not None:
+            self.root.after_cancel(self._preview_after_id)
+            self._preview_after_id = None
+        if self.live_preview_var.get():
+            self._preview_after_id = self.root.after(300, self.update_preview)
+    
+    def update_preview(self):
+        """增量渲染并刷新结果，输入不完整时保留上一次的结果"""
+        self._preview_after_id = None
+        self.sync_template_source()
+        if not self.template_content:
+            return
         
-        # 尝试转换为列表（简单判断）
-        if value.startswith('[') and value.endswith(']'):
+        def render(json_result):
+            if not json_result.valid or not self.template_content:
+                return
             try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                pass
+                merged_data = self.processor.merge_data_sources(self.collect_form_data(), json_result.data,
+                                                                self.data_base_dir())
+                result = self.processor.render_incremental(self.template_content, merged_data)
+            except Exception:
+                return
+            self.show_result(result)
         
-        # 默认返回字符串
-        return value
+        self.with_json_result(render)
     
-    def generate_text(self):
-        """生成文本"""
+    def data_base_dir(self):
+        """JSON中文件引用相对路径的基准目录：引用的JSON文件或当前模板所在目录"""
+        if self.json_input.is_reference:
+            return os.path.dirname(os.path.abspath(self.json_input.file_path))
+        if self.current_file:
+            return os.path.dirname(os.path.abspath(self.current_file))
+        return None
+    
+    def render_to_file(self):
+        """流式渲染到文件，结果不载入界面，适合引用大型数据文件的模板"""
+        self.sync_template_source()
         if not self.template_content:
-            messagebox.showwarning("警告", "请先选择模板文件")
+            messagebox.showwarning(_("Warning"), _("Please select a template file first"))
             return
         
-        try:
-            # 收集表单数据
-            form_data = self.collect_form_data()
-            
-            # 处理JSON数据
-            json_data = {}
-            json_text = self.json_text.get(1.0, tk.END).strip()
-            if json_text:
-                is_valid, result = self.processor.validate_json_data(json_text)
-                if is_valid:
-                    json_data = result
-                else:
-                    messagebox.showerror("JSON错误", result)
-                    return
-            
-            # 合并数据
-            merged_data = self.processor.merge_data_sources(form_data, json_data)
+        template_content = self.template_content
+        form_data = self.collect_form_data()
+        
+        def render(json_result):
+            if not json_result.valid:
+                self.show_json_status(json_result, scroll=True)
+                messagebox.showerror(_("Error"), json_result.describe())
+                return
+            try:
+                merged_data = self.processor.merge_data_sources(form_data, json_result.data, self.data_base_dir())
+            except Exception as e:
+                messagebox.showerror(_("Error"), str(e))
+                return
             
-            if not merged_data:
-                messagebox.showwarning("警告", "请输入至少一个变量值")
+            file_path = filedialog.asksaveasfilename(
+                title=_("Render to File"),
+                defaultextension=".txt",
+                filetypes=[(_("All Files"), "*.*")]
+            )
+            if not file_path:
                 return
             
-            # 渲染模板
-            result = self.processor.render_template(self.template_content, merged_data)
+            def on_done(written, error):
+                if error is not None:
+                    messagebox.showerror(_("Error"), str(error))
+                else:
+                    messagebox.showinfo(_("Success"), _("Rendered {} bytes to: {}").format(written, file_path))
             
-            # 显示结果
+            self.run_in_background(
+                lambda: self.processor.render_to_file(template_content, merged_data, file_path), on_done)
+        
+        self.with_json_result(render)
+    
+    def show_result(self, result):
+        """在结果区域显示渲染结果"""
+        with self.processor.metrics.measure('insert'):
             self.result_text.delete(1.0, tk.END)
             self.result_text.insert(1.0, result)
+    
+    def collect_form_data(self):
+        """收集表单数据"""
+        return self.collect_variables_data(keep_empty=False)
+    
+    def collect_variables_data(self, keep_empty=False):
+        """
+        收集表单中的变量值并转换类型
+        
+        Args:
+            keep_empty (bool): 为 True 时空值记为 None，否则省略
             
+        Returns:
+            dict: 变量数据
+        """
+        return self.variable_model.collect(keep_empty)
+    
+    def import_data_table(self):
+        """导入CSV/TSV数据表，每行作为一条批量渲染记录"""
+        file_path = filedialog.askopenfilename(
+            title=_("Import Data Table"),
+            filetypes=[
+                (_("Table Files"), "*.csv *.tsv *.tab"),
+                (_("All Files"), "*.*")
+            ]
+        )
+        if not file_path:
+            return
+        
+        try:
+            self.batch_records = load_table(file_path)
         except Exception as e:
-            messagebox.showerror("错误", f"生成文本失败: {str(e)}")
+            messagebox.showerror(_("Error"), _("Import failed: {}").format(str(e)))
+            return
+        
+        # 用第一条记录填充表单以便预览
+        if self.batch_records:
+            for position in self.variable_model.fill(self.batch_records[0]):
+                entry = self.variable_entries[position]
+                text = self.variable_model.values[position]
+                entry.delete(0, tk.END)
+                entry.insert(0, text)
+        
+        messagebox.showinfo(_("Success"), _("Imported {} records").format(len(self.batch_records)))
+    
+    def generate_text(self):
+        """生成文本"""
+        self.sync_template_source()
+        if not self.template_content:
+            messagebox.showwarning("警告", "请先选择模板文件")
+            return
+        
+        # 收集表单数据
+        form_data = self.collect_form_data()
+        template_content = self.template_content
+        
+        def render(json_result):
+            try:
+                # 处理JSON数据，内容未变化时复用上次的解析结果
+                if not json_result.valid:
+                    self.show_json_status(json_result, scroll=True)
+                    messagebox.showerror("JSON错误", f"JSON格式错误: {json_result.describe()}")
+                    return
+                
+                # 合并数据
+                merged_data = self.processor.merge_data_sources(form_data, json_result.data, self.data_base_dir())
+                
+                if not merged_data:
+                    messagebox.showwarning("警告", "请输入至少一个变量值")
+                    return
+                
+                # 渲染模板
+                result = self.processor.render_template(template_content, merged_data)
+                
+                # 显示结果
+                self.show_result(result)
+                
+                # 记录到渲染历史，用于对比
+                self.render_history.add(result, os.path.basename(self.current_file) if self.current_file else '')
+                
+            except Exception as e:
+                messagebox.showerror("错误", f"生成文本失败: {str(e)}")
+        
+        # JSON 未变化时立即渲染，否则在后台解析完成后渲染
+        self.with_json_result(render)
     
     def clear_all(self):
         """清空所有内容"""
@@ -644,14 +1378,14 @@ class JinjaTemplateGUI:
         self.template_content = ""
         self.current_file = None
         self.file_path_var.set(_("No file selected"))
+        self.show_template_source()
         
         # 清空变量输入
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-        self.template_vars = {}
+        self.clear_variable_form()
+        self.batch_records = []
         
         # 清空JSON输入
-        self.json_text.delete(1.0, tk.END)
+        self.clear_json_input()
         
         # 清空结果
         self.result_text.delete(1.0, tk.END)
@@ -674,12 +1408,24 @@ class JinjaTemplateGUI:
         
         if file_path:
             try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(result_text)
+                with self.processor.metrics.measure('save'):
+                    with open(file_path, 'w', encoding='utf-8') as f:
+                        f.write(result_text)
                 messagebox.showinfo("成功", f"文件已保存到: {file_path}")
             except Exception as e:
                 messagebox.showerror("错误", f"保存文件失败: {str(e)}")
     
+    @staticmethod
+    def _load_app_config():
+        """读取配置文件"""
+        try:
+            if os.path.exists('config.json'):
+                with open('config.json', 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Failed to load config: {e}")
+        return {}
+    
     @staticmethod
     def _mark_pending_restart_static():
         """标记等待重启状态（静态方法）"""
@@ -752,7 +1498,68 @@ class JinjaTemplateGUI:
         except Exception as e:
             messagebox.showerror(_("Error"), _("Failed to restart program: {}").format(str(e)))
 
+def bundled_precompiled_path():
+    """获取随程序打包的预编译模板目录，不存在时返回 None"""
+    import sys
+    base_dir = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    path = os.path.join(base_dir, 'precompiled')
+    return path if os.path.isdir(path) else None
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="JinjaUtilGUI - Jinja2 template tool")
+    parser.add_argument('--serve', action='store_true',
+                        help="run the local HTTP/JSON render server instead of the GUI")
+    parser.add_argument('--host', default='127.0.0.1', help="render server host")
+    parser.add_argument('--port', type=int, default=8765, help="render server port")
+    parser.add_argument('--templates', help="template directory to keep warm in the render server")
+    parser.add_argument('--workers', type=int, default=4, help="render server worker threads")
+    parser.add_argument('--precompiled', help="precompiled template directory or zip for the render server")
+    parser.add_argument('--allow-source', action='store_true',
+                        help="accept inline \"source\" templates in render requests (rendered in a sandbox)")
+    parser.add_argument('--allowed-host', action='append', default=[], metavar='HOST',
+                        help="extra Host/Origin name accepted by the render server (repeatable)")
+    parser.add_argument('--precompile', metavar='TEMPLATE_DIR',
+                        help="compile a template directory into Python modules and exit")
+    parser.add_argument('--output', default='precompiled',
+                        help="output directory (or .zip file with --zip) for --precompile")
+    parser.add_argument('--zip', action='store_true', help="write precompiled templates into a zip file")
+    parser.add_argument('--lint', nargs='+', metavar='TEMPLATE',
+                        help="check templates for performance issues and exit (status 1 on warnings)")
+    return parser.parse_args(argv)
+
+
 def main():
+    args = parse_args()
+    if args.precompile:
+        config = JinjaTemplateGUI._load_app_config()
+        processor = TemplateProcessor(filter_modules=config.get('filter_modules', []))
+        compiled = processor.compile_template_directory(
+            args.precompile, args.output, zip='deflated' if args.zip else None
+        )
+        print(f"Compiled {len(compiled)} templates into {args.output}")
+        return
+    if args.lint:
+        config = JinjaTemplateGUI._load_app_config()
+        processor = TemplateProcessor(filter_modules=config.get('filter_modules', []))
+        failed = False
+        for path in args.lint:
+            with open(path, 'r', encoding='utf-8') as f:
+                report = processor.lint_template(f.read())
+            print(f"== {path}")
+            print(report.format(_))
+            failed = failed or report.has_warnings
+        raise SystemExit(1 if failed else 0)
+    if args.serve:
+        from render_server import serve
+        config = JinjaTemplateGUI._load_app_config()
+        serve(args.host, args.port, args.templates, args.workers,
+              filter_modules=config.get('filter_modules', []),
+              precompiled_path=args.precompiled or bundled_precompiled_path(),
+              allow_source=args.allow_source, allowed_hosts=args.allowed_host)
+        return
+    
     try:
         root = tk.Tk()
         app = JinjaTemplateGUI(root)
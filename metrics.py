@@ -0,0 +1,335 @@
+import bisect
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+
+# 延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# tracemalloc.reset_peak 在 Python 3.9 才加入，更早的版本不记录单次渲染的内存峰值
+_CAN_RESET_PEAK = hasattr(tracemalloc, 'reset_peak')
+
+# 记录耗时的阶段：读取模板、提取变量、编译、渲染、写入结果控件、保存文件
+STAGES = ('load', 'extract', 'compile', 'render', 'insert', 'save')
+
+
+class LatencyHistogram:
+    """线程安全的累积延迟直方图"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """记录一次耗时"""
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self):
+        """
+        获取直方图快照
+
+        Returns:
+            dict: {'buckets': [(上限, 累积次数)], 'count', 'sum', 'max'}
+        """
+        with self._lock:
+            counts = list(self.counts)
+            count, total, maximum = self.count, self.sum, self.max
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            running += bucket_count
+            cumulative.append((bound, running))
+        return {'buckets': cumulative, 'count': count, 'sum': total, 'max': maximum}
+
+
+class Metrics:
+    """
+    模板处理各阶段的耗时、计数、输出大小和内存峰值
+
+    trace_memory 为 True 时使用 tracemalloc 记录每次渲染的内存峰值；
+    tracemalloc 会明显拖慢内存分配，且多线程同时渲染时峰值只是近似值，默认关闭。
+    设置 event_log 后每个阶段事件以 JSON Lines 格式追加写入该文件。
+    """
+
+    def __init__(self, trace_memory=False, event_log=None):
+        """
+        Args:
+            trace_memory (bool): 是否记录渲染的内存峰值
+            event_log (str): 事件日志文件路径，None 表示不写入
+        """
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._lock = threading.Lock()
+        self._event_file = None
+        if event_log:
+            self.set_event_log(event_log)
+        self.reset()
+
+    def reset(self):
+        """清空所有统计"""
+        with self._lock:
+            self._stages = {stage: LatencyHistogram() for stage in STAGES}
+            self._counters = {}
+            self._errors = {}
+            self._output = {'count': 0, 'sum': 0, 'max': 0}
+            self._memory = {'count': 0, 'last': 0, 'max': 0}
+            self.started_at = time.time()
+
+    def set_event_log(self, path):
+        """
+        设置事件日志文件
+
+        Args:
+            path (str): JSON Lines 文件路径，None 表示停止写入
+        """
+        with self._lock:
+            if self._event_file is not None:
+                self._event_file.close()
+                self._event_file = None
+            if path:
+                try:
+                    self._event_file = open(path, 'a', encoding='utf-8')
+                except OSError as e:
+                    print(f"Failed to open metrics event log: {e}")
+
+    def measure(self, stage, **fields):
+        """
+        计时上下文，退出时记录耗时，发生异常时计入该阶段的错误数
+
+        用法:
+            with metrics.measure('render') as measurement:
+                measurement.output = template.render(...)
+
+        Args:
+            stage (str): 阶段名
+            **fields: 额外写入事件日志的字段
+
+        Returns:
+            _Measurement: 上下文对象，可设置 output（文本或字节数）记录输出大小
+        """
+        return _Measurement(self, stage, fields)
+
+    def observe(self, stage, seconds, output=None, peak_memory=None, **fields):
+        """
+        记录一次阶段耗时
+
+        Args:
+            stage (str): 阶段名
+            seconds (float): 耗时（秒）
+            output (str): 阶段输出的文本或已知的字节数，用于统计输出大小
+            peak_memory (int): 阶段内的内存峰值（字节）
+            **fields: 额外写入事件日志的字段
+        """
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, LatencyHistogram())
+        histogram.observe(seconds)
+
+        output_bytes = None
+        if output is not None:
+            if isinstance(output, str):
+                output_bytes = len(output) if output.isascii() else len(output.encode('utf-8'))
+            elif isinstance(output, int):
+                output_bytes = output
+            else:
+                output_bytes = len(output)
+        if output_bytes is not None or peak_memory is not None:
+            with self._lock:
+                if output_bytes is not None:
+                    self._output['count'] += 1
+                    self._output['sum'] += output_bytes
+                    self._output['max'] = max(self._output['max'], output_bytes)
+                if peak_memory is not None:
+                    self._memory['count'] += 1
+                    self._memory['last'] = peak_memory
+                    self._memory['max'] = max(self._memory['max'], peak_memory)
+
+        if self._event_file is not None:
+            event = {'ts': round(time.time(), 6), 'stage': stage, 'seconds': round(seconds, 6)}
+            if output_bytes is not None:
+                event['bytes'] = output_bytes
+            if peak_memory is not None:
+                event['peak_memory'] = peak_memory
+            event.update(fields)
+            self._write_event(event)
+
+    def increment(self, name, amount=1):
+        """
+        增加计数器
+
+        Args:
+            name (str): 计数器名，例如 template_cache_hits
+            amount (int): 增量
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def record_error(self, stage):
+        """记录一次阶段错误"""
+        with self._lock:
+            self._errors[stage] = self._errors.get(stage, 0) + 1
+
+    def snapshot(self):
+        """
+        获取统计快照
+
+        Returns:
+            dict: 各阶段直方图、计数器、错误数、输出大小和内存峰值
+        """
+        with self._lock:
+            stages = dict(self._stages)
+            snapshot = {
+                'timestamp': time.time(),
+                'uptime_seconds': time.time() - self.started_at,
+                'counters': dict(self._counters),
+                'errors': dict(self._errors),
+                'output_bytes': dict(self._output),
+                'peak_memory_bytes': dict(self._memory) if self.trace_memory else None,
+            }
+        snapshot['stages'] = {stage: histogram.snapshot() for stage, histogram in stages.items()}
+        return snapshot
+
+    def export(self, path, snapshot=None, fmt=None):
+        """
+        将统计快照写入文件
+
+        JSON Lines 格式追加一行，便于比较不同版本和数据集；Prometheus 文本格式整体覆盖。
+
+        Args:
+            path (str): 文件路径
+            snapshot (dict): 要写入的快照，默认为当前快照
+            fmt (str): 'jsonl' 或 'prometheus'，默认按扩展名判断（.prom / .txt 为 Prometheus）
+        """
+        if snapshot is None:
+            snapshot = self.snapshot()
+        if fmt is None:
+            fmt = 'prometheus' if os.path.splitext(path)[1].lower() in ('.prom', '.txt') else 'jsonl'
+
+        if fmt == 'jsonl':
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(_jsonable(snapshot), ensure_ascii=False) + '\n')
+            return
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(format_prometheus(snapshot))
+        os.replace(tmp_path, path)
+
+    def _write_event(self, event):
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._event_file is None:
+                return
+            try:
+                self._event_file.write(line)
+                self._event_file.flush()
+            except OSError as e:
+                print(f"Failed to write metrics event: {e}")
+
+
+class _Measurement:
+    """Metrics.measure 返回的计时上下文"""
+
+    __slots__ = ('metrics', 'stage', 'fields', 'output', 'start', 'memory_base')
+
+    def __init__(self, metrics, stage, fields):
+        self.metrics = metrics
+        self.stage = stage
+        self.fields = fields
+        self.output = None
+        self.memory_base = None
+
+    def __enter__(self):
+        if (self.metrics.trace_memory and self.stage == 'render' and _CAN_RESET_PEAK
+                and tracemalloc.is_tracing()):
+            tracemalloc.reset_peak()
+            self.memory_base = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.start
+        peak_memory = None
+        if self.memory_base is not None:
+            peak_memory = max(tracemalloc.get_traced_memory()[1] - self.memory_base, 0)
+        if exc_type is not None:
+            self.metrics.record_error(self.stage)
+        self.metrics.observe(self.stage, seconds, self.output, peak_memory, **self.fields)
+        return False
+
+
+def format_prometheus(snapshot):
+    """
+    将统计快照格式化为 Prometheus 文本格式
+
+    Args:
+        snapshot (dict): Metrics.snapshot 的结果，可包含 TemplateProcessor.get_metrics 附加的 render_cache
+
+    Returns:
+        str: Prometheus 文本
+    """
+    lines = [
+        '# TYPE jinjautil_stage_seconds histogram',
+    ]
+    for stage, histogram in snapshot['stages'].items():
+        for bound, count in histogram['buckets']:
+            le = '+Inf' if bound == float('inf') else f'{bound:g}'
+            lines.append(f'jinjautil_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {count}')
+        lines.append(f'jinjautil_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+        lines.append(f'jinjautil_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+    lines.append('# TYPE jinjautil_stage_errors_total counter')
+    for stage, count in sorted(snapshot['errors'].items()):
+        lines.append(f'jinjautil_stage_errors_total{{stage="{stage}"}} {count}')
+
+    for name, count in sorted(snapshot['counters'].items()):
+        lines.append(f'# TYPE jinjautil_{name}_total counter')
+        lines.append(f'jinjautil_{name}_total {count}')
+
+    output = snapshot['output_bytes']
+    lines.append('# TYPE jinjautil_output_bytes summary')
+    lines.append(f"jinjautil_output_bytes_sum {output['sum']}")
+    lines.append(f"jinjautil_output_bytes_count {output['count']}")
+    lines.append('# TYPE jinjautil_output_bytes_max gauge')
+    lines.append(f"jinjautil_output_bytes_max {output['max']}")
+
+    memory = snapshot.get('peak_memory_bytes')
+    if memory is not None:
+        lines.append('# TYPE jinjautil_render_peak_memory_bytes gauge')
+        lines.append(f"jinjautil_render_peak_memory_bytes{{value=\"last\"}} {memory['last']}")
+        lines.append(f"jinjautil_render_peak_memory_bytes{{value=\"max\"}} {memory['max']}")
+
+    cache = snapshot.get('render_cache')
+    if cache is not None:
+        lines.append('# TYPE jinjautil_render_cache_total counter')
+        for name in ('hits', 'misses', 'bypasses'):
+            lines.append(f'jinjautil_render_cache_total{{result="{name}"}} {cache[name]}')
+        lines.append('# TYPE jinjautil_render_cache_hit_ratio gauge')
+        lines.append(f"jinjautil_render_cache_hit_ratio {cache['hit_rate']:.6f}")
+    return '\n'.join(lines) + '\n'
+
+
+def _jsonable(snapshot):
+    """将直方图中的无穷大上限转换为字符串，便于写入 JSON"""
+    data = dict(snapshot)
+    data['stages'] = {
+        stage: dict(histogram, buckets=[['+Inf' if bound == float('inf') else bound, count]
+                                        for bound, count in histogram['buckets']])
+        for stage, histogram in snapshot['stages'].items()
+    }
+    return data
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class UncacheableValue(Exception):
+    """变量中包含无法规范化的值（例如文件句柄、生成器）"""
+
+
+def canonical_hash(values):
+    """
+    计算变量数据的规范化哈希
+
+    字典按键排序，值带类型标记，因此 1、1.0、True 与 '1' 的哈希互不相同。
+
+    Args:
+        values: 由 dict / list / tuple / str / int / float / bool / None 组成的数据
+
+    Returns:
+        str: 十六进制哈希
+
+    Raises:
+        UncacheableValue: 数据中包含其他类型的值
+    """
+    if _is_plain_json(values):
+        # 常见情况：只含字符串键字典、列表和标量，JSON 序列化即可区分类型且更快
+        data = json.dumps(values, sort_keys=True, separators=(',', ':'))
+    else:
+        data = repr(_canonicalize(values))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def _is_plain_json(value):
+    """
+    判断数据能否无歧义地用 JSON 表示
+
+    元组、非字符串键和 str 子类在 JSON 中会与列表、字符串键和普通字符串混淆，需要走慢速路径。
+    """
+    value_type = type(value)
+    if value_type in _JSON_SCALARS:
+        return True
+    if value_type is list:
+        return all(_is_plain_json(item) for item in value)
+    if value_type is dict:
+        return all(type(key) is str and _is_plain_json(item) for key, item in value.items())
+    return False
+
+
+def _canonicalize(value):
+    """将数据转换为可稳定 repr 的嵌套元组"""
+    value_type = type(value)
+    if value is None or value_type in (bool, int, float, str):
+        return (value_type.__name__, value)
+    if value_type in (list, tuple):
+        return (value_type.__name__, tuple(_canonicalize(item) for item in value))
+    if value_type is dict:
+        items = [(_canonicalize(key), _canonicalize(item)) for key, item in value.items()]
+        items.sort(key=repr)
+        return ('dict', tuple(items))
+    if isinstance(value, str) and hasattr(value, '__html__'):
+        # Markup 与普通字符串渲染结果不同，单独标记
+        return ('Markup', str(value))
+    raise UncacheableValue(value_type.__name__)
+
+
+class RenderCache:
+    """渲染结果缓存，内存层 + 可选磁盘层，均按 LRU 淘汰，可在多个线程间共享"""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024,
+                 disk_dir=None, disk_max_bytes=256 * 1024 * 1024):
+        """
+        初始化缓存
+
+        Args:
+            max_entries (int): 内存层最多条目数
+            max_bytes (int): 内存层占用上限（字节）
+            disk_dir (str): 磁盘层目录，为 None 时不使用磁盘层
+            disk_max_bytes (int): 磁盘层占用上限（字节）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_index = OrderedDict()
+        self._disk_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self._lock = threading.Lock()
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def get(self, key):
+        """
+        查询缓存
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            str: 缓存的渲染结果，未命中时返回 None
+        """
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return text
+            if not self.disk_dir or key not in self._disk_index:
+                self.misses += 1
+                return None
+
+        # 文件读取不持有锁，避免磁盘 I/O 阻塞其他线程的内存层查询
+        text = self._read_disk(key)
+        with self._lock:
+            if text is None:
+                if key in self._disk_index:
+                    self._disk_bytes -= self._disk_index.pop(key)
+                self.misses += 1
+                return None
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+            self.hits += 1
+            self.disk_hits += 1
+            self._put_memory(key, text)
+            return text
+
+    def put(self, key, text):
+        """
+        写入缓存，磁盘层采用写穿透
+
+        Args:
+            key (str): 缓存键
+            text (str): 渲染结果
+        """
+        with self._lock:
+            self._put_memory(key, text)
+        if not self.disk_dir:
+            return
+
+        data = text.encode('utf-8')
+        if len(data) > self.disk_max_bytes or not self._write_disk(key, data):
+            return
+        with self._lock:
+            self._disk_bytes -= self._disk_index.pop(key, 0)
+            self._disk_index[key] = len(data)
+            self._disk_bytes += len(data)
+            evicted = self._evict_disk()
+        self._remove_files(evicted)
+
+    def record_bypass(self):
+        """记录一次因模板或数据不可缓存而跳过缓存的渲染"""
+        with self._lock:
+            self.bypasses += 1
+
+    def clear(self):
+        """清空所有缓存层"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            removed = [self._disk_path(key) for key in self._disk_index]
+            self._disk_index.clear()
+            self._disk_bytes = 0
+        self._remove_files(removed)
+
+    def get_stats(self):
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 命中、未命中、跳过次数及各层占用
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'bypasses': self.bypasses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk_index),
+                'disk_bytes': self._disk_bytes,
+            }
+
+    def _put_memory(self, key, text):
+        """写入内存层并按条目数和占用淘汰"""
+        size = sys.getsizeof(text)
+        if size > self.max_bytes:
+            return
+
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= sys.getsizeof(old)
+        self._memory[key] = text
+        self._memory_bytes += size
+
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= sys.getsizeof(evicted)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.txt")
+
+    def _scan_disk(self):
+        """启动时按修改时间重建磁盘层索引"""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.txt'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk_index[key] = size
+            self._disk_bytes += size
+        self._remove_files(self._evict_disk())
+
+    def _read_disk(self, key):
+        """读取磁盘层条目并刷新修改时间，失败时返回 None（调用时不持有锁）"""
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                text = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return text
+
+    def _write_disk(self, key, data):
+        """
+        原子写入磁盘层条目（调用时不持有锁）
+
+        每次写入使用独立的临时文件，多个线程同时写入同一个键时不会互相覆盖。
+
+        Returns:
+            bool: 是否写入成功
+        """
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, prefix=f"{key}.", suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            print(f"Failed to write render cache entry: {e}")
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            return False
+        return True
+
+    def _evict_disk(self):
+        """
+        按 LRU 从磁盘层索引中淘汰条目直到低于占用上限（调用时需持有锁）
+
+        Returns:
+            list: 需要删除的文件路径，由调用方在释放锁后删除
+        """
+        evicted = []
+        while self._disk_bytes > self.disk_max_bytes and self._disk_index:
+            key, size = self._disk_index.popitem(last=False)
+            self._disk_bytes -= size
+            evicted.append(self._disk_path(key))
+        return evicted
+
+    def _remove_files(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
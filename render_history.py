@@ -0,0 +1,317 @@
+import bisect
+import difflib
+import hashlib
+import time
+import zlib
+from collections import deque
+
+
+# 无唯一锚点的区段在该规模以内时使用 difflib 逐行匹配，否则整体视为替换
+FALLBACK_MATCH_LIMIT = 1000000
+
+
+class RenderHistory:
+    """渲染结果历史，固定容量的环形缓冲区，结果以 zlib 压缩保存"""
+
+    def __init__(self, max_entries=20, max_bytes=32 * 1024 * 1024, compress_level=1):
+        """
+        初始化历史
+
+        Args:
+            max_entries (int): 最多保留的渲染次数
+            max_bytes (int): 压缩后的总占用上限（字节），超出时淘汰最早的记录
+            compress_level (int): zlib 压缩级别，较低的级别对大结果更快
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self._entries = deque()
+        self._bytes = 0
+        self._next_id = 1
+
+    def add(self, text, label=''):
+        """
+        记录一次渲染结果，与最近一次结果相同时不重复记录
+
+        Args:
+            text (str): 渲染结果
+            label (str): 显示用的说明，例如模板文件名
+
+        Returns:
+            HistoryEntry: 新记录或相同的最近记录
+        """
+        data = text.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        if self._entries and self._entries[-1].digest == digest:
+            return self._entries[-1]
+
+        entry = HistoryEntry(self._next_id, label, time.time(), len(data), digest,
+                             zlib.compress(data, self.compress_level), text.count('\n') + 1)
+        self._next_id += 1
+        self._entries.append(entry)
+        self._bytes += len(entry.compressed)
+
+        while len(self._entries) > self.max_entries or \
+                (self._bytes > self.max_bytes and len(self._entries) > 1):
+            self._bytes -= len(self._entries.popleft().compressed)
+        return entry
+
+    def entries(self):
+        """
+        获取所有记录
+
+        Returns:
+            list: HistoryEntry 列表，按时间从旧到新排列
+        """
+        return list(self._entries)
+
+    def get(self, entry_id):
+        """
+        获取指定记录
+
+        历史只应在界面线程访问；记录本身不可变，可以交给后台线程解压。
+
+        Args:
+            entry_id (int): 记录编号
+
+        Returns:
+            HistoryEntry: 记录
+
+        Raises:
+            KeyError: 记录已被淘汰
+        """
+        for entry in self._entries:
+            if entry.id == entry_id:
+                return entry
+        raise KeyError(entry_id)
+
+    def get_text(self, entry_id):
+        """
+        获取指定记录的渲染结果
+
+        Args:
+            entry_id (int): 记录编号
+
+        Returns:
+            str: 渲染结果
+
+        Raises:
+            KeyError: 记录已被淘汰
+        """
+        return self.get(entry_id).text()
+
+    def clear(self):
+        """清空历史"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_stats(self):
+        """
+        获取占用统计
+
+        Returns:
+            dict: 记录数、原始大小和压缩后大小
+        """
+        return {
+            'entries': len(self._entries),
+            'bytes': sum(entry.size for entry in self._entries),
+            'compressed_bytes': self._bytes,
+        }
+
+
+class HistoryEntry:
+    """一次渲染的记录"""
+
+    __slots__ = ('id', 'label', 'timestamp', 'size', 'digest', 'compressed', 'lines')
+
+    def __init__(self, entry_id, label, timestamp, size, digest, compressed, lines):
+        self.id = entry_id
+        self.label = label
+        self.timestamp = timestamp
+        self.size = size
+        self.digest = digest
+        self.compressed = compressed
+        self.lines = lines
+
+    def text(self):
+        """解压渲染结果"""
+        return zlib.decompress(self.compressed).decode('utf-8')
+
+    def describe(self):
+        """显示用的简短说明"""
+        stamp = time.strftime('%H:%M:%S', time.localtime(self.timestamp))
+        return f"#{self.id} {stamp} {self.label} ({self.lines} lines)".replace('  ', ' ')
+
+
+def diff_lines(a, b):
+    """
+    对两组文本行做 patience diff
+
+    每行先映射为整数编号，之后只比较整数；先去掉公共前后缀，
+    再以两边都只出现一次的行作为锚点（取最长递增子序列）递归切分，
+    没有唯一锚点的小区段交给 difflib 处理。
+
+    Args:
+        a (list): 旧文本行
+        b (list): 新文本行
+
+    Returns:
+        list: difflib 风格的 opcodes [(tag, i1, i2, j1, j2)]
+    """
+    ids = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+
+    matches = []
+    pending = [(0, len(a_ids), 0, len(b_ids))]
+    while pending:
+        a_lo, a_hi, b_lo, b_hi = pending.pop()
+
+        # 公共前缀和后缀
+        while a_lo < a_hi and b_lo < b_hi and a_ids[a_lo] == b_ids[b_lo]:
+            matches.append((a_lo, b_lo))
+            a_lo += 1
+            b_lo += 1
+        while a_lo < a_hi and b_lo < b_hi and a_ids[a_hi - 1] == b_ids[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+            matches.append((a_hi, b_hi))
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+
+        anchors = _unique_anchors(a_ids, a_lo, a_hi, b_ids, b_lo, b_hi)
+        if anchors:
+            previous_a, previous_b = a_lo, b_lo
+            for i, j in anchors:
+                matches.append((i, j))
+                pending.append((previous_a, i, previous_b, j))
+                previous_a, previous_b = i + 1, j + 1
+            pending.append((previous_a, a_hi, previous_b, b_hi))
+        elif (a_hi - a_lo) * (b_hi - b_lo) <= FALLBACK_MATCH_LIMIT:
+            matcher = difflib.SequenceMatcher(None, a_ids[a_lo:a_hi], b_ids[b_lo:b_hi], autojunk=False)
+            for i, j, size in matcher.get_matching_blocks():
+                matches.extend((a_lo + i + k, b_lo + j + k) for k in range(size))
+
+    matches.sort()
+    return _matches_to_opcodes(matches, len(a_ids), len(b_ids))
+
+
+def _unique_anchors(a_ids, a_lo, a_hi, b_ids, b_lo, b_hi):
+    """找出区段内两边各只出现一次的行，返回其在两边位置都递增的最长序列"""
+    a_positions = {}
+    for i in range(a_lo, a_hi):
+        line = a_ids[i]
+        a_positions[line] = -1 if line in a_positions else i
+    b_positions = {}
+    for j in range(b_lo, b_hi):
+        line = b_ids[j]
+        b_positions[line] = -1 if line in b_positions else j
+
+    pairs = [(a_positions[line], j) for line, j in b_positions.items()
+             if j >= 0 and a_positions.get(line, -1) >= 0]
+    if not pairs:
+        return []
+    pairs.sort(key=lambda pair: pair[1])
+
+    # patience sorting 求 a 位置的最长递增子序列
+    tails = []
+    tail_indexes = []
+    predecessors = [-1] * len(pairs)
+    for index, (i, _) in enumerate(pairs):
+        position = bisect.bisect_left(tails, i)
+        if position > 0:
+            predecessors[index] = tail_indexes[position - 1]
+        if position == len(tails):
+            tails.append(i)
+            tail_indexes.append(index)
+        else:
+            tails[position] = i
+            tail_indexes[position] = index
+
+    anchors = []
+    index = tail_indexes[-1]
+    while index >= 0:
+        anchors.append(pairs[index])
+        index = predecessors[index]
+    anchors.reverse()
+    return anchors
+
+
+def _matches_to_opcodes(matches, a_len, b_len):
+    """将排序后的匹配行转换为 opcodes"""
+    opcodes = []
+    i = j = 0
+    index = 0
+    count = len(matches)
+    while index <= count:
+        if index < count:
+            match_i, match_j = matches[index]
+        else:
+            match_i, match_j = a_len, b_len
+
+        if i < match_i and j < match_j:
+            opcodes.append(('replace', i, match_i, j, match_j))
+        elif i < match_i:
+            opcodes.append(('delete', i, match_i, j, j))
+        elif j < match_j:
+            opcodes.append(('insert', i, i, j, match_j))
+        if index == count:
+            break
+
+        # 合并连续的匹配行
+        end = index + 1
+        while end < count and matches[end] == (match_i + end - index, match_j + end - index):
+            end += 1
+        size = end - index
+        opcodes.append(('equal', match_i, match_i + size, match_j, match_j + size))
+        i, j = match_i + size, match_j + size
+        index = end
+    return opcodes
+
+
+def diff_rows(a, b, opcodes, context=3):
+    """
+    将 opcodes 转换为显示用的行，相同的长区段只保留上下文
+
+    Args:
+        a (list): 旧文本行
+        b (list): 新文本行
+        opcodes (list): diff_lines 的结果
+        context (int): 变化前后保留的相同行数
+
+    Returns:
+        list: [(类型, 旧行号或 None, 旧行, 新行号或 None, 新行)]，
+              类型为 'equal' / 'delete' / 'insert' / 'replace' / 'skip'，行号从 1 开始
+    """
+    rows = []
+    last = len(opcodes) - 1
+    for position, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+        if tag == 'equal':
+            size = i2 - i1
+            head = 0 if position == 0 else context
+            tail = 0 if position == last else context
+            if size > head + tail:
+                for k in range(head):
+                    rows.append(('equal', i1 + k + 1, a[i1 + k], j1 + k + 1, b[j1 + k]))
+                skipped = size - head - tail
+                rows.append(('skip', None, f"... {skipped} ...", None, f"... {skipped} ..."))
+                for k in range(size - tail, size):
+                    rows.append(('equal', i1 + k + 1, a[i1 + k], j1 + k + 1, b[j1 + k]))
+            else:
+                for k in range(size):
+                    rows.append(('equal', i1 + k + 1, a[i1 + k], j1 + k + 1, b[j1 + k]))
+        elif tag == 'replace':
+            # 并排显示时逐行配对，多出的行单独成行
+            for k in range(max(i2 - i1, j2 - j1)):
+                old = i1 + k if i1 + k < i2 else None
+                new = j1 + k if j1 + k < j2 else None
+                rows.append(('replace',
+                             None if old is None else old + 1, '' if old is None else a[old],
+                             None if new is None else new + 1, '' if new is None else b[new]))
+        elif tag == 'delete':
+            for k in range(i1, i2):
+                rows.append(('delete', k + 1, a[k], None, ''))
+        else:
+            for k in range(j1, j2):
+                rows.append(('insert', None, '', k + 1, b[k]))
+    return rows
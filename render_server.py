@@ -0,0 +1,468 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from metrics import LatencyHistogram
+from template_processor import TemplateProcessor
+
+
+# 指标中单独统计的接口，其余路径计入 other
+ENDPOINTS = frozenset(['/render', '/render/batch', '/templates', '/metrics', '/health'])
+
+# 请求体大小上限
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+# 默认允许的 Host / Origin 主机名
+LOOPBACK_HOSTS = frozenset(['127.0.0.1', 'localhost', '::1'])
+
+
+class RenderServer:
+    """
+    本地 HTTP/JSON 模板渲染服务
+
+    接口:
+        POST /render        {"template": 模板名 或 "source": 模板内容, "variables": {...}}
+        POST /render/batch  {"template" 或 "source", "records": [{...}, ...]}
+        GET  /templates     已预热的模板列表
+        GET  /metrics       Prometheus 文本格式指标，?format=json 返回 JSON
+        GET  /health        健康检查
+
+    POST 请求的 Content-Type 必须是 application/json，Host 和 Origin 必须是允许的主机名，
+    防止网页通过简单请求或 DNS 重绑定访问本地服务。
+    "source" 传入的模板默认拒绝，开启后在沙箱环境中渲染。
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, templates_dir=None, workers=4,
+                 processor_factory=None, render_cache=True, precompiled=False, allow_source=False,
+                 allowed_hosts=None):
+        """
+        初始化渲染服务
+
+        Args:
+            host (str): 监听地址
+            port (int): 监听端口，0 表示随机端口
+            templates_dir (str): 启动时预热的模板目录
+            workers (int): 渲染线程数
+            processor_factory (callable): 创建 TemplateProcessor 的函数
+            render_cache (bool): 是否为每个渲染线程启用渲染结果缓存
+            precompiled (bool): 处理器是否配置了预编译模板，未预热的模板名交给 render_named
+            allow_source (bool): 是否接受请求中的 "source" 模板，接受时使用沙箱环境渲染；
+                processor_factory 需接受 sandboxed 关键字参数
+            allowed_hosts (iterable): 允许的 Host / Origin 主机名，默认只允许本机名称
+        """
+        self.templates = {}
+        if templates_dir:
+            self.load_templates(templates_dir)
+
+        self.processor_factory = processor_factory or TemplateProcessor
+        self.render_cache = render_cache
+        self.precompiled = precompiled
+        self.allow_source = allow_source
+        self.allowed_hosts = LOOPBACK_HOSTS | frozenset(host.lower() for host in allowed_hosts or ())
+        self.workers = workers
+        self._processors = []
+        self._local = threading.local()
+        self._processors_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='render',
+                                        initializer=self._init_worker)
+
+        self.latency = LatencyHistogram()
+        self.requests = {}
+        self.queue_depth = 0
+        self._stats_lock = threading.Lock()
+        self.started_at = time.time()
+
+        self.httpd = ThreadingHTTPServer((host, port), _RenderRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.render_server = self
+
+    @property
+    def address(self):
+        """实际监听的 (host, port)"""
+        return self.httpd.server_address[:2]
+
+    def load_templates(self, templates_dir):
+        """
+        读取目录中的模板，模板名为相对路径
+
+        Args:
+            templates_dir (str): 模板目录
+        """
+        for root, _, files in os.walk(templates_dir):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, templates_dir).replace(os.sep, '/')
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        self.templates[name] = f.read()
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"Failed to load template {name}: {e}")
+
+    def serve_forever(self):
+        """启动服务并阻塞，直到 shutdown 被调用"""
+        self.warm_up()
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+            self._pool.shutdown(wait=True)
+
+    def warm_up(self, timeout=60):
+        """
+        启动所有渲染线程，使模板在第一个请求前完成编译
+
+        每个任务在屏障处等待，保证线程池为每个任务创建独立线程。
+        """
+        barrier = threading.Barrier(self.workers)
+        futures = [self._pool.submit(barrier.wait, timeout) for _ in range(self.workers)]
+        for future in futures:
+            try:
+                future.result()
+            except threading.BrokenBarrierError:
+                break
+
+    def shutdown(self):
+        """停止服务"""
+        self.httpd.shutdown()
+
+    def render(self, payload):
+        """
+        在渲染线程池中渲染单个请求
+
+        Args:
+            payload (dict): 请求体
+
+        Returns:
+            str: 渲染结果
+        """
+        source, name = self._resolve_source(payload)
+        variables = payload.get('variables') or {}
+        if not isinstance(variables, dict):
+            raise ValueError("variables 必须是对象")
+        if source is None:
+            return self._submit(lambda processor: processor.render_named(name, variables))
+        return self._submit(lambda processor: processor.render_template(source, variables),
+                            sandboxed=name is None)
+
+    def render_batch(self, payload):
+        """
+        在渲染线程池中批量渲染，一次提交共用同一个编译后的模板
+
+        Args:
+            payload (dict): 请求体
+
+        Returns:
+            list: 渲染结果列表
+        """
+        source, name = self._resolve_source(payload)
+        records = payload.get('records') or []
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise ValueError("records 必须是对象数组")
+        if source is None:
+            return self._submit(
+                lambda processor: [processor.render_named(name, record) for record in records]
+            )
+        incremental = bool(payload.get('incremental', False))
+        return self._submit(
+            lambda processor: processor.render_batch(source, records, incremental=incremental),
+            sandboxed=name is None
+        )
+
+    def is_allowed_host(self, host):
+        """
+        判断 Host 或 Origin 中的主机名是否允许访问
+
+        Args:
+            host (str): 主机名，可以带端口，IPv6 地址可以带方括号
+
+        Returns:
+            bool: 是否允许
+        """
+        if not host:
+            return False
+        host = host.strip().lower()
+        if host.startswith('['):
+            host = host[1:].split(']', 1)[0]
+        elif host.count(':') == 1:
+            host = host.split(':', 1)[0]
+        return host in self.allowed_hosts
+
+    def record_request(self, endpoint, status, seconds):
+        """记录请求计数和延迟"""
+        self.latency.observe(seconds)
+        if endpoint not in ENDPOINTS:
+            endpoint = 'other'
+        with self._stats_lock:
+            key = (endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def get_metrics(self):
+        """
+        汇总服务指标
+
+        Returns:
+            dict: 请求计数、延迟直方图、队列深度和渲染缓存统计
+        """
+        with self._stats_lock:
+            requests = dict(self.requests)
+            queue_depth = self.queue_depth
+        with self._processors_lock:
+            processors = list(self._processors)
+
+        cache = {'hits': 0, 'misses': 0, 'bypasses': 0}
+        for processor in processors:
+            if processor.render_cache is not None:
+                stats = processor.render_cache.get_stats()
+                for name in cache:
+                    cache[name] += stats[name]
+        lookups = cache['hits'] + cache['misses']
+        cache['hit_rate'] = cache['hits'] / lookups if lookups else 0.0
+
+        return {
+            'uptime_seconds': time.time() - self.started_at,
+            'templates': len(self.templates),
+            'workers': self.workers,
+            'queue_depth': queue_depth,
+            'requests': requests,
+            'latency': self.latency.snapshot(),
+            'render_cache': cache,
+        }
+
+    def format_prometheus(self, metrics):
+        """将指标格式化为 Prometheus 文本格式"""
+        lines = [
+            '# TYPE jinjautil_uptime_seconds gauge',
+            f"jinjautil_uptime_seconds {metrics['uptime_seconds']:.3f}",
+            '# TYPE jinjautil_templates gauge',
+            f"jinjautil_templates {metrics['templates']}",
+            '# TYPE jinjautil_queue_depth gauge',
+            f"jinjautil_queue_depth {metrics['queue_depth']}",
+            '# TYPE jinjautil_requests_total counter',
+        ]
+        for (endpoint, status), count in sorted(metrics['requests'].items()):
+            lines.append(f'jinjautil_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+        latency = metrics['latency']
+        lines.append('# TYPE jinjautil_request_latency_seconds histogram')
+        for bound, count in latency['buckets']:
+            le = '+Inf' if bound == float('inf') else f'{bound:g}'
+            lines.append(f'jinjautil_request_latency_seconds_bucket{{le="{le}"}} {count}')
+        lines.append(f"jinjautil_request_latency_seconds_sum {latency['sum']:.6f}")
+        lines.append(f"jinjautil_request_latency_seconds_count {latency['count']}")
+
+        cache = metrics['render_cache']
+        lines.append('# TYPE jinjautil_render_cache_total counter')
+        for name in ('hits', 'misses', 'bypasses'):
+            lines.append(f'jinjautil_render_cache_total{{result="{name}"}} {cache[name]}')
+        lines.append('# TYPE jinjautil_render_cache_hit_ratio gauge')
+        lines.append(f"jinjautil_render_cache_hit_ratio {cache['hit_rate']:.6f}")
+        return '\n'.join(lines) + '\n'
+
+    def _init_worker(self):
+        """为每个渲染线程创建独立的处理器并预热所有模板"""
+        processor = self.processor_factory()
+        if self.render_cache and processor.render_cache is None:
+            processor.enable_render_cache()
+        if self.allow_source:
+            # 请求中传入的模板不可信，使用单独的沙箱处理器渲染
+            self._local.sandbox = self.processor_factory(sandboxed=True)
+            if self.render_cache and self._local.sandbox.render_cache is None:
+                self._local.sandbox.enable_render_cache()
+        for name, source in self.templates.items():
+            try:
+                processor.get_compiled(source)
+            except Exception as e:
+                print(f"Failed to compile template {name}: {e}")
+        self._local.processor = processor
+        with self._processors_lock:
+            self._processors.append(processor)
+
+    def _resolve_source(self, payload):
+        """
+        从请求中获取模板
+
+        Returns:
+            tuple: (模板内容, 模板名)；模板只存在于预编译模块中时模板内容为 None
+        """
+        if 'source' in payload:
+            if not self.allow_source:
+                raise PermissionError("服务未开启 source 模板，请使用 template 指定已加载的模板")
+            source = payload['source']
+            if not isinstance(source, str):
+                raise ValueError("source 必须是字符串")
+            return source, None
+        name = payload.get('template')
+        if name in self.templates:
+            return self.templates[name], name
+        if self.precompiled and isinstance(name, str):
+            return None, name
+        raise KeyError(f"未知模板: {name}")
+
+    def _submit(self, job, sandboxed=False):
+        """提交渲染任务并等待结果，sandboxed 为 True 时使用沙箱处理器"""
+        with self._stats_lock:
+            self.queue_depth += 1
+        try:
+            future = self._pool.submit(self._run_job, job, sandboxed)
+            return future.result()
+        finally:
+            with self._stats_lock:
+                self.queue_depth -= 1
+
+    def _run_job(self, job, sandboxed):
+        return job(self._local.sandbox if sandboxed else self._local.processor)
+
+
+class _RequestRejected(Exception):
+    """请求在请求体读取完之前被拒绝，响应后需关闭连接"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _RenderRequestHandler(BaseHTTPRequestHandler):
+    """渲染服务的请求处理器，使用 HTTP/1.1 保持连接"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'JinjaUtilRender/1.0'
+    # 响应头和响应体分两次写出，保持连接时需关闭 Nagle 算法以避免延迟确认造成的 40ms 停顿
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        server = self.server.render_server
+
+        if not server.is_allowed_host(self.headers.get('Host')):
+            status = self._send_json(403, {'error': 'host not allowed'})
+        elif url.path == '/health':
+            status = self._send_json(200, {'status': 'ok'})
+        elif url.path == '/templates':
+            status = self._send_json(200, {'templates': sorted(server.templates)})
+        elif url.path == '/metrics':
+            metrics = server.get_metrics()
+            if parse_qs(url.query).get('format') == ['json']:
+                metrics['requests'] = [
+                    {'endpoint': endpoint, 'status': code, 'count': count}
+                    for (endpoint, code), count in sorted(metrics['requests'].items())
+                ]
+                status = self._send_json(200, metrics)
+            else:
+                status = self._send(200, server.format_prometheus(metrics).encode('utf-8'),
+                                    'text/plain; version=0.0.4; charset=utf-8')
+        else:
+            status = self._send_json(404, {'error': 'not found'})
+        server.record_request(url.path, status, time.perf_counter() - start)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        server = self.server.render_server
+
+        try:
+            self._check_request(server)
+            payload = self._read_json()
+            if url.path == '/render':
+                status = self._send_json(200, {'result': server.render(payload)})
+            elif url.path == '/render/batch':
+                status = self._send_json(200, {'results': server.render_batch(payload)})
+            else:
+                status = self._send_json(404, {'error': 'not found'})
+        except _RequestRejected as e:
+            # 请求体没有读取，保持连接会把它当作下一个请求解析
+            status = self._send_json(e.status, {'error': str(e)}, close=True)
+        except PermissionError as e:
+            status = self._send_json(403, {'error': str(e)})
+        except KeyError as e:
+            status = self._send_json(400, {'error': e.args[0] if e.args else str(e)})
+        except ValueError as e:
+            status = self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            status = self._send_json(422, {'error': str(e)})
+        server.record_request(url.path, status, time.perf_counter() - start)
+
+    def log_message(self, format, *args):
+        # 高并发时逐条打印访问日志开销很大，由 /metrics 提供统计
+        pass
+
+    def _check_request(self, server):
+        """检查 Host、Origin 和 Content-Type，拒绝来自网页的跨站请求"""
+        if not server.is_allowed_host(self.headers.get('Host')):
+            raise _RequestRejected(403, "host not allowed")
+        origin = self.headers.get('Origin')
+        if origin is not None and not server.is_allowed_host(urlparse(origin).netloc):
+            raise _RequestRejected(403, "origin not allowed")
+        content_type = (self.headers.get('Content-Type') or '').split(';', 1)[0].strip().lower()
+        if content_type != 'application/json':
+            raise _RequestRejected(415, "Content-Type must be application/json")
+
+    def _read_json(self):
+        """读取 JSON 请求体"""
+        value = (self.headers.get('Content-Length') or '0').strip()
+        if not (value.isascii() and value.isdigit()):
+            raise _RequestRejected(400, "invalid Content-Length")
+        length = int(value)
+        if length > MAX_BODY_BYTES:
+            raise _RequestRejected(400, "请求体过大")
+        body = self.rfile.read(length)
+        if len(body) < length:
+            raise _RequestRejected(400, "incomplete request body")
+        try:
+            payload = json.loads(body or b'{}')
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON格式错误: {str(e)}")
+        if not isinstance(payload, dict):
+            raise ValueError("请求体必须是对象")
+        return payload
+
+    def _send_json(self, status, data, close=False):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        return self._send(status, body, 'application/json; charset=utf-8', close)
+
+    def _send(self, status, body, content_type, close=False):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if close:
+            # 同时设置 close_connection，响应发送后关闭连接
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+
+def serve(host='127.0.0.1', port=8765, templates_dir=None, workers=4, filter_modules=None,
+          precompiled_path=None, allow_source=False, allowed_hosts=None):
+    """
+    启动渲染服务（命令行入口）
+
+    Args:
+        host (str): 监听地址
+        port (int): 监听端口
+        templates_dir (str): 预热的模板目录
+        workers (int): 渲染线程数
+        filter_modules (list): 过滤器插件模块
+        precompiled_path (str): 预编译模板目录或 zip 文件
+        allow_source (bool): 是否接受请求中的 "source" 模板（在沙箱中渲染）
+        allowed_hosts (list): 除本机名称外允许的 Host / Origin 主机名
+    """
+    server = RenderServer(
+        host, port, templates_dir, workers,
+        processor_factory=lambda sandboxed=False: TemplateProcessor(
+            filter_modules=filter_modules, precompiled_path=precompiled_path, sandboxed=sandboxed),
+        precompiled=bool(precompiled_path),
+        allow_source=allow_source,
+        allowed_hosts=allowed_hosts
+    )
+    bound_host, bound_port = server.address
+    print(f"Render server listening on http://{bound_host}:{bound_port} "
+          f"({len(server.templates)} templates, {workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,380 @@
+import bisect
+import re
+import time
+
+from jinja2 import TemplateSyntaxError
+
+
+# 模板源码的标签样式
+TEMPLATE_TAG_STYLES = {
+    'jinja_delimiter': {'foreground': '#a626a4'},
+    'jinja_keyword': {'foreground': '#0033b3'},
+    'jinja_name': {'foreground': '#986801'},
+    'jinja_filter': {'foreground': '#00627a'},
+    'jinja_string': {'foreground': '#067d17'},
+    'jinja_number': {'foreground': '#1750eb'},
+    'jinja_operator': {'foreground': '#5c5c5c'},
+    'jinja_comment': {'foreground': '#8c8c8c'},
+}
+
+# 渲染结果的标签样式
+OUTPUT_TAG_STYLES = {
+    'output_heading': {'foreground': '#0033b3'},
+    'output_url': {'foreground': '#2a5db0', 'underline': True},
+    'output_string': {'foreground': '#067d17'},
+    'output_literal': {'foreground': '#a626a4'},
+    'output_number': {'foreground': '#1750eb'},
+}
+
+JINJA_KEYWORDS = frozenset([
+    'and', 'as', 'block', 'call', 'context', 'elif', 'else', 'endblock', 'endcall',
+    'endfilter', 'endfor', 'endif', 'endmacro', 'endraw', 'endset', 'endwith', 'extends',
+    'false', 'False', 'filter', 'for', 'from', 'if', 'ignore', 'import', 'in', 'include',
+    'is', 'macro', 'missing', 'none', 'None', 'not', 'or', 'raw', 'recursive', 'required',
+    'scoped', 'set', 'true', 'True', 'with', 'without',
+])
+
+_TOKEN_TAGS = {
+    'variable_begin': 'jinja_delimiter',
+    'variable_end': 'jinja_delimiter',
+    'block_begin': 'jinja_delimiter',
+    'block_end': 'jinja_delimiter',
+    'raw_begin': 'jinja_delimiter',
+    'raw_end': 'jinja_delimiter',
+    'linestatement_begin': 'jinja_delimiter',
+    'linestatement_end': 'jinja_delimiter',
+    'comment_begin': 'jinja_comment',
+    'comment': 'jinja_comment',
+    'comment_end': 'jinja_comment',
+    'linecomment': 'jinja_comment',
+    'name': 'jinja_name',
+    'string': 'jinja_string',
+    'integer': 'jinja_number',
+    'float': 'jinja_number',
+    'operator': 'jinja_operator',
+}
+
+# 进入和离开标签（或 raw 块）的词法单元
+_OPEN_TOKENS = frozenset(['variable_begin', 'block_begin', 'comment_begin', 'raw_begin',
+                          'linestatement_begin'])
+_CLOSE_TOKENS = frozenset(['variable_end', 'block_end', 'comment_end', 'raw_end',
+                           'linestatement_end'])
+
+_OUTPUT_PATTERN = re.compile(r'''
+    (?P<output_heading>^\#{1,6}[ \t].*$)
+  | (?P<output_url>\bhttps?://[^\s<>"')\]]+)
+  | (?P<output_string>"(?:[^"\\\n]|\\.)*")
+  | (?P<output_literal>\b(?:true|false|null|True|False|None)\b)
+  | (?P<output_number>(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b)
+''', re.MULTILINE | re.VERBOSE)
+
+
+class TemplateTokenizer:
+    """
+    使用 Jinja 自身的词法分析器切分模板源码
+
+    词法状态跨行（多行标签、注释、raw 块），只能从不在任何标签内的行开始分析。
+    """
+
+    stateful = True
+    tag_styles = TEMPLATE_TAG_STYLES
+
+    def __init__(self, env):
+        """
+        Args:
+            env (Environment): 与渲染使用相同分隔符配置的 Jinja2 环境
+        """
+        self.env = env
+
+    def tokenize(self, text):
+        """
+        切分一段从根状态开始的源码
+
+        Args:
+            text (str): 源码片段
+
+        Returns:
+            tuple: (样式区间 [(起始偏移, 结束偏移, 标签)],
+                    标签内部区间 [(起始偏移, 结束偏移)],
+                    片段是否结束于根状态)
+        """
+        spans = []
+        inside = []
+        position = 0
+        open_at = None
+        previous = None
+        complete = True
+        try:
+            for _, token, value in self.env.lex(text):
+                if not value:
+                    continue
+                # 空白控制（-）会去掉数据中的空白，按内容重新定位
+                start = text.find(value, position)
+                if start < 0:
+                    complete = False
+                    break
+                end = start + len(value)
+                position = end
+
+                if token in _OPEN_TOKENS:
+                    open_at = start
+                tag = _TOKEN_TAGS.get(token)
+                if token == 'name':
+                    if value in JINJA_KEYWORDS:
+                        tag = 'jinja_keyword'
+                    elif previous == '|':
+                        tag = 'jinja_filter'
+                if tag is not None:
+                    spans.append((start, end, tag))
+                if token in _CLOSE_TOKENS and open_at is not None:
+                    inside.append((open_at, end))
+                    open_at = None
+                if token != 'whitespace':
+                    previous = value
+        except TemplateSyntaxError:
+            # 编辑中的模板常有未闭合的标签，保留已经分析出的部分
+            complete = False
+
+        if open_at is not None:
+            inside.append((open_at, len(text)))
+            complete = False
+        return spans, inside, complete
+
+
+class OutputTokenizer:
+    """用正则表达式标记渲染结果中的标题、链接、字符串和数字，逐行无状态"""
+
+    stateful = False
+    tag_styles = OUTPUT_TAG_STYLES
+
+    def tokenize(self, text):
+        """
+        Args:
+            text (str): 文本片段
+
+        Returns:
+            tuple: (样式区间, 空列表, True)，与 TemplateTokenizer.tokenize 一致
+        """
+        spans = [(match.start(), match.end(), match.lastgroup)
+                 for match in _OUTPUT_PATTERN.finditer(text)]
+        return spans, [], True
+
+
+class TextHighlighter:
+    """
+    Text 控件的增量语法高亮
+
+    通过代理控件的 Tcl 命令拦截插入和删除，将受影响的行标记为待处理（hl_todo 标签），
+    标签随文本编辑自动移动。空闲时分批处理待处理区域，每批限定耗时后让出事件循环；
+    可见区域优先，eager 为 False 时只处理可见区域，滚动后再处理新露出的部分。
+    标签内部区间记录在 hl_inside 标签中，用于为有状态的词法分析寻找重新开始的行。
+    """
+
+    TODO_TAG = 'hl_todo'
+    INSIDE_TAG = 'hl_inside'
+
+    def __init__(self, widget, tokenizer, eager=True, chunk_lines=200, budget_ms=10,
+                 max_chunk_chars=200000):
+        """
+        Args:
+            widget (tk.Text): 需要高亮的文本控件
+            tokenizer: TemplateTokenizer 或 OutputTokenizer
+            eager (bool): 是否在空闲时处理可见区域之外的部分
+            chunk_lines (int): 每次分析的最大行数
+            budget_ms (int): 每批处理的耗时上限（毫秒）
+            max_chunk_chars (int): 无状态分析时单次处理的最大字符数，超出部分不高亮
+        """
+        self.widget = widget
+        self.tokenizer = tokenizer
+        self.eager = eager
+        self.chunk_lines = chunk_lines
+        self.budget = budget_ms / 1000
+        self.max_chunk_chars = max_chunk_chars
+        self._after_id = None
+
+        for tag, style in tokenizer.tag_styles.items():
+            widget.tag_configure(tag, **style)
+
+        self._install_proxy()
+        self._install_scroll_hook()
+        self.mark_dirty('1.0', 'end')
+
+    def mark_dirty(self, start, end):
+        """将 start 到 end 所在的行标记为待处理并安排空闲处理"""
+        self._call('tag', 'add', self.TODO_TAG, f"{start} linestart", f"{end} lineend +1c")
+        self.schedule()
+
+    def schedule(self):
+        """安排一次空闲处理"""
+        if self._after_id is None:
+            self._after_id = self.widget.after(1, self._step)
+
+    def _install_proxy(self):
+        """用代理命令替换控件命令，以获知插入和删除的位置"""
+        widget = self.widget
+        self._original = widget._w + '_highlight'
+        widget.tk.call('rename', widget._w, self._original)
+        widget.tk.createcommand(widget._w, self._dispatch)
+
+    def _install_scroll_hook(self):
+        """滚动或改变大小时处理新露出的区域"""
+        previous = self.widget.cget('yscrollcommand')
+
+        def on_scroll(first, last):
+            if previous:
+                self.widget.tk.call(*self.widget.tk.splitlist(previous), first, last)
+            if self._tag_range('nextrange', self.TODO_TAG, '1.0'):
+                self.schedule()
+
+        self.widget.configure(yscrollcommand=on_scroll)
+
+    def _call(self, *args):
+        return self.widget.tk.call(self._original, *args)
+
+    def _tag_range(self, method, *args):
+        """调用 tag nextrange / prevrange，返回 (起始, 结束) 字符串元组，未找到时返回 None"""
+        found = self.widget.tk.splitlist(self._call('tag', method, *args))
+        return (str(found[0]), str(found[1])) if found else None
+
+    def _dispatch(self, operation, *args):
+        """代理命令，插入、替换和删除后标记受影响的行，撤销和重做后标记整个文档"""
+        if operation == 'edit' and args and args[0] in ('undo', 'redo'):
+            # 撤销和重做在 Tk 内部修改内容，不经过 insert / delete 命令，受影响的范围无法得知
+            result = self._call(operation, *args)
+            self.mark_dirty('1.0', 'end')
+            return result
+        if operation not in ('insert', 'delete', 'replace') or not args:
+            return self._call(operation, *args)
+
+        start = self._call('index', args[0])
+        result = self._call(operation, *args)
+        if operation == 'insert':
+            inserted = sum(len(chars) for chars in args[1::2])
+        elif operation == 'replace':
+            inserted = sum(len(chars) for chars in args[2::2])
+        else:
+            inserted = 0
+        self.mark_dirty(start, f"{start} + {inserted} chars")
+        return result
+
+    def _step(self):
+        """空闲时处理待处理区域，超过耗时上限后让出事件循环"""
+        self._after_id = None
+        try:
+            deadline = time.perf_counter() + self.budget
+            while time.perf_counter() < deadline:
+                region = self._next_region()
+                if region is None:
+                    return
+                self._highlight(*region)
+        except Exception as e:
+            # 控件已销毁等情况下停止高亮
+            print(f"Failed to highlight text: {e}")
+            return
+        self.schedule()
+
+    def _next_region(self):
+        """
+        选择下一个待处理区域
+
+        Returns:
+            tuple: (起始行, 结束行)，没有需要处理的区域时返回 None
+        """
+        top = _line(self._call('index', '@0,0'))
+        bottom = _line(self._call('index', f"@0,{self.widget.winfo_height()}"))
+
+        if self.tokenizer.stateful:
+            # 有状态的分析依赖前面行的状态，按文档顺序处理
+            found = self._tag_range('nextrange', self.TODO_TAG, '1.0')
+            if found and not self.eager and _line(found[0]) > bottom:
+                return None
+        else:
+            found = self._tag_range('nextrange', self.TODO_TAG, f"{top}.0", f"{bottom}.0 lineend")
+            if not found:
+                # 待处理区域从可见区域上方开始并覆盖可见区域
+                covering = self._tag_range('prevrange', self.TODO_TAG, f"{top}.0")
+                if covering and self._compare(covering[1], '>', f"{top}.0"):
+                    found = (f"{top}.0", covering[1])
+            if not found and self.eager:
+                found = self._tag_range('nextrange', self.TODO_TAG, '1.0')
+        if not found:
+            return None
+
+        start, end = found
+        first = _line(start)
+        last = _line(end)
+        if end.endswith('.0') and last > first:
+            last -= 1
+        if not self.eager:
+            last = min(last, max(bottom, first))
+        return first, min(last, first + self.chunk_lines - 1)
+
+    def _restart_line(self, line):
+        """向前查找不在任何标签内开始的行"""
+        while line > 1:
+            position = f"{line}.0"
+            found = self._tag_range('prevrange', self.INSIDE_TAG, f"{position} +1c")
+            if not found or not (self._compare(found[0], '<', position) and
+                                 self._compare(found[1], '>', position)):
+                break
+            line = _line(found[0])
+        return line
+
+    def _compare(self, first, op, second):
+        return bool(self.widget.tk.getboolean(self._call('compare', first, op, second)))
+
+    def _highlight(self, first, last):
+        """重新分析并标记 first 到 last 行"""
+        tokenizer = self.tokenizer
+        last_line = _line(self._call('index', 'end -1c'))
+        last = min(last, last_line)
+        if tokenizer.stateful:
+            first = self._restart_line(first)
+
+        while True:
+            text = str(self._call('get', f"{first}.0", f"{last}.0 lineend"))
+            if not tokenizer.stateful and len(text) > self.max_chunk_chars:
+                text = text[:self.max_chunk_chars]
+            spans, inside, complete = tokenizer.tokenize(text)
+            # 片段结束于标签内部时向后扩展，直到标签闭合或到达文档末尾
+            if complete or last >= last_line:
+                break
+            last = min(last + self.chunk_lines, last_line)
+
+        start = f"{first}.0"
+        end = f"{last}.0 lineend +1c"
+        if tokenizer.stateful:
+            # 原先跨越区域末尾的标签已不再延续时，其后的行需要重新分析
+            following = f"{last + 1}.0"
+            found = self._tag_range('prevrange', self.INSIDE_TAG, f"{following} +1c")
+            if found and self._compare(found[0], '<', following) and self._compare(found[1], '>', following):
+                self._call('tag', 'add', self.TODO_TAG, following, f"{found[1]} lineend +1c")
+            self._call('tag', 'remove', self.INSIDE_TAG, start, end)
+
+        for tag in tokenizer.tag_styles:
+            self._call('tag', 'remove', tag, start, end)
+        self._call('tag', 'remove', self.TODO_TAG, start, end)
+
+        line_starts = [0]
+        line_starts.extend(match.end() for match in re.finditer('\n', text))
+
+        def index(offset):
+            row = bisect.bisect_right(line_starts, offset) - 1
+            return f"{first + row}.{offset - line_starts[row]}"
+
+        # 同一标签的所有区间一次添加，减少 Tcl 调用
+        grouped = {}
+        for span_start, span_end, tag in spans:
+            grouped.setdefault(tag, []).extend((index(span_start), index(span_end)))
+        for tag, indexes in grouped.items():
+            self._call('tag', 'add', tag, *indexes)
+        if inside:
+            indexes = []
+            for span_start, span_end in inside:
+                indexes.extend((index(span_start), index(span_end)))
+            self._call('tag', 'add', self.INSIDE_TAG, *indexes)
+
+
+def _line(index):
+    """获取 Text 索引中的行号"""
+    return int(str(index).split('.', 1)[0])
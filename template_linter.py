@@ -0,0 +1,448 @@
+from jinja2 import nodes
+from jinja2.exceptions import TemplateSyntaxError
+
+
+# 问题级别，warning 会让命令行检查以非零状态退出
+SEVERITIES = ('error', 'warning', 'info')
+
+
+def N_(message):
+    """标记需要翻译的消息，翻译在格式化报告时由调用方完成"""
+    return message
+
+
+def _untranslated(message):
+    return message
+
+
+# 各类节点每次求值的估算工作量（单位：一次简单操作）
+_NODE_COSTS = {
+    nodes.Filter: 2,
+    nodes.Call: 2,
+    nodes.Test: 1,
+    nodes.Getattr: 1,
+    nodes.Getitem: 1,
+    nodes.BinExpr: 1,
+    nodes.UnaryExpr: 1,
+    nodes.Compare: 1,
+    nodes.Concat: 1,
+    nodes.CondExpr: 1,
+}
+
+# include / import 每次执行需要查找模板并创建新的上下文
+_INCLUDE_COST = 20
+
+
+class LintIssue:
+    """
+    一条检查结果，line 为模板中的行号（从 1 开始）
+
+    message 为未翻译的消息（带 {} 占位符），args 为填入占位符的值。
+    """
+
+    __slots__ = ('rule', 'severity', 'line', 'message', 'args')
+
+    def __init__(self, rule, severity, line, message, args=()):
+        self.rule = rule
+        self.severity = severity
+        self.line = line
+        self.message = message
+        self.args = args
+
+    def text(self, gettext=_untranslated):
+        """翻译并填充后的消息"""
+        message = gettext(self.message)
+        return message.format(*self.args) if self.args else message
+
+    def format(self, gettext=_untranslated):
+        return f"{self.line}: {self.severity} [{self.rule}] {self.text(gettext)}"
+
+
+class LoopCost:
+    """一个 for 循环的嵌套深度与工作量估算"""
+
+    __slots__ = ('line', 'depth', 'iterable', 'iterations', 'per_iteration', 'total')
+
+    def __init__(self, line, depth, iterable, iterations, per_iteration, total):
+        self.line = line
+        self.depth = depth
+        self.iterable = iterable
+        self.iterations = iterations
+        self.per_iteration = per_iteration
+        self.total = total
+
+
+class LintReport:
+    """
+    模板检查报告
+
+    工作量以多项式 {N 的次数: 系数} 表示，N 为数据长度未知的循环的假定迭代次数。
+    """
+
+    def __init__(self, issues, loops, cost, max_depth, loop_size):
+        self.issues = sorted(issues, key=lambda issue: (issue.line, SEVERITIES.index(issue.severity)))
+        self.loops = loops
+        self.cost = cost
+        self.max_depth = max_depth
+        self.loop_size = loop_size
+
+    @property
+    def has_warnings(self):
+        """是否有 error 或 warning 级别的问题"""
+        return any(issue.severity != 'info' for issue in self.issues)
+
+    def complexity(self):
+        """渲染工作量的量级，例如 O(N^2)"""
+        degree = max((power for power, units in self.cost.items() if units), default=0)
+        if degree == 0:
+            return "O(1)"
+        return "O(N)" if degree == 1 else f"O(N^{degree})"
+
+    def estimate(self, loop_size=None):
+        """
+        按假定的迭代次数估算一次渲染的工作量
+
+        Args:
+            loop_size (int): 数据长度未知的循环的迭代次数，默认为检查时的设置
+
+        Returns:
+            float: 工作量（单位：一次简单操作）
+        """
+        n = self.loop_size if loop_size is None else loop_size
+        return sum(units * n ** power for power, units in self.cost.items())
+
+    def hotspots(self, limit=5):
+        """按总工作量排序的循环"""
+        return sorted(self.loops, key=lambda loop: _evaluate(loop.total, self.loop_size), reverse=True)[:limit]
+
+    def format(self, gettext=_untranslated):
+        """
+        格式化为文本报告
+
+        Args:
+            gettext (callable): 翻译函数，默认不翻译
+
+        Returns:
+            str: 每行一个问题，末尾为复杂度估算和最耗时的循环
+        """
+        _ = gettext
+        lines = [issue.format(gettext) for issue in self.issues]
+        if lines:
+            lines.append("")
+        lines.append(_("Maximum loop nesting depth: {}").format(self.max_depth))
+        lines.append(_("Estimated work: {0}, about {2} operations when N = {1}").format(
+            self.complexity(), self.loop_size, f"{self.estimate():,.0f}"))
+        hotspots = [loop for loop in self.hotspots() if loop.total]
+        if hotspots:
+            lines.append("")
+            lines.append(_("Most expensive loops:"))
+            for loop in hotspots:
+                iterations = 'N' if loop.iterations is None else loop.iterations
+                # 行号前缀不翻译，界面据此跳转到模板中的行
+                lines.append(f"  {loop.line}: " + _(
+                    "for ... in {} (depth {}, {} iterations, "
+                    "about {} operations per iteration, about {} in total)"
+                ).format(loop.iterable, loop.depth, iterations,
+                         f"{_evaluate(loop.per_iteration, self.loop_size):,.0f}",
+                         f"{_evaluate(loop.total, self.loop_size):,.0f}"))
+        return '\n'.join(lines)
+
+
+class TemplateLinter:
+    """
+    基于 env.parse 语法树的模板静态检查
+
+    检查项:
+        nested-loop            嵌套循环遍历与外层循环无关的数据（N×M 次迭代），或嵌套深度达到 3
+        loop-invariant-filter  循环内的过滤器不依赖循环变量，可以在循环前用 set 计算一次
+        include-in-loop        循环内的 include / import，每次迭代都要查找模板并创建上下文
+        large-literal          大型字面量，未被提升为编译期常量时每次求值都会重建
+    """
+
+    def __init__(self, env, loop_size=100, large_literal_items=50, nondeterministic_filters=(),
+                 hoist_min_items=None, hoist_blocking_methods=()):
+        """
+        初始化检查器
+
+        Args:
+            env (Environment): 用于解析模板的 Jinja 环境
+            loop_size (int): 估算工作量时数据长度未知的循环的假定迭代次数
+            large_literal_items (int): 字面量元素总数达到该值时报告
+            nondeterministic_filters (iterable): 结果随调用变化、不能提到循环外的过滤器名
+            hoist_min_items (int): 处理器提升常量字面量的元素数下限，None 表示不提升
+            hoist_blocking_methods (iterable): 模板调用这些方法时处理器不提升常量
+        """
+        self.env = env
+        self.loop_size = loop_size
+        self.large_literal_items = large_literal_items
+        self.nondeterministic_filters = frozenset(nondeterministic_filters)
+        self.hoist_min_items = hoist_min_items
+        self.hoist_blocking_methods = frozenset(hoist_blocking_methods)
+
+    def lint(self, template_content):
+        """
+        检查模板
+
+        Args:
+            template_content (str): 模板字符串
+
+        Returns:
+            LintReport: 检查报告，模板有语法错误时只包含一条 syntax-error
+        """
+        try:
+            ast = self.env.parse(template_content)
+        except TemplateSyntaxError as e:
+            issue = LintIssue('syntax-error', 'error', e.lineno or 1, e.message or str(e))
+            return LintReport([issue], [], {}, 0, self.loop_size)
+
+        state = _LintState(ast)
+        state.hoisting = self.hoist_min_items is not None and not any(
+            node.attr in self.hoist_blocking_methods for node in ast.find_all(nodes.Getattr))
+        cost = self._visit_body(ast.body, state, ())
+        return LintReport(state.issues, state.loops, cost, state.max_depth, self.loop_size)
+
+    def _visit_body(self, body, state, loops):
+        total = {}
+        for node in body:
+            _add(total, self._visit(node, state, loops))
+        return total
+
+    def _visit(self, node, state, loops):
+        """
+        检查节点并返回一次执行的工作量
+
+        Args:
+            node (Node): 语法树节点
+            state (_LintState): 收集问题和循环信息
+            loops (tuple): 从外到内的外层 For 节点
+
+        Returns:
+            dict: {N 的次数: 工作量}
+        """
+        if isinstance(node, nodes.For):
+            return self._visit_for(node, state, loops)
+        if isinstance(node, nodes.Macro):
+            # 宏的工作量计入调用处，宏体在定义处检查一次
+            state.macro_cost(node.name, self)
+            return {}
+        if isinstance(node, (nodes.Include, nodes.Import, nodes.FromImport)):
+            if loops:
+                target = _describe(node.template)
+                kind = 'include' if isinstance(node, nodes.Include) else 'import'
+                state.report('include-in-loop', 'warning', node.lineno,
+                             N_("{} {} inside a loop looks up the template and creates a new context "
+                                "on every iteration; import macros outside the loop and call them "
+                                "inside it instead"), (kind, target))
+            return _add({0: _INCLUDE_COST}, self._visit_children(node, state, loops))
+        if isinstance(node, nodes.If):
+            # 分支取工作量较大的一个
+            cost = self._visit(node.test, state, loops)
+            branch = self._visit_body(node.body, state, loops)
+            for elif_node in node.elif_:
+                _add(cost, self._visit(elif_node.test, state, loops))
+                branch = _maximum(branch, self._visit_body(elif_node.body, state, loops))
+            branch = _maximum(branch, self._visit_body(node.else_, state, loops))
+            return _add(cost, branch)
+        if isinstance(node, (nodes.Dict, nodes.List, nodes.Tuple)) and _literal_items(node) >= self.large_literal_items:
+            return self._visit_literal(node, state, loops)
+        if isinstance(node, nodes.Filter) and loops and node.node is not None:
+            self._check_invariant_filter(node, state, loops)
+
+        cost = {}
+        if isinstance(node, nodes.Output):
+            cost[0] = sum(1 for child in node.nodes if not isinstance(child, nodes.TemplateData))
+        elif isinstance(node, (nodes.Dict, nodes.List, nodes.Tuple)):
+            cost[0] = len(node.items)
+        else:
+            cost[0] = _NODE_COSTS.get(type(node), 0)
+        if isinstance(node, nodes.Call) and isinstance(node.node, nodes.Name):
+            _add(cost, state.macro_cost(node.node.name, self))
+        return _add(cost, self._visit_children(node, state, loops))
+
+    def _visit_children(self, node, state, loops):
+        total = {}
+        for child in node.iter_child_nodes():
+            _add(total, self._visit(child, state, loops))
+        return total
+
+    def _visit_for(self, node, state, loops):
+        depth = len(loops) + 1
+        state.max_depth = max(state.max_depth, depth)
+        iterations = _iteration_count(node.iter)
+        iterable = _describe(node.iter)
+
+        if iterations is None and loops:
+            # 内层循环的数据与外层循环变量无关时是 N×M 的组合
+            names = _loaded_names(node.iter)
+            outer_locals = set().union(*(state.loop_locals(loop) for loop in loops))
+            if names and not names & outer_locals:
+                state.report('nested-loop', 'warning', node.lineno,
+                             N_("Loop over {} is nested in the loop on line {} and does not depend on "
+                                "its variables, so the iteration counts multiply; build a dict keyed "
+                                "by the lookup value first"), (iterable, loops[-1].lineno))
+            elif depth >= 3:
+                state.report('nested-loop', 'warning', node.lineno,
+                             N_("Loops are nested {} deep, about O(N^{}) work"), (depth, depth))
+
+        inner = loops + (node,)
+        cost = self._visit(node.iter, state, loops)
+        per_iteration = self._visit_body(node.body, state, inner)
+        _add(per_iteration, {0: 1})
+        if node.test is not None:
+            _add(per_iteration, self._visit(node.test, state, inner))
+        if iterations is None:
+            total = {power + 1: units for power, units in per_iteration.items()}
+        else:
+            total = {power: units * iterations for power, units in per_iteration.items()}
+        _add(cost, total)
+        _add(cost, self._visit_body(node.else_, state, loops))
+
+        state.loops.append(LoopCost(node.lineno, depth, iterable, iterations, per_iteration, total))
+        return cost
+
+    def _visit_literal(self, node, state, loops):
+        items = _literal_items(node)
+        hoisted = state.hoisting and len(node.items) >= self.hoist_min_items and _is_constant(node, self.env)
+        if hoisted:
+            state.report('large-literal', 'info', node.lineno,
+                         N_("Literal with {} items is hoisted to a compile-time constant "
+                            "and built only once"), (items,))
+            return {}
+        if loops:
+            state.report('large-literal', 'warning', node.lineno,
+                         N_("Literal with {} items inside a loop is rebuilt on every iteration; "
+                            "move it out of the loop or into the JSON data"), (items,))
+        else:
+            state.report('large-literal', 'info', node.lineno,
+                         N_("Literal with {} items is rebuilt on every render; "
+                            "move it into the JSON data or a separate module"), (items,))
+        return _add({0: items}, self._visit_children(node, state, loops))
+
+    def _check_invariant_filter(self, node, state, loops):
+        """循环内不依赖任何循环局部变量的过滤器可以提到循环外"""
+        if node.name in self.nondeterministic_filters:
+            return
+        names = _loaded_names(node)
+        if not names:
+            # 常量表达式在编译时已经折叠
+            return
+        if node in state.reported_filters:
+            return
+        for loop in loops:
+            if not names & state.loop_locals(loop):
+                # 过滤器链只报告最外层的过滤器
+                state.reported_filters.update(node.find_all(nodes.Filter))
+                state.report('loop-invariant-filter', 'info', node.lineno,
+                             N_("Filter {} does not depend on loop variables but is recomputed on "
+                                "every iteration of the loop on line {}; compute it once with set "
+                                "before the loop"), (node.name, loop.lineno))
+                return
+
+
+class _LintState:
+    """一次检查过程中的状态"""
+
+    def __init__(self, ast):
+        self.issues = []
+        self.loops = []
+        self.max_depth = 0
+        self.hoisting = False
+        self.reported_filters = set()
+        self._loop_locals = {}
+        self._macros = {macro.name: macro for macro in ast.find_all(nodes.Macro)}
+        self._macro_costs = {}
+
+    def report(self, rule, severity, line, message, args=()):
+        self.issues.append(LintIssue(rule, severity, line, message, args))
+
+    def loop_locals(self, loop):
+        """循环内赋值的名称（包括循环变量和 loop）"""
+        names = self._loop_locals.get(loop)
+        if names is None:
+            names = {node.name for node in loop.find_all(nodes.Name) if node.ctx in ('store', 'param')}
+            names.add('loop')
+            self._loop_locals[loop] = names
+        return names
+
+    def macro_cost(self, name, linter):
+        """宏一次调用的工作量，宏体内的问题在定义处报告一次"""
+        macro = self._macros.get(name)
+        if macro is None:
+            return {}
+        if name not in self._macro_costs:
+            # 先占位，防止递归宏无限展开
+            self._macro_costs[name] = {}
+            self._macro_costs[name] = linter._visit_body(macro.body, self, ())
+        return dict(self._macro_costs[name])
+
+
+def _literal_items(node):
+    """字面量中的元素总数（包括嵌套的字面量）"""
+    if isinstance(node, nodes.Dict):
+        return sum(1 + _literal_items(pair.value) for pair in node.items)
+    if isinstance(node, (nodes.List, nodes.Tuple)):
+        return sum(1 + _literal_items(item) for item in node.items)
+    return 0
+
+
+def _is_constant(node, env):
+    try:
+        node.as_const(nodes.EvalContext(env))
+    except nodes.Impossible:
+        return False
+    return True
+
+
+def _iteration_count(node):
+    """常量列表或 range(常量) 的迭代次数，其他情况返回 None"""
+    if isinstance(node, (nodes.List, nodes.Tuple)):
+        return len(node.items)
+    if isinstance(node, nodes.Const) and isinstance(node.value, (list, tuple, str, dict)):
+        return len(node.value)
+    if isinstance(node, nodes.Call) and isinstance(node.node, nodes.Name) and node.node.name == 'range' \
+            and node.args and not node.kwargs and all(isinstance(arg, nodes.Const) for arg in node.args):
+        try:
+            return len(range(*(arg.value for arg in node.args)))
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _loaded_names(node):
+    names = {name.name for name in node.find_all(nodes.Name) if name.ctx == 'load'}
+    if isinstance(node, nodes.Name) and node.ctx == 'load':
+        names.add(node.name)
+    return names
+
+
+def _describe(node):
+    """表达式的简短文本，用于报告"""
+    if isinstance(node, nodes.Name):
+        return node.name
+    if isinstance(node, nodes.Getattr):
+        return f"{_describe(node.node)}.{node.attr}"
+    if isinstance(node, nodes.Getitem) and isinstance(node.arg, nodes.Const):
+        return f"{_describe(node.node)}[{node.arg.value!r}]"
+    if isinstance(node, nodes.Const):
+        return repr(node.value)
+    if isinstance(node, nodes.Filter) and node.node is not None:
+        return f"{_describe(node.node)}|{node.name}"
+    if isinstance(node, nodes.Call):
+        return f"{_describe(node.node)}(...)"
+    return type(node).__name__.lower()
+
+
+def _add(total, cost):
+    """将工作量 cost 累加到 total 并返回 total"""
+    for power, units in cost.items():
+        total[power] = total.get(power, 0) + units
+    return total
+
+
+def _maximum(a, b):
+    """两个分支中每个量级取较大的工作量"""
+    return {power: max(a.get(power, 0), b.get(power, 0)) for power in set(a) | set(b)}
+
+
+def _evaluate(cost, loop_size):
+    return sum(units * loop_size ** power for power, units in cost.items())
@@ -1,67 +1,397 @@
-from jinja2 import Environment, meta
-import re
+from jinja2 import Environment, FileSystemLoader, ModuleLoader, meta, nodes
+from jinja2.sandbox import SandboxedEnvironment
+from jinja2.visitor import NodeTransformer
+from collections import OrderedDict
+import hashlib
+import os
 import json
+import tempfile
+import threading
+import jinja2
+from data_import import resolve_file_references
+from filter_registry import FilterRegistry
+from template_linter import TemplateLinter
+from variable_extractor import VariableExtractor
+from render_cache import RenderCache, UncacheableValue, canonical_hash
+from incremental_render import IncrementalRenderer
+from metrics import Metrics
+
+
+# 会修改容器内容的方法，模板中调用了这些方法时不提升常量
+_MUTATING_METHODS = frozenset([
+    'append', 'extend', 'insert', 'pop', 'popitem', 'remove', 'clear',
+    'update', 'setdefault', 'sort', 'reverse',
+])
 
 
 class TemplateProcessor:
-    """Jinja2模板处理器"""
+    """
+    Jinja2模板处理器
+    
+    同一个实例可以在多个线程间共享：编译模板和增量渲染器的缓存查询不加锁，
+    写入和 LRU 淘汰在锁内进行；增量变量提取器按线程分别保存，
+    过滤器统计、渲染结果缓存和性能统计各自加锁。
+    """
+    
+    # 元素数量达到该值的常量字面量才会被提升
+    CONSTANT_HOIST_MIN_ITEMS = 8
     
-    def __init__(self):
+    def __init__(self, filter_modules=None, load_plugins=True, filter_cache_size=1024,
+                 template_cache_size=64, hoist_constants=True, precompiled_path=None, metrics=None,
+                 sandboxed=False):
+        """
+        初始化模板处理器
+        
+        Args:
+            filter_modules (list): 额外加载过滤器插件的模块名列表
+            load_plugins (bool): 是否从已安装包的入口点加载插件
+            filter_cache_size (int): 纯函数过滤器的缓存条目上限
+            template_cache_size (int): 编译后模板的缓存条目上限
+            hoist_constants (bool): 是否将大型常量字面量提升为编译期常量
+            precompiled_path (str): compile_template_directory 生成的目录或 zip 文件，
+                设置后可通过 render_named 直接导入预编译模板而无需解析
+            metrics (Metrics): 记录各阶段耗时和计数的统计对象，默认新建
+            sandboxed (bool): 是否使用沙箱环境，渲染不可信的模板时禁止访问内部属性
+        """
         # 创建带自定义函数的环境
-        self.env = Environment()
+        loader = ModuleLoader(precompiled_path) if precompiled_path else None
+        environment_class = SandboxedEnvironment if sandboxed else Environment
+        self.env = environment_class(loader=loader)
+        self.template_cache_size = template_cache_size
+        self.hoist_constants = hoist_constants
+        self._template_cache = OrderedDict()
+        self._incremental_renderers = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self.render_cache = None
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.filter_registry = FilterRegistry(cache_size=filter_cache_size)
+        
         # 添加自定义函数
-        self.env.globals['raise_exception'] = self._raise_exception
+        self.filter_registry.register('raise_exception', self._raise_exception, kind='global')
         
         # 添加自定义过滤器
-        self.env.filters['trim'] = lambda x: x.strip() if isinstance(x, str) else x
-        self.env.filters['format_number'] = self._format_number
-        self.env.filters['format_currency'] = self._format_currency
+        self.filter_registry.register('trim', self._trim, pure=True)
+        self.filter_registry.register('format_number', self._format_number, pure=True)
+        self.filter_registry.register('format_currency', self._format_currency, pure=True)
+        
+        # 加载插件，插件可以覆盖内置过滤器
+        if load_plugins:
+            self.filter_registry.load_entry_points()
+        for module_name in filter_modules or []:
+            try:
+                self.filter_registry.load_module(module_name)
+            except Exception as e:
+                print(f"Failed to load filter module {module_name}: {e}")
         
-    def extract_variables(self, template_content):
+        self.filter_registry.install(self.env)
+        self.environment_fingerprint = self._environment_fingerprint()
+    
+    def _environment_fingerprint(self):
         """
-        从模板内容中提取变量名
+        计算影响渲染结果的环境指纹：Jinja2 版本、环境类型、分隔符等选项以及已注册的过滤器
+        
+        渲染结果缓存键包含该指纹，插件或过滤器模块变化后磁盘缓存中的旧结果不会被命中。
+        """
+        env = self.env
+        options = (
+            jinja2.__version__, type(env).__name__, env.autoescape if not callable(env.autoescape) else 'callable',
+            env.block_start_string, env.block_end_string, env.variable_start_string, env.variable_end_string,
+            env.comment_start_string, env.comment_end_string, env.line_statement_prefix,
+            env.line_comment_prefix, env.trim_blocks, env.lstrip_blocks, env.newline_sequence,
+            env.keep_trailing_newline, self.filter_registry.fingerprint(),
+        )
+        return hashlib.sha256(repr(options).encode('utf-8')).hexdigest()
+    
+    @property
+    def variable_extractor(self):
+        """当前线程的增量变量提取器，不同线程编辑的模板互不影响"""
+        extractor = getattr(self._local, 'variable_extractor', None)
+        if extractor is None:
+            extractor = self._local.variable_extractor = VariableExtractor(self.env)
+        return extractor
+    
+    def get_filter_stats(self):
+        """
+        获取过滤器和全局函数的调用次数与耗时
+        
+        Returns:
+            dict: 按总耗时降序排列的统计信息
+        """
+        return self.filter_registry.get_stats()
+    
+    def get_metrics(self):
+        """
+        获取各阶段耗时、计数和渲染缓存统计
+        
+        Returns:
+            dict: Metrics.snapshot 的结果，启用渲染缓存时附加 render_cache
+        """
+        snapshot = self.metrics.snapshot()
+        snapshot['render_cache'] = self.render_cache.get_stats() if self.render_cache is not None else None
+        return snapshot
+        
+    def enable_render_cache(self, max_entries=256, max_bytes=64 * 1024 * 1024,
+                            disk_dir=None, disk_max_bytes=256 * 1024 * 1024):
+        """
+        启用渲染结果缓存
+        
+        缓存键为 (模板哈希, 环境与过滤器指纹, 模板引用变量的规范化哈希)；
+        调用了非确定性过滤器或全局函数的模板自动跳过缓存。
         
         Args:
-            template_content (str): 模板字符串
+            max_entries (int): 内存层最多条目数
+            max_bytes (int): 内存层占用上限（字节）
+            disk_dir (str): 磁盘层目录，为 None 时只使用内存
+            disk_max_bytes (int): 磁盘层占用上限（字节）
+        """
+        self.render_cache = RenderCache(max_entries, max_bytes, disk_dir, disk_max_bytes)
+    
+    def disable_render_cache(self):
+        """停用渲染结果缓存"""
+        self.render_cache = None
+    
+    def compile_template_directory(self, source_dir, target, zip=None, extensions=None):
+        """
+        将模板目录预编译为可导入的 Python 模块
+        
+        生成的目录或 zip 文件可通过 TemplateProcessor(precompiled_path=...) 加载，
+        工作进程启动时直接导入编译结果，不再解析模板源码。
+        
+        Args:
+            source_dir (str): 模板目录
+            target (str): 输出目录，zip 不为 None 时为 zip 文件路径
+            zip (str): None 输出到目录，'deflated' 或 'stored' 输出为 zip 文件
+            extensions (list): 只编译这些扩展名的模板（不含点），None 表示全部
             
         Returns:
-            list: 变量名列表
+            list: 已编译的模板名
         """
+        compiled = []
+        
+        def log_function(message):
+            if message.startswith('Compiled "'):
+                compiled.append(message.split('"')[1])
+        
+        env = self.env.overlay(loader=FileSystemLoader(source_dir))
+        env.compile_templates(target, extensions=extensions, zip=zip,
+                              log_function=log_function, ignore_errors=False)
+        return compiled
+    
+    def render_named(self, template_name, variables):
+        """
+        按名称渲染预编译模板
+        
+        Args:
+            template_name (str): 模板名（相对于预编译时模板目录的路径）
+            variables (dict): 变量字典
+            
+        Returns:
+            str: 渲染后的文本
+        """
+        if self.env.loader is None:
+            raise Exception("未配置预编译模板路径")
         try:
-            # 解析模板获取变量
-            ast = self.env.parse(template_content)
-            variables = meta.find_undeclared_variables(ast)
-            return sorted(list(variables))
+            with self.metrics.measure('render', template=template_name) as measurement:
+                measurement.output = self.env.get_template(template_name).render(**variables)
+            return measurement.output
         except Exception as e:
-            # 如果解析失败，尝试通过正则表达式提取
-            return self._extract_variables_regex(template_content)
+            raise Exception(f"模板渲染错误: {str(e)}")
     
-    def _extract_variables_regex(self, template_content):
+    def get_template(self, template_content):
         """
-        使用正则表达式提取变量（备用方案）
+        获取编译后的模板，相同内容只编译一次
         
         Args:
             template_content (str): 模板字符串
             
         Returns:
-            list: 变量名列表
+            Template: 编译后的模板
+        """
+        return self.get_compiled(template_content).template
+    
+    def get_compiled(self, template_content):
+        """
+        获取编译后的模板及其静态分析结果
+        
+        Args:
+            template_content (str): 模板字符串
+            
+        Returns:
+            CompiledTemplate: 编译结果
+        """
+        key = self.template_hash(template_content)
+        compiled = self._template_cache.get(key)
+        if compiled is not None:
+            self._touch(self._template_cache, key)
+            self.metrics.increment('template_cache_hits')
+            return compiled
+        
+        # 编译不持有锁；多个线程同时编译同一模板时保留先写入的结果
+        self.metrics.increment('template_cache_misses')
+        with self.metrics.measure('compile', template=key[:12]):
+            compiled = self._compile_template(template_content, key)
+        return self._store(self._template_cache, key, compiled)
+    
+    def _touch(self, cache, key):
+        """
+        将命中的条目移到 LRU 末尾
+        
+        只在锁空闲时更新顺序，不阻塞查询；偶尔跳过只会让淘汰顺序略有偏差。
+        """
+        if self._cache_lock.acquire(blocking=False):
+            try:
+                if key in cache:
+                    cache.move_to_end(key)
+            finally:
+                self._cache_lock.release()
+    
+    def _store(self, cache, key, value):
         """
-        # 匹配 {{ variable }} 格式的变量
-        pattern = r'\{\{\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*\}\}'
-        variables = re.findall(pattern, template_content)
+        在锁内写入缓存并淘汰最久未使用的条目
         
-        # 匹配 {% for item in list %} 中的变量
-        for_pattern = r'\{%\s*for\s+[a-zA-Z_][a-zA-Z0-9_]*\s+in\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*%\}'
-        for_vars = re.findall(for_pattern, template_content)
-        variables.extend(for_vars)
+        Returns:
+            缓存中的值，其他线程已写入同一键时为先写入的值
+        """
+        with self._cache_lock:
+            existing = cache.get(key)
+            if existing is not None:
+                cache.move_to_end(key)
+                return existing
+            cache[key] = value
+            if len(cache) > self.template_cache_size:
+                cache.popitem(last=False)
+        return value
+    
+    @staticmethod
+    def template_hash(template_content):
+        """计算模板内容的哈希值"""
+        return hashlib.sha256(template_content.encode('utf-8')).hexdigest()
+    
+    def _compile_template(self, template_content, key):
+        """
+        编译模板，并将常量字面量提升为模板全局变量
         
-        # 匹配 {% if condition %} 中的变量
-        if_pattern = r'\{%\s*if\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*(?:==|!=|>|<|>=|<=).*?\s*%\}'
-        if_vars = re.findall(if_pattern, template_content)
-        variables.extend(if_vars)
+        提升后的常量每个编译模板只计算一次，在多次渲染间共享，模板不应修改它们。
+        """
+        ast = self.env.parse(template_content)
         
-        # 去重并排序
-        return sorted(list(set(variables)))
+        # 在提升常量之前分析，避免把常量名当成模板变量
+        variables = self._referenced_variables(ast)
+        deterministic = self._is_deterministic(ast)
+        
+        constants = self._hoist_constant_literals(ast) if self.hoist_constants else {}
+        code = self.env.compile(ast)
+        template = self.env.template_class.from_code(
+            self.env, code, self.env.make_globals(constants), None
+        )
+        return CompiledTemplate(key, template, variables, deterministic)
+    
+    @staticmethod
+    def _referenced_variables(ast):
+        """
+        获取模板引用的外部变量
+        
+        Returns:
+            frozenset: 变量名集合；模板包含 include/import/extends 时返回 None，表示可能引用任意变量
+        """
+        if any(True for _ in ast.find_all((nodes.Include, nodes.Import, nodes.FromImport, nodes.Extends))):
+            return None
+        return frozenset(meta.find_undeclared_variables(ast))
+    
+    def _is_deterministic(self, ast):
+        """判断模板是否没有调用非确定性的过滤器或全局函数"""
+        filters = self.filter_registry.nondeterministic_names('filter')
+        globals_ = self.filter_registry.nondeterministic_names('global')
+        for node in ast.find_all((nodes.Filter, nodes.Name)):
+            if isinstance(node, nodes.Filter):
+                if node.name in filters:
+                    return False
+            elif node.ctx == 'load' and node.name in globals_:
+                return False
+        return True
+    
+    def _hoist_constant_literals(self, ast):
+        """
+        将语法树中的大型常量字面量替换为名称引用
+        
+        Args:
+            ast (Template): 模板语法树，会被原地修改
+            
+        Returns:
+            dict: {常量名: 常量值}
+        """
+        # 模板调用了可能修改容器的方法时，共享常量不安全
+        for node in ast.find_all(nodes.Getattr):
+            if node.attr in _MUTATING_METHODS:
+                return {}
+        
+        hoister = _ConstantHoister(self.env, self.CONSTANT_HOIST_MIN_ITEMS)
+        hoister.visit(ast)
+        return hoister.constants
+    
+    def extract_variables(self, template_content, incremental=False):
+        """
+        从模板内容中提取变量名
+        
+        Args:
+            template_content (str): 模板字符串
+            incremental (bool): 为 True 时直接使用增量提取器而不解析整个模板，
+                适合编辑过程中反复提取
+            
+        Returns:
+            list: 变量名列表
+        """
+        with self.metrics.measure('extract', incremental=incremental):
+            if incremental:
+                return self.variable_extractor.extract(template_content)
+            try:
+                # 解析模板获取变量
+                ast = self.env.parse(template_content)
+                variables = meta.find_undeclared_variables(ast)
+                return sorted(list(variables))
+            except Exception as e:
+                # 解析失败时（例如编辑到一半的模板）使用容错的增量提取器
+                return self.variable_extractor.extract(template_content)
+    
+    def prewarm(self, template_content):
+        """
+        预先提取变量并将模板编译进缓存，之后渲染同样内容的模板无需再编译
+
+        Args:
+            template_content (str): 模板字符串
+
+        Returns:
+            list: 变量名列表，与 extract_variables 的结果相同
+        """
+        with self.metrics.measure('extract', prewarm=True):
+            try:
+                variables = sorted(meta.find_undeclared_variables(self.env.parse(template_content)))
+            except Exception:
+                # 有语法错误的模板无法编译，只提取变量
+                return self.variable_extractor.extract(template_content)
+        self.get_compiled(template_content)
+        return variables
+
+    def lint_template(self, template_content, loop_size=100, large_literal_items=50):
+        """
+        静态检查模板中的性能隐患并估算渲染工作量
+        
+        Args:
+            template_content (str): 模板字符串
+            loop_size (int): 估算时数据长度未知的循环的假定迭代次数
+            large_literal_items (int): 字面量元素总数达到该值时报告
+            
+        Returns:
+            LintReport: 检查报告
+        """
+        linter = TemplateLinter(
+            self.env, loop_size, large_literal_items,
+            nondeterministic_filters=self.filter_registry.nondeterministic_names('filter'),
+            hoist_min_items=self.CONSTANT_HOIST_MIN_ITEMS if self.hoist_constants else None,
+            hoist_blocking_methods=_MUTATING_METHODS
+        )
+        return linter.lint(template_content)
     
     def render_template(self, template_content, variables):
         """
@@ -76,11 +406,188 @@ class TemplateProcessor:
         """
         try:
             # 使用环境创建模板以支持自定义函数
-            template = self.env.from_string(template_content)
-            return template.render(**variables)
+            compiled = self.get_compiled(template_content)
+            with self.metrics.measure('render', template=compiled.key[:12]) as measurement:
+                measurement.output = self.render_compiled(compiled, variables)
+            return measurement.output
+        except Exception as e:
+            raise Exception(f"模板渲染错误: {str(e)}")
+    
+    def render_incremental(self, template_content, variables):
+        """
+        增量渲染模板，只重新执行输入变量发生变化的顶层片段
+        
+        适用于实时预览和大部分字段相同的批量记录。
+        
+        Args:
+            template_content (str): 模板字符串
+            variables (dict): 变量字典
+            
+        Returns:
+            str: 渲染后的文本
+        """
+        try:
+            renderer = self.get_incremental_renderer(template_content)
+            with self.metrics.measure('render', incremental=True) as measurement:
+                measurement.output = renderer.render(variables)
+            return measurement.output
         except Exception as e:
             raise Exception(f"模板渲染错误: {str(e)}")
     
+    def get_incremental_renderer(self, template_content):
+        """
+        获取模板的增量渲染器，相同内容复用同一个渲染器
+        
+        Args:
+            template_content (str): 模板字符串
+            
+        Returns:
+            IncrementalRenderer: 增量渲染器
+        """
+        key = self.template_hash(template_content)
+        renderer = self._incremental_renderers.get(key)
+        if renderer is not None:
+            self._touch(self._incremental_renderers, key)
+            return renderer
+        
+        return self._store(self._incremental_renderers, key, IncrementalRenderer(self, template_content))
+    
+    def render_batch(self, template_content, records, incremental=False):
+        """
+        使用同一个编译后的模板批量渲染多条记录
+        
+        Args:
+            template_content (str): 模板字符串
+            records (list): 变量字典列表
+            incremental (bool): 为 True 时按片段增量渲染，适合字段大多相同的记录
+            
+        Returns:
+            list: 每条记录渲染后的文本
+        """
+        try:
+            with self.metrics.measure('render', records=len(records), incremental=incremental):
+                if incremental:
+                    renderer = self.get_incremental_renderer(template_content)
+                    return [renderer.render(record) for record in records]
+                compiled = self.get_compiled(template_content)
+                return [self.render_compiled(compiled, record) for record in records]
+        except Exception as e:
+            raise Exception(f"模板渲染错误: {str(e)}")
+    
+    def stream_template(self, template_content, variables):
+        """
+        逐块产出渲染结果，不在内存中拼接完整文本
+        
+        与 RowStream 等按需读取的变量配合使用时，模板顶层 for 循环的内存占用不随行数增长。
+        流式渲染不使用渲染结果缓存。
+        
+        Args:
+            template_content (str): 模板字符串
+            variables (dict): 变量字典，值可以是迭代器或生成器
+            
+        Yields:
+            str: 渲染结果片段
+        """
+        try:
+            compiled = self.get_compiled(template_content)
+            yield from compiled.template.generate(**variables)
+        except Exception as e:
+            raise Exception(f"模板渲染错误: {str(e)}")
+    
+    def render_to_file(self, template_content, variables, file_path, buffer_size=64 * 1024):
+        """
+        流式渲染并写入文件，渲染失败时不覆盖已有文件
+        
+        Args:
+            template_content (str): 模板字符串
+            variables (dict): 变量字典，值可以是迭代器或生成器
+            file_path (str): 输出文件路径
+            buffer_size (int): 写入缓冲区大小（字节）
+            
+        Returns:
+            int: 写入的字节数
+        """
+        # 临时文件与目标在同一目录，保证 os.replace 是原子的；每次调用使用不同的文件名
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)),
+                                        prefix=os.path.basename(file_path) + '.', suffix='.tmp')
+        written = 0
+        try:
+            with self.metrics.measure('render', streamed=True) as measurement:
+                with open(fd, 'wb', buffering=buffer_size) as f:
+                    for chunk in self.stream_template(template_content, variables):
+                        data = chunk.encode('utf-8')
+                        f.write(data)
+                        written += len(data)
+                measurement.output = written
+            # mkstemp 创建的文件只有所有者可读写，沿用已有文件的权限，新文件使用常规权限
+            try:
+                mode = os.stat(file_path).st_mode & 0o777
+            except OSError:
+                mode = 0o644
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return written
+    
+    def render_compiled(self, compiled, variables):
+        """
+        渲染 get_compiled 返回的编译结果，启用缓存时先查询渲染结果缓存
+        
+        与 render_template 不同，异常不做包装，适合逐条记录处理错误的调用方。
+        
+        Args:
+            compiled (CompiledTemplate): 编译结果
+            variables (dict): 变量字典
+            
+        Returns:
+            str: 渲染后的文本
+        """
+        # 只读取一次，渲染过程中其他线程停用缓存也不受影响
+        render_cache = self.render_cache
+        cache_key = self._render_cache_key(render_cache, compiled, variables)
+        if cache_key is not None:
+            result = render_cache.get(cache_key)
+            if result is not None:
+                return result
+        
+        result = compiled.template.render(**variables)
+        if cache_key is not None:
+            render_cache.put(cache_key, result)
+        return result
+    
+    def _render_cache_key(self, render_cache, compiled, variables):
+        """
+        计算渲染结果缓存键
+        
+        Args:
+            render_cache (RenderCache): 渲染结果缓存，None 表示未启用
+            compiled (CompiledTemplate): 编译结果
+            variables (dict): 变量字典
+        
+        Returns:
+            str: 缓存键；未启用缓存或模板/数据不可缓存时返回 None
+        """
+        if render_cache is None:
+            return None
+        if not compiled.deterministic:
+            render_cache.record_bypass()
+            return None
+        
+        if compiled.variables is None:
+            relevant = variables
+        else:
+            relevant = {name: variables[name] for name in compiled.variables if name in variables}
+        try:
+            return f"{compiled.key}-{self.environment_fingerprint[:16]}-{canonical_hash(relevant)}"
+        except UncacheableValue:
+            render_cache.record_bypass()
+            return None
+    
     def validate_json_data(self, json_string):
         """
         验证JSON数据格式
@@ -97,13 +604,17 @@ class TemplateProcessor:
         except json.JSONDecodeError as e:
             return False, f"JSON格式错误: {str(e)}"
     
-    def merge_data_sources(self, form_data, json_data):
+    def merge_data_sources(self, form_data, json_data, base_dir=None):
         """
         合并表单数据和JSON数据
         
+        JSON数据中的 {"$file": 路径} 会被替换为按需读取该文件的 RowStream，
+        模板可以在 for 循环中逐行处理 JSON Lines / CSV 文件而不必全部载入内存。
+        
         Args:
             form_data (dict): 表单数据
             json_data (dict): JSON数据
+            base_dir (str): 文件引用相对路径的基准目录
             
         Returns:
             dict: 合并后的数据
@@ -114,7 +625,7 @@ class TemplateProcessor:
         merged_data.update(form_data)
         
         # 再添加JSON数据（覆盖同名字段）
-        merged_data.update(json_data)
+        merged_data.update(resolve_file_references(json_data, base_dir))
         
         return merged_data
     
@@ -122,6 +633,10 @@ class TemplateProcessor:
         """抛出异常的辅助函数"""
         raise Exception(message)
     
+    def _trim(self, value):
+        """去除字符串首尾空白"""
+        return value.strip() if isinstance(value, str) else value
+    
     def _format_number(self, value):
         """格式化数字显示"""
         if isinstance(value, (int, float)):
@@ -132,4 +647,51 @@ class TemplateProcessor:
         """格式化货币显示"""
         if isinstance(value, (int, float)):
             return f"{value:,.2f}"
-        return str(value)
\ No newline at end of file
+        return str(value)
+
+
+class CompiledTemplate:
+    """编译后的模板及其静态分析结果"""
+    
+    __slots__ = ('key', 'template', 'variables', 'deterministic')
+    
+    def __init__(self, key, template, variables, deterministic):
+        self.key = key
+        self.template = template
+        self.variables = variables
+        self.deterministic = deterministic
+
+
+class _ConstantHoister(NodeTransformer):
+    """将可在编译期求值的大型字典/列表/元组字面量替换为名称引用"""
+    
+    def __init__(self, env, min_items):
+        self.env = env
+        self.min_items = min_items
+        self.eval_ctx = nodes.EvalContext(env)
+        self.constants = {}
+    
+    def visit_Dict(self, node):
+        return self._hoist(node, len(node.items))
+    
+    def visit_List(self, node):
+        return self._hoist(node, len(node.items))
+    
+    def visit_Tuple(self, node):
+        if node.ctx != 'load':
+            return node
+        return self._hoist(node, len(node.items))
+    
+    def _hoist(self, node, size):
+        if size < self.min_items:
+            return self.generic_visit(node)
+        try:
+            value = node.as_const(self.eval_ctx)
+        except nodes.Impossible:
+            return self.generic_visit(node)
+        
+        name = f"_jinjautil_const_{len(self.constants)}"
+        self.constants[name] = value
+        hoisted = nodes.Name(name, 'load', lineno=node.lineno)
+        hoisted.set_environment(self.env)
+        return hoisted
@@ -0,0 +1,450 @@
+import bisect
+import re
+import threading
+
+from jinja2.exceptions import TemplateSyntaxError
+
+
+# 表达式中不是变量的名称
+_KEYWORDS = frozenset(('and', 'or', 'not', 'in', 'is', 'if', 'else', 'true', 'false', 'none',
+                       'True', 'False', 'None', 'self'))
+
+# 开启作用域的标签与对应的结束标签
+_SCOPE_TAGS = {
+    'for': 'endfor',
+    'if': 'endif',
+    'macro': 'endmacro',
+    'call': 'endcall',
+    'with': 'endwith',
+    'block': 'endblock',
+    'filter': 'endfilter',
+    'set': 'endset',
+    'autoescape': 'endautoescape',
+}
+_END_TAGS = {end: start for start, end in _SCOPE_TAGS.items()}
+
+_OPEN_BRACKETS = frozenset('([{')
+_CLOSE_BRACKETS = frozenset(')]}')
+
+
+class VariableExtractor:
+    """
+    容错的增量变量提取器
+
+    模板先按标签切分（{{ }}、{% %}，注释和 raw 块跳过），每个标签用 Jinja 词法分析器单独分词，
+    分析为一组作用域操作（读取、声明、进入/退出作用域）；词法错误只影响出错的标签，
+    未闭合的标签按已读取的部分分析，因此编辑中途的不完整模板也能得到变量集合。
+
+    再次提取时与上一次的文本比较公共前后缀，只重新切分和分析变化区域内的标签，
+    其余标签复用上次的分析结果，最后按顺序模拟作用域得到未声明的变量。
+    对合法模板，结果与 meta.find_undeclared_variables 一致。
+    """
+
+    def __init__(self, env):
+        """
+        Args:
+            env (Environment): 提供分隔符、词法分析器和全局变量的 Jinja 环境
+        """
+        self.env = env
+        self._pattern = _tag_pattern(env)
+        self._lookahead = max(len(env.block_end_string), len(env.variable_end_string),
+                              len(env.block_start_string), len(env.variable_start_string),
+                              len(env.comment_start_string))
+        self._text = None
+        self._result = []
+        self._starts = []
+        self._ends = []
+        self._ops = []
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def extract(self, text):
+        """
+        提取模板中未声明的变量
+
+        Args:
+            text (str): 模板字符串，可以不完整或有语法错误
+
+        Returns:
+            list: 排序后的变量名列表
+        """
+        with self._lock:
+            if text != self._text:
+                self._update_segments(text)
+                self._text = text
+                self._result = sorted(self._evaluate())
+            return list(self._result)
+
+    def _update_segments(self, text):
+        """重新切分变化区域内的标签，前后未变化的标签沿用上次的结果"""
+        old_text = self._text or ''
+        old_starts, old_ends, old_ops = self._starts, self._ends, self._ops
+        prefix = _common_prefix(old_text, text)
+        suffix = _common_suffix(old_text, text, min(len(old_text), len(text)) - prefix)
+        delta = len(text) - len(old_text)
+
+        # 标签的匹配结果取决于到下一个标签起点（加上分隔符长度）为止的文本，
+        # 下一个标签的起点在公共前缀内时该标签不受影响
+        keep = max(bisect.bisect_right(old_starts, prefix - self._lookahead) - 1, 0)
+        starts = old_starts[:keep]
+        ends = old_ends[:keep]
+        ops = old_ops[:keep]
+        position = ends[-1] if ends else 0
+        resync_from = len(text) - suffix
+
+        cache = self._cache
+        if len(cache) > max(4096, 2 * len(old_ops)):
+            cache = self._cache = {}
+
+        for match in self._pattern.finditer(text, position):
+            start = match.start()
+            if start >= resync_from:
+                # 匹配起点落在公共后缀内，且与旧文本中某个标签的起点对应时，之后的切分完全相同
+                index = bisect.bisect_left(old_starts, start - delta, keep)
+                if index < len(old_starts) and old_starts[index] == start - delta:
+                    starts.extend(old_start + delta for old_start in old_starts[index:])
+                    ends.extend(old_end + delta for old_end in old_ends[index:])
+                    ops.extend(old_ops[index:])
+                    break
+            starts.append(start)
+            ends.append(match.end())
+            source = match.group()
+            tag_ops = cache.get(source)
+            if tag_ops is None:
+                tag_ops = cache[source] = self._analyze(source) if match.lastgroup == 'tag' else ()
+            ops.append(tag_ops)
+
+        self._starts, self._ends, self._ops = starts, ends, ops
+
+    def _evaluate(self):
+        """按顺序模拟作用域，返回未声明变量的集合"""
+        globals_ = self.env.globals
+        frames = [('root', set())]
+        found = set()
+        for tag_ops in self._ops:
+            for op, argument in tag_ops:
+                if op == 'load' or (op == 'declare' and frames[-1][0] == 'if'):
+                    # 与 Jinja 一致：if 分支内的赋值需要外层的同名值作为未执行分支时的回退，视为读取
+                    for name in argument:
+                        if name not in found and name not in globals_ and not _is_declared(frames, name):
+                            found.add(name)
+                elif op == 'declare':
+                    frames[-1][1].update(argument)
+                elif op == 'push':
+                    frames.append((argument[0], set(argument[1])))
+                elif op == 'branch':
+                    # elif / else 分支看不到前一分支中的赋值，for 的 else 看不到循环变量
+                    if frames[-1][0] in ('if', 'for'):
+                        frames[-1][1].clear()
+                else:
+                    # 结束标签不匹配时关闭到最近的同类作用域，找不到则忽略
+                    for index in range(len(frames) - 1, 0, -1):
+                        if frames[index][0] == argument:
+                            del frames[index:]
+                            break
+        return found
+
+    def _tokens(self, source):
+        """对单个标签分词，出错时返回出错之前的部分"""
+        tokens = []
+        try:
+            for _, token_type, value in self.env.lexer.tokeniter(source, None):
+                if token_type != 'whitespace':
+                    tokens.append((token_type, value))
+        except TemplateSyntaxError:
+            pass
+        return tokens
+
+    def _analyze(self, source):
+        """
+        将一个标签分析为作用域操作
+
+        Returns:
+            tuple: ((操作, 参数), ...)，操作为 load / declare / push / branch / pop
+        """
+        tokens = self._tokens(source)
+        if not tokens:
+            return ()
+        begin = tokens[0][0]
+        end = len(tokens)
+        if tokens[-1][0] in ('variable_end', 'block_end'):
+            end -= 1
+        if begin == 'variable_begin':
+            return _loads(_expression_names(tokens, 1, end))
+        if begin != 'block_begin' or end < 2 or tokens[1][0] != 'name':
+            return ()
+
+        keyword = tokens[1][1]
+        if keyword in _END_TAGS:
+            return (('pop', _END_TAGS[keyword]),)
+        if keyword in ('else', 'elif'):
+            return (('branch', None),) + _loads(_expression_names(tokens, 2, end))
+        if keyword in ('break', 'continue', 'raw', 'endraw'):
+            return ()
+        if keyword == 'for':
+            return _analyze_for(tokens, end)
+        if keyword == 'set':
+            return _analyze_set(tokens, end)
+        if keyword == 'macro':
+            return _analyze_macro(tokens, end)
+        if keyword == 'call':
+            return _analyze_call(tokens, end)
+        if keyword == 'with':
+            return _analyze_with(tokens, end)
+        if keyword == 'import':
+            return _analyze_import(tokens, end)
+        if keyword == 'from':
+            return _analyze_from(tokens, end)
+        if keyword in ('include', 'extends'):
+            end = _strip_context(tokens, end)
+            if end - 2 >= 2 and tokens[end - 2][1] == 'ignore' and tokens[end - 1][1] == 'missing':
+                end -= 2
+            return _loads(_expression_names(tokens, 2, end))
+        if keyword == 'block':
+            return (('push', ('block', ())),)
+        if keyword == 'filter':
+            return _loads(_expression_names(tokens, 2, end, after_pipe=True)) + (('push', ('filter', ())),)
+        if keyword in ('if', 'autoescape'):
+            return _loads(_expression_names(tokens, 2, end)) + (('push', (keyword, ())),)
+        # do 及其他扩展标签：关键字之后按表达式处理
+        return _loads(_expression_names(tokens, 2, end))
+
+
+def _tag_pattern(env):
+    """根据环境的分隔符构造标签切分正则"""
+    block_start = re.escape(env.block_start_string)
+    block_end = re.escape(env.block_end_string)
+    variable_start = re.escape(env.variable_start_string)
+    variable_end = re.escape(env.variable_end_string)
+    comment_start = re.escape(env.comment_start_string)
+    comment_end = re.escape(env.comment_end_string)
+    opens = f"{block_start}|{variable_start}|{comment_start}"
+    closes = f"{block_end}|{variable_end}"
+    return re.compile(
+        # raw 块整体跳过
+        rf"(?P<raw>{block_start}[-+]?\s*raw\s*[-+]?{block_end}.*?"
+        rf"(?:{block_start}[-+]?\s*endraw\s*[-+]?{block_end}|\Z))"
+        rf"|(?P<comment>{comment_start}.*?(?:{comment_end}|\Z))"
+        # 未闭合的标签在下一个标签开始处或未闭合的引号处结束；
+        # 字符串也不跨越标签开始符，保证匹配检查的文本不超过下一个标签的起点
+        rf"|(?P<tag>(?:{block_start}|{variable_start})"
+        rf"""(?:'(?:(?!{opens})[^'\\]|\\(?!{opens}).)*'|"(?:(?!{opens})[^"\\]|\\(?!{opens}).)*"|"""
+        rf"""(?!{closes}|{opens})[^'"])*(?:{closes})?)""",
+        re.DOTALL
+    )
+
+
+def _common_prefix(a, b):
+    """二分查找两个字符串公共前缀的长度，每次比较都是 C 层的切片比较"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix(a, b, limit):
+    """二分查找两个字符串公共后缀的长度，不超过 limit"""
+    low, high = 0, max(limit, 0)
+    len_a, len_b = len(a), len(b)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len_a - middle:len_a - low] == b[len_b - middle:len_b - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _is_declared(frames, name):
+    """从内到外查找名称，block 作用域看不到外层的声明"""
+    for kind, names in reversed(frames):
+        if name in names:
+            return True
+        if kind == 'block':
+            return False
+    return False
+
+
+def _loads(names):
+    return (('load', tuple(names)),) if names else ()
+
+
+def _expression_names(tokens, start, end, after_pipe=False):
+    """
+    表达式中读取的变量名，按出现顺序
+
+    跳过属性名（. 之后）、过滤器名（| 之后）、测试名（is / is not 之后）、
+    函数调用的关键字参数名和表达式关键字。
+    """
+    names = []
+    brackets = []
+    previous = ('operator', '|') if after_pipe else None
+    before_previous = None
+    for index in range(start, end):
+        token = tokens[index]
+        token_type, value = token
+        if token_type == 'operator':
+            if value in _OPEN_BRACKETS:
+                brackets.append(value)
+            elif value in _CLOSE_BRACKETS and brackets:
+                brackets.pop()
+        elif token_type == 'name' and value not in _KEYWORDS:
+            if previous == ('operator', '.') or previous == ('operator', '|') or \
+                    previous == ('name', 'is') or (previous == ('name', 'not') and before_previous == ('name', 'is')):
+                pass
+            elif brackets and brackets[-1] == '(' and index + 1 < end and tokens[index + 1] == ('operator', '='):
+                pass
+            else:
+                names.append(value)
+        before_previous, previous = previous, token
+    return names
+
+
+def _find(tokens, start, end, token):
+    """查找括号外第一个指定的词法单元，找不到时返回 end"""
+    depth = 0
+    for index in range(start, end):
+        token_type, value = tokens[index]
+        if depth == 0 and tokens[index] == token:
+            return index
+        if token_type == 'operator':
+            if value in _OPEN_BRACKETS:
+                depth += 1
+            elif value in _CLOSE_BRACKETS and depth:
+                depth -= 1
+    return end
+
+
+def _target_names(tokens, start, end):
+    """赋值目标中的名称，例如 for k, v in ... 中的 k 和 v"""
+    return [value for token_type, value in tokens[start:end] if token_type == 'name']
+
+
+def _strip_context(tokens, end):
+    """去掉末尾的 with context / without context"""
+    if end >= 4 and tokens[end - 1] == ('name', 'context') and tokens[end - 2][1] in ('with', 'without'):
+        return end - 2
+    return end
+
+
+def _parse_params(tokens, open_index, end):
+    """
+    解析宏或 call 块的参数列表
+
+    Returns:
+        tuple: (参数名列表, 默认值表达式中读取的变量名, 右括号之后的位置)
+    """
+    params = []
+    default_names = []
+    index = open_index + 1
+    while index < end:
+        token = tokens[index]
+        if token == ('operator', ')'):
+            return params, default_names, index + 1
+        if token[0] == 'name':
+            params.append(token[1])
+            index += 1
+            if index < end and tokens[index] == ('operator', '='):
+                # 默认值表达式到括号外的下一个逗号或右括号为止
+                default_end = min(_find(tokens, index + 1, end, ('operator', ',')),
+                                  _find(tokens, index + 1, end, ('operator', ')')))
+                default_names.extend(_expression_names(tokens, index + 1, default_end))
+                index = default_end
+            continue
+        index += 1
+    return params, default_names, end
+
+
+def _analyze_for(tokens, end):
+    in_index = _find(tokens, 2, end, ('name', 'in'))
+    targets = _target_names(tokens, 2, in_index)
+    iter_end = min(_find(tokens, in_index + 1, end, ('name', 'if')),
+                   _find(tokens, in_index + 1, end, ('name', 'recursive')))
+    ops = _loads(_expression_names(tokens, in_index + 1, iter_end))
+    ops += (('push', ('for', tuple(targets) + ('loop',))),)
+    if iter_end < end and tokens[iter_end] == ('name', 'if'):
+        condition_end = _find(tokens, iter_end + 1, end, ('name', 'recursive'))
+        ops += _loads(_expression_names(tokens, iter_end + 1, condition_end))
+    return ops
+
+
+def _analyze_set(tokens, end):
+    equals = _find(tokens, 2, end, ('operator', '='))
+    if equals < end:
+        ops = _loads(_expression_names(tokens, equals + 1, end))
+        if any(token == ('operator', '.') for token in tokens[2:equals]):
+            # set ns.attr = ... 读取 ns
+            return ops + _loads(_target_names(tokens, 2, 3))
+        return ops + (('declare', tuple(_target_names(tokens, 2, equals))),)
+
+    # 块赋值 {% set x | filter %}...{% endset %}
+    pipe = _find(tokens, 2, end, ('operator', '|'))
+    return (_loads(_expression_names(tokens, pipe, end))
+            + (('declare', tuple(_target_names(tokens, 2, pipe))), ('push', ('set', ()))))
+
+
+def _analyze_macro(tokens, end):
+    if end < 3 or tokens[2][0] != 'name':
+        return (('push', ('macro', ('varargs', 'kwargs', 'caller'))),)
+    params, default_names = [], []
+    if end > 3 and tokens[3] == ('operator', '('):
+        params, default_names, _ = _parse_params(tokens, 3, end)
+    return (_loads(default_names)
+            + (('declare', (tokens[2][1],)),
+               ('push', ('macro', tuple(params) + ('varargs', 'kwargs', 'caller')))))
+
+
+def _analyze_call(tokens, end):
+    params, default_names, start = [], [], 2
+    if end > 2 and tokens[2] == ('operator', '('):
+        params, default_names, start = _parse_params(tokens, 2, end)
+    return (_loads(default_names + _expression_names(tokens, start, end))
+            + (('push', ('call', tuple(params))),))
+
+
+def _analyze_with(tokens, end):
+    # 所有赋值表达式都在外层作用域求值，先读取全部右侧名称再声明目标
+    ops = (('push', ('with', ())),)
+    targets = ()
+    start = 2
+    while start < end:
+        comma = _find(tokens, start, end, ('operator', ','))
+        equals = _find(tokens, start, comma, ('operator', '='))
+        ops += _loads(_expression_names(tokens, equals + 1, comma))
+        if equals < comma:
+            targets += tuple(_target_names(tokens, start, equals))
+        start = comma + 1
+    return ops + (('declare', targets),)
+
+
+def _analyze_import(tokens, end):
+    end = _strip_context(tokens, end)
+    as_index = _find(tokens, 2, end, ('name', 'as'))
+    ops = _loads(_expression_names(tokens, 2, as_index))
+    if as_index + 1 < end and tokens[as_index + 1][0] == 'name':
+        ops += (('declare', (tokens[as_index + 1][1],)),)
+    return ops
+
+
+def _analyze_from(tokens, end):
+    end = _strip_context(tokens, end)
+    import_index = _find(tokens, 2, end, ('name', 'import'))
+    ops = _loads(_expression_names(tokens, 2, import_index))
+    declared = []
+    index = import_index + 1
+    while index < end:
+        token_type, value = tokens[index]
+        if token_type == 'name':
+            if index + 2 < end and tokens[index + 1] == ('name', 'as') and tokens[index + 2][0] == 'name':
+                declared.append(tokens[index + 2][1])
+                index += 3
+                continue
+            declared.append(value)
+        index += 1
+    if declared:
+        ops += (('declare', tuple(declared)),)
+    return ops
@@ -0,0 +1,251 @@
+import json
+from json.encoder import encode_basestring
+import re
+
+from data_import import convert_value
+
+
+# 表单中常见变量的示例值
+SAMPLE_VALUES = {
+    'name': '张三',
+    'age': '25',
+    'email': 'zhangsan@example.com',
+    'date': '2024-01-01',
+    'items': '["item1", "item2"]',
+    'count': '10'
+}
+
+# 复杂结构的特殊处理，优先于类型模式匹配
+COMPLEX_STRUCTURES = (
+    ('messages', [
+        {
+            'role': 'user',
+            'content': '示例内容'
+        }
+    ]),
+    ('user', {
+        'name': '用户名',
+        'email': 'user@example.com'
+    }),
+)
+
+# 通用的变量类型映射规则，按顺序匹配；以 _ 结尾的模式表示变量名前缀
+TYPE_PATTERNS = (
+    # 布尔值相关
+    ('active', True),
+    ('enabled', True),
+    ('visible', True),
+    ('add_', True),
+
+    # 数字相关
+    ('count', 10),
+    ('age', 25),
+    ('price', 99.99),
+    ('num', 5),
+
+    # 字符串相关
+    ('name', '示例名称'),
+    ('title', '示例标题'),
+    ('text', '示例文本内容'),
+    ('content', '示例内容'),
+    ('description', '示例描述'),
+    ('email', 'example@email.com'),
+    ('token', '<token>'),
+    ('code', 'EXAMPLE_CODE'),
+
+    # 日期相关
+    ('date', '2024-01-01'),
+    ('time', '12:00:00'),
+
+    # 列表相关
+    ('items', ['item1', 'item2']),
+    ('list', ['a', 'b', 'c']),
+
+    # 对象相关
+    ('data', {'key': 'value'}),
+    ('config', {'setting': 'value'}),
+)
+
+# 没有匹配任何模式时使用的值
+DEFAULT_VALUE = '请输入值'
+
+
+def _compile_patterns(patterns):
+    """
+    将所有子串模式合并为一个正则表达式
+
+    正则为 (?=(p1|p2|...)) 形式的前瞻，finditer 一次扫描即可找出变量名中所有模式的出现位置
+    （包括相互重叠的），再取优先级最高的一个；前缀模式只需检查 startswith。
+
+    Returns:
+        tuple: (正则, 子串到优先级的映射, 前缀模式列表 [(前缀, 优先级)])
+    """
+    priorities = {}
+    prefixes = []
+    for priority, (pattern, _) in enumerate(patterns):
+        if pattern.endswith('_'):
+            prefixes.append((pattern[:-1], priority))
+        else:
+            priorities.setdefault(pattern, priority)
+    alternatives = sorted(priorities, key=len, reverse=True)
+    regex = re.compile('(?=(' + '|'.join(re.escape(pattern) for pattern in alternatives) + '))')
+    return regex, priorities, tuple(prefixes)
+
+
+_PATTERNS = COMPLEX_STRUCTURES + TYPE_PATTERNS
+_GUESS_REGEX, _GUESS_PRIORITIES, _GUESS_PREFIXES = _compile_patterns(_PATTERNS)
+_GUESS_VALUES = tuple(value for _, value in _PATTERNS) + (DEFAULT_VALUE,)
+
+# 每个示例值预先格式化为嵌套在顶层对象中的 JSON 文本
+_GUESS_JSON = tuple(json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+                    for value in _GUESS_VALUES)
+
+
+def _guess_index(name):
+    """返回变量名匹配的最高优先级模式序号，未匹配时为 len(_PATTERNS)"""
+    name = name.lower()
+    best = len(_PATTERNS)
+    for prefix, priority in _GUESS_PREFIXES:
+        if priority < best and name.startswith(prefix):
+            best = priority
+    for match in _GUESS_REGEX.finditer(name):
+        priority = _GUESS_PRIORITIES[match.group(1)]
+        if priority < best:
+            best = priority
+    return best
+
+
+def guess_value(name):
+    """
+    根据变量名猜测示例值
+
+    Args:
+        name (str): 变量名
+
+    Returns:
+        示例值，复杂结构为 list / dict，未匹配时为 DEFAULT_VALUE
+    """
+    return _GUESS_VALUES[_guess_index(name)]
+
+
+def create_json_template(variables):
+    """
+    创建JSON模板字符串，结果与 json.dumps(..., ensure_ascii=False, indent=2) 相同
+
+    Args:
+        variables (list): 变量名列表
+
+    Returns:
+        str: 格式化的JSON字符串
+    """
+    if not variables:
+        return "{\n  \"example_key\": \"example_value\"\n}"
+    lines = [f"  {encode_basestring(var)}: {_GUESS_JSON[_guess_index(var)]}"
+             for var in dict.fromkeys(variables)]
+    return "{\n" + ",\n".join(lines) + "\n}"
+
+
+def format_value(value):
+    """
+    将数据值转换为表单中显示的文本
+
+    Args:
+        value: 记录中的值
+
+    Returns:
+        str: list / dict 转为 JSON，布尔值转为小写
+    """
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+class VariableModel:
+    """
+    表单变量的名称与文本值，与界面无关
+
+    变量按模板中出现的顺序保存在两个平行列表中，名称到位置的索引用于按名称访问；
+    界面只持有与位置对应的输入控件，编辑时写回 values。
+    """
+
+    __slots__ = ('names', 'values', '_index')
+
+    def __init__(self, names=()):
+        self.reset(names)
+
+    def reset(self, names):
+        """
+        替换变量列表，常见变量名填入示例值
+
+        Args:
+            names (iterable): 变量名列表
+        """
+        self.names = list(names)
+        self.values = [SAMPLE_VALUES.get(name, '') for name in self.names]
+        self._index = {name: position for position, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def index(self, name):
+        """
+        获取变量的位置
+
+        Returns:
+            int: 位置，变量不存在时为 None
+        """
+        return self._index.get(name)
+
+    def get(self, name):
+        """获取变量的文本值"""
+        return self.values[self._index[name]]
+
+    def set(self, name, text):
+        """设置变量的文本值"""
+        self.values[self._index[name]] = text
+
+    def fill(self, record):
+        """
+        用记录中同名的值填充变量
+
+        Args:
+            record (dict): 数据记录
+
+        Returns:
+            list: 被填充的变量位置
+        """
+        changed = []
+        for name, value in record.items():
+            position = self._index.get(name)
+            if position is not None:
+                self.values[position] = format_value(value)
+                changed.append(position)
+        return changed
+
+    def collect(self, keep_empty=False):
+        """
+        收集变量值并转换类型
+
+        Args:
+            keep_empty (bool): 为 True 时空值记为 None，否则省略
+
+        Returns:
+            dict: 变量数据
+        """
+        variables_data = {}
+        for name, text in zip(self.names, self.values):
+            value = text.strip()
+            if value:
+                variables_data[name] = convert_value(value)
+            elif keep_empty:
+                variables_data[name] = None
+        return variables_data
+
+    def json_template(self):
+        """根据变量名生成JSON模板字符串"""
+        return create_json_template(self.names)